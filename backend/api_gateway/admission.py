@@ -0,0 +1,208 @@
+import math
+import time
+import json
+import logging
+from collections import OrderedDict, defaultdict
+from typing import List, Optional, Tuple
+from config import settings
+
+logger = logging.getLogger("Gateway_Admission")
+
+class TokenBucket:
+    """
+    Classic token bucket: refills 'rate' tokens per second up to 'burst'.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def try_take(self) -> Tuple[bool, float]:
+        """Returns (admitted, seconds until the next token is available)."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+        return False, (1 - self.tokens) / self.rate
+
+class RouteLimit:
+    """
+    Admission policy for one path prefix.
+
+    Args:
+        rate (float): Sustained requests per second allowed per user (must be > 0).
+        burst (int): Bucket size per user.
+        upstream (str): Backend the route ends up on. Routes sharing a backend share its
+            in-flight counter, so 'max_concurrent' caps the backend, not each route.
+        max_concurrent (int): Global cap on requests in flight to 'upstream' (0 = unlimited).
+        per_user_concurrent (int): Cap on in-flight requests/sessions per user (0 = unlimited).
+    """
+
+    def __init__(self, name: str, prefix: str, rate: float, burst: int, upstream: Optional[str] = None,
+                 max_concurrent: int = 0, per_user_concurrent: int = 0):
+        if rate <= 0:
+            raise ValueError(f"Admission rate for '{name}' must be > 0 (got {rate})")
+        self.name = name
+        self.prefix = prefix
+        self.upstream = upstream or name
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.per_user_concurrent = per_user_concurrent
+
+# First match wins. The GPU-bound routes are the ones that matter:
+# a single Ollama instance (behind both voice turns and '/interact') and a single 'stt_worker --concurrency=1'.
+DEFAULT_LIMITS: List[RouteLimit] = [
+    RouteLimit("voice", "/cortex/ws/chat", rate=settings.ADMISSION_LLM_RATE, burst=settings.ADMISSION_LLM_BURST,
+               upstream="ollama", max_concurrent=settings.ADMISSION_LLM_MAX_CONCURRENT, per_user_concurrent=2),
+    RouteLimit("llm", "/cortex/interact", rate=settings.ADMISSION_LLM_RATE, burst=settings.ADMISSION_LLM_BURST,
+               upstream="ollama", max_concurrent=settings.ADMISSION_LLM_MAX_CONCURRENT, per_user_concurrent=1),
+    RouteLimit("stt", "/stt/transcribe/async", rate=settings.ADMISSION_STT_RATE, burst=settings.ADMISSION_STT_BURST,
+               upstream="stt", max_concurrent=settings.ADMISSION_STT_MAX_CONCURRENT, per_user_concurrent=1),
+    RouteLimit("default", "/", rate=settings.ADMISSION_DEFAULT_RATE, burst=settings.ADMISSION_DEFAULT_BURST),
+]
+
+class Rejection(Exception):
+    def __init__(self, status_code: int, retry_after: float, detail: str):
+        self.status_code = status_code
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.detail = detail
+
+class AdmissionController:
+    """
+    Per-user / per-route token buckets plus in-flight caps.
+    Requests over the limit fail fast instead of queueing behind GPU work.
+    """
+
+    # Paths that are never limited (health checks, diagnostics, CORS preflights)
+    EXEMPT_PREFIXES = ("/health", "/diagnostics")
+
+    def __init__(self, limits: List[RouteLimit], max_buckets: int = 10000):
+        self.limits = limits
+        self.max_buckets = max_buckets
+        self.buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self.in_flight = defaultdict(int)        # upstream -> count (shared by its routes)
+        self.user_in_flight = defaultdict(int)   # (user, route name) -> count
+        self.admitted = defaultdict(int)
+        self.rejected = defaultdict(int)
+
+    def match(self, path: str) -> Optional[RouteLimit]:
+        if path.startswith(self.EXEMPT_PREFIXES):
+            return None
+        for limit in self.limits:
+            if path.startswith(limit.prefix):
+                return limit
+        return None
+
+    def _bucket(self, user: str, limit: RouteLimit) -> TokenBucket:
+        key = (user, limit.name)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(limit.rate, limit.burst)
+            self.buckets[key] = bucket
+            while len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket
+
+    def acquire(self, user: str, limit: RouteLimit):
+        """
+        Admits a request or raises Rejection. Callers must 'release' after an admitted request.
+        """
+        if limit.max_concurrent and self.in_flight[limit.upstream] >= limit.max_concurrent:
+            self.rejected[limit.name] += 1
+            raise Rejection(503, 1, f"'{limit.upstream}' is at capacity")
+        if limit.per_user_concurrent and self.user_in_flight[(user, limit.name)] >= limit.per_user_concurrent:
+            self.rejected[limit.name] += 1
+            raise Rejection(429, 1, f"Too many concurrent '{limit.name}' requests")
+
+        admitted, retry_after = self._bucket(user, limit).try_take()
+        if not admitted:
+            self.rejected[limit.name] += 1
+            raise Rejection(429, retry_after, "Rate limit exceeded")
+
+        self.in_flight[limit.upstream] += 1
+        self.user_in_flight[(user, limit.name)] += 1
+        self.admitted[limit.name] += 1
+
+    def release(self, user: str, limit: RouteLimit):
+        self.in_flight[limit.upstream] -= 1
+        key = (user, limit.name)
+        self.user_in_flight[key] -= 1
+        if self.user_in_flight[key] <= 0:
+            del self.user_in_flight[key]
+
+    def stats(self) -> dict:
+        return {
+            limit.name: {
+                "rate": limit.rate,
+                "burst": limit.burst,
+                "upstream": limit.upstream,
+                "max_concurrent": limit.max_concurrent,
+                "in_flight": self.in_flight[limit.upstream],
+                "admitted": self.admitted[limit.name],
+                "rejected": self.rejected[limit.name],
+            }
+            for limit in self.limits
+        }
+
+admission = AdmissionController(DEFAULT_LIMITS)
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying 'admission' to HTTP requests and WebSocket handshakes.
+    Must run inside GatewayAuthMiddleware so the verified user is known; falls back to client IP.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not settings.ADMISSION_ENABLED or scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+        if scope["type"] == "http" and scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+
+        limit = admission.match(scope["path"])
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        user = scope.get("state", {}).get("user")
+        if user is None:
+            client = scope.get("client")
+            user = f"ip:{client[0]}" if client else "anonymous"
+
+        try:
+            admission.acquire(user, limit)
+        except Rejection as r:
+            logger.warning(f"🚦 Rejected {scope['path']} for {user}: {r.detail}")
+            return await self._reject(scope, receive, send, r)
+
+        # Slot is held until the response (or WebSocket session) is finished
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release(user, limit)
+
+    @staticmethod
+    async def _reject(scope, receive, send, rejection: Rejection):
+        if scope["type"] == "websocket":
+            await receive()
+            # 1013 = Try Again Later; before accept this becomes an HTTP 403 on the handshake
+            await send({"type": "websocket.close", "code": 1013, "reason": rejection.detail})
+            return
+        body = json.dumps({"detail": rejection.detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": rejection.status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"retry-after", str(rejection.retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,159 @@
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from config import settings
+
+logger = logging.getLogger("Gateway_Cache")
+
+class CacheRule:
+    """
+    Caching policy for one upstream path prefix.
+
+    Args:
+        ttl (float): Seconds an entry is served as fresh.
+        stale_ttl (float): Extra seconds a stale entry may be served while it is refreshed in the background.
+        vary_auth (bool): Key entries per Authorization header (for user-specific responses).
+    """
+
+    def __init__(self, upstream: str, prefix: str, ttl: float, stale_ttl: float = 0.0, vary_auth: bool = False):
+        self.upstream = upstream
+        self.prefix = prefix.strip("/")
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.vary_auth = vary_auth
+
+    def matches(self, upstream: str, path: str) -> bool:
+        # Whole path segments only: 'weather' covers 'weather/...' but not 'weather-admin'
+        path = path.strip("/")
+        return upstream == self.upstream and (path == self.prefix or path.startswith(self.prefix + "/"))
+
+# Dashboard widgets poll these through 'info_proxy'
+DEFAULT_RULES: List[CacheRule] = [
+    CacheRule("info", "system/stats", ttl=2, stale_ttl=3),
+    CacheRule("info", "weather", ttl=600, stale_ttl=1800),
+    CacheRule("info", "news", ttl=300, stale_ttl=900),
+    CacheRule("info", "search", ttl=300, stale_ttl=600),
+    CacheRule("auth", "users/me", ttl=30, stale_ttl=0, vary_auth=True),
+]
+
+class CachedResponse:
+    """A fully buffered upstream reply."""
+
+    def __init__(self, status_code: int, headers: List[Tuple[str, str]], body: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.stored_at = time.monotonic()
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+    @property
+    def cacheable(self) -> bool:
+        if self.status_code != 200:
+            return False
+        cache_control = ",".join(v for k, v in self.headers if k.lower() == "cache-control").lower()
+        return "no-store" not in cache_control
+
+class ResponseCache:
+    """
+    In-process GET cache with per-route TTLs, stale-while-revalidate and single-flight coalescing.
+    Concurrent identical misses share one upstream call.
+    """
+
+    def __init__(self, rules: List[CacheRule], max_entries: int = 1024):
+        self.rules = rules
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self._tasks: Set[asyncio.Task] = set() # Strong refs: the loop only keeps weak ones
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "refreshes": 0, "errors": 0}
+
+    def match(self, upstream: str, path: str) -> Optional[CacheRule]:
+        for rule in self.rules:
+            if rule.matches(upstream, path):
+                return rule
+        return None
+
+    @staticmethod
+    def make_key(rule: CacheRule, upstream: str, path: str, query: str, authorization: Optional[str]) -> str:
+        # Sort query params so '?a=1&b=2' and '?b=2&a=1' share an entry
+        normalized_query = "&".join(sorted(query.split("&"))) if query else ""
+        key = f"{upstream}:/{path.strip('/')}?{normalized_query}"
+        if rule.vary_auth:
+            digest = hashlib.sha256((authorization or "").encode()).hexdigest()[:16]
+            key += f"#auth={digest}"
+        return key
+
+    async def get_or_fetch(self, key: str, rule: CacheRule, fetch: Callable[[], Awaitable[CachedResponse]]) -> Tuple[CachedResponse, str]:
+        """
+        Returns (response, cache_status) where cache_status is HIT, STALE, COALESCED or MISS.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry.age <= rule.ttl:
+                self.counters["hits"] += 1
+                self.entries.move_to_end(key)
+                return entry, "HIT"
+            if entry.age <= rule.ttl + rule.stale_ttl:
+                self.counters["stale_hits"] += 1
+                if key not in self.inflight:
+                    self.counters["refreshes"] += 1
+                    self._start_fetch(key, fetch)
+                return entry, "STALE"
+
+        future = self.inflight.get(key)
+        if future is not None:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(future), "COALESCED"
+
+        self.counters["misses"] += 1
+        return await asyncio.shield(self._start_fetch(key, fetch)), "MISS"
+
+    def _start_fetch(self, key: str, fetch: Callable[[], Awaitable[CachedResponse]]) -> asyncio.Future:
+        """Runs the upstream call once; every waiter (and the cache) receives its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.inflight[key] = future
+
+        async def runner():
+            try:
+                response = await fetch()
+                if response.cacheable:
+                    self._store(key, response)
+                future.set_result(response)
+            except Exception as e:
+                self.counters["errors"] += 1
+                future.set_exception(e)
+            finally:
+                self.inflight.pop(key, None)
+
+        task = asyncio.create_task(runner())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        # Background refreshes may have no waiter; mark the exception as retrieved
+        future.add_done_callback(lambda f: f.exception() if not f.cancelled() else None)
+        return future
+
+    def _store(self, key: str, response: CachedResponse):
+        self.entries[key] = response
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["stale_hits"] + self.counters["misses"] + self.counters["coalesced"]
+        served_from_cache = lookups - self.counters["misses"]
+        return {
+            **self.counters,
+            "entries": len(self.entries),
+            "inflight": len(self.inflight),
+            "hit_ratio": round(served_from_cache / lookups, 3) if lookups else 0.0,
+        }
+
+# Singleton Instance
+response_cache = ResponseCache(DEFAULT_RULES, max_entries=settings.GATEWAY_CACHE_MAX_ENTRIES)
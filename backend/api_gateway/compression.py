@@ -0,0 +1,233 @@
+import zlib
+import logging
+from typing import List, Optional
+from websockets import frames
+from websockets.extensions.permessage_deflate import (
+    PerMessageDeflate,
+    ClientPerMessageDeflateFactory,
+    ServerPerMessageDeflateFactory,
+)
+from config import settings
+
+logger = logging.getLogger("Gateway_Compression")
+
+# Optional codecs: negotiated only when the library is installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Only textual payloads are worth compressing. SSE is excluded so token streams are not delayed,
+# and audio is already compressed or noise-like.
+COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/html", "text/css", "text/xml",
+                      "application/javascript", "application/xml")
+
+# --- HTTP CONTENT ENCODERS ---
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self):
+        self.obj = zlib.compressobj(settings.COMPRESSION_LEVEL_GZIP, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        # Sync flush keeps streamed bodies decodable chunk by chunk
+        return self.obj.compress(data) + self.obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self.obj.flush(zlib.Z_FINISH)
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self):
+        self.obj = brotli.Compressor(quality=settings.COMPRESSION_LEVEL_BROTLI)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.obj.process(data) + self.obj.flush()
+
+    def finish(self) -> bytes:
+        return self.obj.finish()
+
+class ZstdEncoder:
+    name = "zstd"
+
+    def __init__(self):
+        self.obj = zstandard.ZstdCompressor(level=settings.COMPRESSION_LEVEL_ZSTD).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self.obj.compress(data) + self.obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self.obj.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+def available_encoders() -> List[type]:
+    """Server preference order: best ratio/speed first."""
+    encoders = []
+    if zstandard is not None:
+        encoders.append(ZstdEncoder)
+    if brotli is not None:
+        encoders.append(BrotliEncoder)
+    encoders.append(GzipEncoder)
+    return encoders
+
+def negotiate(accept_encoding: str) -> Optional[type]:
+    """Picks the preferred encoder the client accepts (q=0 means refused)."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token.strip().lower()] = q
+
+    for encoder in available_encoders():
+        q = accepted.get(encoder.name, accepted.get("*", 0.0))
+        if q > 0:
+            return encoder
+    return None
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing HTTP responses with zstd / br / gzip based on Accept-Encoding.
+
+    Bodies below COMPRESSION_MIN_SIZE, non-textual content types and responses that are
+    already encoded (e.g. passed through from an upstream) are sent untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not settings.COMPRESSION_ENABLED or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        accept = ""
+        for key, value in scope["headers"]:
+            if key == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoder_cls = negotiate(accept) if accept else None
+        if encoder_cls is None:
+            return await self.app(scope, receive, send)
+
+        responder = _CompressionResponder(send, encoder_cls)
+        await self.app(scope, receive, responder.send)
+
+class _CompressionResponder:
+    """Per-response state machine: decide -> (compress | passthrough)."""
+
+    def __init__(self, send, encoder_cls):
+        self._send = send
+        self.encoder_cls = encoder_cls
+        self.encoder = None
+        self.start_message = None
+        self.buffer = b""
+        self.mode = None  # None (undecided), "compress" or "passthrough"
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            if not self._eligible(message):
+                self.mode = "passthrough"
+                await self._send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.mode == "passthrough":
+            return await self._send(message)
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.mode is None:
+            self.buffer += body
+            if more_body and len(self.buffer) < settings.COMPRESSION_MIN_SIZE:
+                return # Keep buffering until we know the body is big enough
+            if len(self.buffer) < settings.COMPRESSION_MIN_SIZE:
+                self.mode = "passthrough"
+                await self._send(self.start_message)
+                return await self._send({"type": "http.response.body", "body": self.buffer, "more_body": False})
+
+            self.mode = "compress"
+            self.encoder = self.encoder_cls()
+            await self._send(self._compressed_start())
+            body, self.buffer = self.buffer, b""
+
+        data = self.encoder.compress(body)
+        if not more_body:
+            data += self.encoder.finish()
+        await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    def _eligible(self, message) -> bool:
+        content_type, encoded, length = "", False, None
+        for key, value in message.get("headers", []):
+            if key == b"content-type":
+                content_type = value.decode("latin-1").lower()
+            elif key == b"content-encoding":
+                encoded = True
+            elif key == b"content-length":
+                length = int(value)
+        if encoded or not content_type.startswith(COMPRESSIBLE_TYPES):
+            return False
+        return length is None or length >= settings.COMPRESSION_MIN_SIZE
+
+    def _compressed_start(self) -> dict:
+        headers = [(k, v) for k, v in self.start_message.get("headers", [])
+                   if k not in (b"content-length", b"vary")]
+        vary = [v for k, v in self.start_message.get("headers", []) if k == b"vary"]
+        vary_value = b", ".join(vary + [b"Accept-Encoding"]) if vary else b"Accept-Encoding"
+        headers += [(b"content-encoding", self.encoder_cls.name.encode()), (b"vary", vary_value)]
+        return dict(self.start_message, headers=headers)
+
+# --- WEBSOCKET PER-MESSAGE DEFLATE (TEXT ONLY) ---
+class TextOnlyPerMessageDeflate(PerMessageDeflate):
+    """
+    permessage-deflate that leaves binary messages uncompressed.
+    RFC 7692 lets each message choose (RSV1 unset = raw), so audio frames skip the deflate CPU cost
+    while JSON 'text_chunk' frames are still compressed. Incoming frames are decoded as usual.
+    """
+
+    def encode(self, frame: frames.Frame) -> frames.Frame:
+        if frame.opcode == frames.Opcode.BINARY:
+            self._raw_message = not frame.fin
+            return frame
+        if frame.opcode == frames.Opcode.CONT and getattr(self, "_raw_message", False):
+            self._raw_message = not frame.fin
+            return frame
+        return super().encode(frame)
+
+class TextOnlyClientDeflateFactory(ClientPerMessageDeflateFactory):
+    def process_response_params(self, params, accepted_extensions):
+        extension = super().process_response_params(params, accepted_extensions)
+        extension.__class__ = TextOnlyPerMessageDeflate
+        return extension
+
+class TextOnlyServerDeflateFactory(ServerPerMessageDeflateFactory):
+    def process_request_params(self, params, accepted_extensions):
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        extension.__class__ = TextOnlyPerMessageDeflate
+        return response_params, extension
+
+def client_ws_extensions() -> list:
+    """Extensions for the Gateway -> Cortex leg (websockets.connect)."""
+    return [TextOnlyClientDeflateFactory()] if settings.WS_TEXT_DEFLATE else []
+
+# Browser-facing leg: uvicorn's websockets protocol with the text-only factory swapped in.
+# Selected via 'uvicorn.run(..., ws=TextOnlyDeflateWebSocketProtocol)' in main.py.
+try:
+    from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol as _UvicornWebSocketProtocol
+
+    class TextOnlyDeflateWebSocketProtocol(_UvicornWebSocketProtocol):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            if self.available_extensions and settings.WS_TEXT_DEFLATE:
+                self.available_extensions = [TextOnlyServerDeflateFactory()]
+except ImportError:
+    TextOnlyDeflateWebSocketProtocol = None
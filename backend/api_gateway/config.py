@@ -9,11 +9,67 @@ class Settings(BaseSettings):
     API_PREFIX: str = "/api/v1"
     SECRET_KEY: str = os.getenv("SECRET_KEY", "super_secret_neural_key_change_in_prod")
     ALGORITHM: str = "HS256"
+    # Reject requests without a token (public paths excepted). Off keeps anonymous access working.
+    GATEWAY_AUTH_REQUIRED: bool = os.getenv("GATEWAY_AUTH_REQUIRED", "false").lower() == "true"
+    GATEWAY_AUTH_CACHE_SIZE: int = int(os.getenv("GATEWAY_AUTH_CACHE_SIZE", "4096"))
     
     # Service Discovery (Internal Docker Network URLs)
     AUTH_SERVICE_URL: str = os.getenv("AUTH_SERVICE_URL", "http://auth_service:8002")
     CORTEX_URL: str = os.getenv("CORTEX_URL", "http://cortex:8000")
     INFO_SERVICE_URL: str = os.getenv("INFO_SERVICE_URL", "http://info_service:8007")
+    STT_SERVICE_URL: str = os.getenv("STT_SERVICE_URL", "http://stt_service:8003")
+    
+    # Upstream Connection Pools (one long-lived client per upstream service)
+    UPSTREAM_TIMEOUT: float = float(os.getenv("UPSTREAM_TIMEOUT", "60.0"))
+    UPSTREAM_CONNECT_TIMEOUT: float = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5.0"))
+    UPSTREAM_MAX_CONNECTIONS: int = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+    UPSTREAM_MAX_KEEPALIVE: int = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+    UPSTREAM_KEEPALIVE_EXPIRY: float = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30.0"))
+    # HTTP/2 needs the 'h2' package (httpx[http2]); falls back to HTTP/1.1 if missing
+    UPSTREAM_HTTP2: bool = os.getenv("UPSTREAM_HTTP2", "false").lower() == "true"
+    
+    # Resilience: circuit breakers, retries (idempotent GETs only) and hedged reads
+    BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_RECOVERY_TIMEOUT: float = float(os.getenv("BREAKER_RECOVERY_TIMEOUT", "15.0"))
+    UPSTREAM_RETRIES: int = int(os.getenv("UPSTREAM_RETRIES", "2"))
+    UPSTREAM_RETRY_BASE_DELAY: float = float(os.getenv("UPSTREAM_RETRY_BASE_DELAY", "0.1"))
+    # Seconds to wait on the primary before racing a replica (0 disables hedging)
+    UPSTREAM_HEDGE_DELAY: float = float(os.getenv("UPSTREAM_HEDGE_DELAY", "0"))
+    # Comma-separated replica base URLs used for hedged reads
+    INFO_SERVICE_REPLICAS: str = os.getenv("INFO_SERVICE_REPLICAS", "")
+    AUTH_SERVICE_REPLICAS: str = os.getenv("AUTH_SERVICE_REPLICAS", "")
+    
+    # Gateway GET Cache (per-route TTLs live in cache.py)
+    GATEWAY_CACHE_ENABLED: bool = os.getenv("GATEWAY_CACHE_ENABLED", "true").lower() == "true"
+    GATEWAY_CACHE_MAX_ENTRIES: int = int(os.getenv("GATEWAY_CACHE_MAX_ENTRIES", "1024"))
+    
+    # Admission Control (per-user token buckets + global in-flight caps per upstream, see admission.py)
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_LLM_RATE: float = float(os.getenv("ADMISSION_LLM_RATE", "0.5"))        # turns/sec per user
+    ADMISSION_LLM_BURST: int = int(os.getenv("ADMISSION_LLM_BURST", "5"))
+    ADMISSION_LLM_MAX_CONCURRENT: int = int(os.getenv("ADMISSION_LLM_MAX_CONCURRENT", "32"))
+    ADMISSION_STT_RATE: float = float(os.getenv("ADMISSION_STT_RATE", "0.5"))
+    ADMISSION_STT_BURST: int = int(os.getenv("ADMISSION_STT_BURST", "5"))
+    ADMISSION_STT_MAX_CONCURRENT: int = int(os.getenv("ADMISSION_STT_MAX_CONCURRENT", "4"))
+    ADMISSION_DEFAULT_RATE: float = float(os.getenv("ADMISSION_DEFAULT_RATE", "20"))
+    ADMISSION_DEFAULT_BURST: int = int(os.getenv("ADMISSION_DEFAULT_BURST", "40"))
+    
+    # Response Compression (zstd / br used only if 'zstandard' / 'brotli' are installed)
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # bytes
+    COMPRESSION_LEVEL_GZIP: int = 6
+    COMPRESSION_LEVEL_BROTLI: int = 4
+    COMPRESSION_LEVEL_ZSTD: int = 3
+    # permessage-deflate for text frames only; binary audio frames are sent raw
+    WS_TEXT_DEFLATE: bool = os.getenv("WS_TEXT_DEFLATE", "true").lower() == "true"
+    
+    # WebSocket Tunnel (Client <-> Gateway <-> Cortex)
+    WS_TUNNEL_QUEUE_SIZE: int = int(os.getenv("WS_TUNNEL_QUEUE_SIZE", "64"))   # Frames buffered per direction
+    WS_UPSTREAM_MAX_QUEUE: int = int(os.getenv("WS_UPSTREAM_MAX_QUEUE", "16")) # websockets receive buffer
+    WS_TUNNEL_SLOW_CONSUMER_TIMEOUT: float = float(os.getenv("WS_TUNNEL_SLOW_CONSUMER_TIMEOUT", "5.0"))
+    # Multiplex many client sessions over a few upstream sockets (requires Cortex /ws/mux)
+    WS_TUNNEL_MULTIPLEX: bool = os.getenv("WS_TUNNEL_MULTIPLEX", "false").lower() == "true"
+    WS_TUNNEL_POOL_SIZE: int = int(os.getenv("WS_TUNNEL_POOL_SIZE", "2"))
     
     # Direct access to specific specialized services if needed (optional via Gateway)
     # Usually, we route everything smart through Cortex.
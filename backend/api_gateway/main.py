@@ -1,18 +1,43 @@
 import httpx
 import logging
-import asyncio
-import websockets
-import os
-from fastapi import FastAPI, Request, HTTPException, WebSocket, WebSocketDisconnect
-from fastapi.responses import Response
+from urllib.parse import urlencode
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, HTTPException, WebSocket
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from config import settings
+from upstream import upstreams
+from security import GatewayAuthMiddleware, claims_cache
+from admission import AdmissionMiddleware, admission
+from resilience import send_resilient, CircuitOpenError
+from compression import CompressionMiddleware, TextOnlyDeflateWebSocketProtocol
+from cache import response_cache, CachedResponse
+from tunnel import tunnel_registry, run_direct_tunnel, run_mux_tunnel, MuxPool
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 logger = logging.getLogger("API_Gateway")
 
-app = FastAPI(title=settings.PROJECT_NAME, version=settings.VERSION)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open pooled upstream clients on startup and drain them on shutdown."""
+    global mux_pool
+    await upstreams.startup()
+    if settings.WS_TUNNEL_MULTIPLEX:
+        cortex_host = settings.CORTEX_URL.replace("http://", "ws://").replace("https://", "wss://")
+        mux_pool = MuxPool(f"{cortex_host}/ws/mux", settings.WS_TUNNEL_POOL_SIZE)
+    yield
+    if mux_pool is not None:
+        await mux_pool.close()
+    await upstreams.shutdown()
+
+app = FastAPI(title=settings.PROJECT_NAME, version=settings.VERSION, lifespan=lifespan)
+
+# Middleware order (outermost last): CORS -> Compression -> Auth -> Admission.
+# Admission runs inside Auth so limits are keyed by the verified user.
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(GatewayAuthMiddleware)
+app.add_middleware(CompressionMiddleware)
 
 # CORS Configuration
 app.add_middleware(
@@ -23,109 +48,225 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# --- CONFIG FALLBACKS ---
-# Ensure we catch env vars even if config.py isn't updated immediately
-STT_SERVICE_URL = os.getenv("STT_SERVICE_URL", "http://stt_service:8003")
-
 # --- HTTP UTILS ---
-async def forward_request(url: str, method: str, payload: dict = None, headers: dict = None):
-    async with httpx.AsyncClient(timeout=60.0) as client:
+# Hop-by-hop headers (RFC 7230 §6.1) are connection-specific and never forwarded.
+# 'host' is rewritten by the client for the upstream URL.
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "transfer-encoding", "upgrade", "host",
+}
+
+def filter_headers(pairs) -> list:
+    """Drops hop-by-hop headers, keeping everything else (including duplicates) unchanged."""
+    return [(k, v) for k, v in pairs if k.lower() not in HOP_BY_HOP_HEADERS]
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+def build_upstream_request(pool, path: str, request: Request, headers: list = None, base_url: str = None):
+    """Builds the outgoing request with the raw query string and (if present) a streamed body."""
+    target_url = pool.url(path, base_url)
+    if request.url.query:
+        target_url += f"?{request.url.query}"
+
+    # Only attach a body stream when the client actually sent one
+    has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
+    return pool.client.build_request(
+        request.method,
+        target_url,
+        headers=headers if headers is not None else filter_headers(request.headers.items()),
+        content=request.stream() if has_body else None,
+    )
+
+def upstream_error(pool, exc: Exception) -> HTTPException:
+    """Maps a failed upstream call to the HTTPException returned to the client."""
+    pool.errors_total += 1
+    if isinstance(exc, CircuitOpenError):
+        return HTTPException(status_code=503, detail="Service unavailable (circuit open)",
+                             headers={"Retry-After": str(max(1, int(exc.retry_after)))})
+    if isinstance(exc, httpx.TimeoutException):
+        return HTTPException(status_code=504, detail="Upstream timeout")
+    if isinstance(exc, httpx.TransportError):
+        return HTTPException(status_code=503, detail="Service unavailable")
+    logger.error(f"Gateway Error: {exc}")
+    return HTTPException(status_code=500, detail="Internal Gateway Error")
+
+async def forward_request(upstream: str, path: str, request: Request):
+    """
+    Raw streaming proxy through the long-lived pooled client of the given upstream.
+    
+    The request body is forwarded chunk by chunk without being parsed, and the upstream
+    reply is streamed back as it arrives, so memory stays flat regardless of payload size
+    (e.g. multipart uploads to /stt/transcribe/async).
+    Idempotent GETs on cacheable routes are served from the gateway cache instead.
+    """
+    if settings.GATEWAY_CACHE_ENABLED and request.method == "GET":
+        rule = response_cache.match(upstream, path)
+        if rule is not None:
+            return await forward_cached(upstream, path, request, rule)
+
+    pool = upstreams.get(upstream)
+    has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
+    idempotent = request.method in IDEMPOTENT_METHODS and not has_body
+
+    pool.requests_total += 1
+    pool.in_flight += 1
+    try:
+        resp = await send_resilient(
+            pool,
+            lambda base_url: build_upstream_request(pool, path, request, base_url=base_url),
+            idempotent=idempotent,
+            stream=True,
+        )
+    except Exception as e:
+        pool.in_flight -= 1
+        raise upstream_error(pool, e)
+    except BaseException:
+        pool.in_flight -= 1 # Cancelled (client disconnected) before the reply started
+        raise
+
+    async def relay():
+        # aiter_raw keeps upstream Content-Encoding untouched, so its headers stay valid
         try:
-            req_args = {"headers": headers}
-            if method == "GET":
-                req_args["params"] = payload
-            elif method in ["POST", "PUT", "PATCH", "DELETE"]:
-                req_args["json"] = payload
-
-            resp = await client.request(method, url, **req_args)
-            return Response(content=resp.content, status_code=resp.status_code, media_type=resp.headers.get("content-type"))
-        except httpx.ConnectError:
-            raise HTTPException(status_code=503, detail="Service unavailable")
-        except Exception as e:
-            logger.error(f"Gateway Error: {e}")
-            raise HTTPException(status_code=500, detail="Internal Gateway Error")
+            async for chunk in resp.aiter_raw():
+                yield chunk
+        finally:
+            # Runs on completion and on client disconnect alike
+            await resp.aclose()
+            pool.in_flight -= 1
+
+    response = StreamingResponse(relay(), status_code=resp.status_code)
+    response.raw_headers = [
+        (k.lower().encode("latin-1"), v.encode("latin-1"))
+        for k, v in filter_headers(resp.headers.multi_items())
+    ]
+    return response
+
+async def forward_cached(upstream: str, path: str, request: Request, rule):
+    """
+    Serves a GET from the response cache; misses are coalesced into a single buffered upstream call.
+    """
+    pool = upstreams.get(upstream)
+    key = response_cache.make_key(rule, upstream, path, request.url.query, request.headers.get("authorization"))
+
+    # Cached bodies are stored decoded so any client can be served regardless of its Accept-Encoding
+    headers = [(k, v) for k, v in filter_headers(request.headers.items()) if k.lower() != "accept-encoding"]
+
+    async def fetch() -> CachedResponse:
+        pool.requests_total += 1
+        pool.in_flight += 1
+        try:
+            resp = await send_resilient(
+                pool,
+                lambda base_url: build_upstream_request(pool, path, request, headers, base_url=base_url),
+                idempotent=True,
+            )
+            kept = [(k, v) for k, v in filter_headers(resp.headers.multi_items())
+                    if k.lower() not in ("content-length", "content-encoding", "age")]
+            return CachedResponse(resp.status_code, kept, resp.content)
+        finally:
+            pool.in_flight -= 1
+
+    try:
+        cached, status = await response_cache.get_or_fetch(key, rule, fetch)
+    except Exception as e:
+        raise upstream_error(pool, e)
+
+    response = Response(content=cached.body, status_code=cached.status_code)
+    response.raw_headers = [
+        (k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in cached.headers
+    ] + [
+        (b"content-length", str(len(cached.body)).encode()),
+        (b"x-gateway-cache", status.encode()),
+        (b"age", str(int(cached.age)).encode()),
+    ]
+    return response
 
 # --- WEBSOCKET PROXY UTILS ---
-async def forward_ws(client_ws: WebSocket, target_url: str):
+# Shared upstream sockets for multiplexed mode (created in lifespan when enabled)
+mux_pool = None
+
+async def forward_ws(client_ws: WebSocket, session_id: str, params: dict):
     """
     Establishes a WebSocket tunnel between the Client and the Target Service (Cortex).
-    Manages bidirectional streaming of Text (JSON) and Binary (Audio).
+    Manages bidirectional streaming of Text (JSON) and Binary (Audio) through bounded queues.
     """
-    async with websockets.connect(target_url) as server_ws:
+    try:
+        if mux_pool is not None:
+            await run_mux_tunnel(mux_pool, client_ws, session_id, params)
+        else:
+            cortex_host = settings.CORTEX_URL.replace("http://", "ws://").replace("https://", "wss://")
+            target_url = f"{cortex_host}/ws/chat/{session_id}?{urlencode(params)}"
+            logger.info(f"Opening WS Tunnel: {target_url}")
+            await run_direct_tunnel(client_ws, target_url, session_id)
+    except Exception as e:
+        logger.error(f"WS Tunnel Error: {e}")
         try:
-            # Task 1: Client -> Server
-            async def client_to_server():
-                try:
-                    while True:
-                        message = await client_ws.receive()
-                        if message["type"] == "websocket.receive":
-                            if "text" in message:
-                                await server_ws.send(message["text"])
-                            elif "bytes" in message:
-                                await server_ws.send(message["bytes"])
-                except (WebSocketDisconnect, websockets.exceptions.ConnectionClosed):
-                    pass # Normal closure
-
-            # Task 2: Server -> Client
-            async def server_to_client():
-                try:
-                    async for message in server_ws:
-                        # Forward raw message (text or binary) directly
-                        if isinstance(message, str):
-                            await client_ws.send_text(message)
-                        else:
-                            await client_ws.send_bytes(message)
-                except (WebSocketDisconnect, websockets.exceptions.ConnectionClosed):
-                    pass # Normal closure
-
-            # Run both tasks concurrently
-            await asyncio.gather(client_to_server(), server_to_client())
-
-        except Exception as e:
-            logger.error(f"WS Tunnel Error: {e}")
             await client_ws.close(code=1011)
+        except RuntimeError:
+            pass # Already closed
 
 # --- ROUTES ---
 
 @app.get("/health")
 def health():
-    return {"status": "active", "service": "gateway"}
+    breakers = upstreams.breakers()
+    degraded = any(b["state"] != "closed" for b in breakers.values())
+    return {"status": "degraded" if degraded else "active", "service": "gateway", "breakers": breakers}
+
+@app.get("/diagnostics/upstreams")
+def upstream_diagnostics():
+    """
+    Connection pool statistics for every upstream service.
+    """
+    return upstreams.stats()
+
+@app.get("/diagnostics/cache")
+def cache_diagnostics():
+    """
+    Hit / miss / coalesce counters of the gateway GET cache.
+    """
+    return response_cache.stats()
+
+@app.get("/diagnostics/auth")
+def auth_diagnostics():
+    """
+    Verified-claims cache statistics.
+    """
+    return claims_cache.stats()
+
+@app.get("/diagnostics/admission")
+def admission_diagnostics():
+    """
+    In-flight counts and admit / reject counters per limited route.
+    """
+    return admission.stats()
+
+@app.get("/diagnostics/tunnels")
+def tunnel_diagnostics():
+    """
+    Per-tunnel byte, frame and queue-depth metrics for live WebSocket sessions.
+    """
+    stats = tunnel_registry.stats()
+    stats["mux_pool"] = mux_pool.stats() if mux_pool is not None else None
+    return stats
 
 # HTTP Routes (Auth, Info, etc.)
-@app.api_route("/auth/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
+@app.api_route("/auth/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
 async def auth_proxy(path: str, request: Request):
-    payload = await request.json() if request.method in ["POST", "PUT", "PATCH"] else request.query_params
-    target_url = f"{settings.AUTH_SERVICE_URL}/{path}"
-    return await forward_request(target_url, request.method, payload, dict(request.headers))
+    return await forward_request("auth", path, request)
 
-@app.api_route("/info/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
+@app.api_route("/info/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
 async def info_proxy(path: str, request: Request):
-    if request.method in ["POST", "PUT", "PATCH"]:
-        try:
-            payload = await request.json()
-        except:
-            payload = {}
-    else:
-        payload = request.query_params
-    target_url = f"{settings.INFO_SERVICE_URL}/{path}"
-    return await forward_request(target_url, request.method, payload, dict(request.headers))
+    return await forward_request("info", path, request)
 
 # --- FIX: ADD STT ROUTE ---
-@app.api_route("/stt/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
+@app.api_route("/stt/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
 async def stt_proxy(path: str, request: Request):
     """
     Forward requests to the STT Service.
+    Multipart audio uploads are streamed through untouched.
     """
-    if request.method in ["POST", "PUT", "PATCH"]:
-        try:
-            payload = await request.json()
-        except:
-            payload = {}
-    else:
-        payload = request.query_params
-
-    target_url = f"{STT_SERVICE_URL}/{path}"
-    return await forward_request(target_url, request.method, payload, dict(request.headers))
+    return await forward_request("stt", path, request)
 
 # --- CORTEX ROUTES (HTTP & WS) ---
 
@@ -136,17 +277,19 @@ async def cortex_ws_proxy(websocket: WebSocket, session_id: str, token: str = No
     Connects: Client <-> Gateway <-> Cortex Service
     """
     await websocket.accept()
-    
-    # Construct internal Cortex WS URL
-    cortex_host = settings.CORTEX_URL.replace("http://", "ws://").replace("https://", "wss://")
-    target_url = f"{cortex_host}/ws/chat/{session_id}?token={token}&persona_id={persona_id}"
-    
-    logger.info(f"Opening WS Tunnel: {target_url}")
-    await forward_ws(websocket, target_url)
+    params = {"token": token, "persona_id": persona_id}
+    # Identity verified by GatewayAuthMiddleware during the handshake; Cortex binds the session to it
+    user = websocket.scope.get("state", {}).get("user")
+    if user is not None:
+        params["user_id"] = user
+    await forward_ws(websocket, session_id, params)
 
-@app.api_route("/cortex/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
+@app.api_route("/cortex/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
 async def cortex_http_proxy(path: str, request: Request):
-    # Fallback for HTTP requests to Cortex
-    payload = await request.json() if request.method in ["POST", "PUT", "PATCH"] else request.query_params
-    target_url = f"{settings.CORTEX_URL}/{path}"
-    return await forward_request(target_url, request.method, payload, dict(request.headers))
\ No newline at end of file
+    # Fallback for HTTP requests to Cortex (SSE replies from /interact stream through as-is)
+    return await forward_request("cortex", path, request)
+
+if __name__ == "__main__":
+    import uvicorn
+    # Launched this way (not the uvicorn CLI) so the text-only permessage-deflate protocol can be used
+    uvicorn.run(app, host="0.0.0.0", port=8000, ws=TextOnlyDeflateWebSocketProtocol or "auto")
@@ -0,0 +1,154 @@
+import time
+import random
+import asyncio
+import logging
+from typing import Callable
+import httpx
+from config import settings
+
+logger = logging.getLogger("Gateway_Resilience")
+
+# Statuses that signal an unhealthy upstream (as opposed to an application error)
+RETRYABLE_STATUS = {502, 503, 504}
+
+class CircuitOpenError(Exception):
+    """Raised when a call is short-circuited because the upstream's breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit for '{name}' is open")
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Per-upstream circuit breaker.
+
+    closed    -> calls flow; consecutive failures are counted.
+    open      -> calls fail immediately until 'recovery_timeout' has passed.
+    half_open -> a single probe call is let through; success closes, failure re-opens.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.trips_total = 0
+
+    def allow(self):
+        """Raises CircuitOpenError if the call must not be attempted."""
+        if self.state == self.OPEN:
+            remaining = self.recovery_timeout - (time.monotonic() - self.opened_at)
+            if remaining > 0:
+                raise CircuitOpenError(self.name, remaining)
+            self.state = self.HALF_OPEN
+            self.probe_in_flight = False
+
+        if self.state == self.HALF_OPEN:
+            if self.probe_in_flight:
+                raise CircuitOpenError(self.name, 1)
+            self.probe_in_flight = True
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"✅ Circuit closed: {self.name}")
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips_total += 1
+                logger.warning(f"⛔ Circuit opened: {self.name} after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "failures": self.failures, "trips_total": self.trips_total}
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, settings.UPSTREAM_RETRY_BASE_DELAY * (2 ** attempt))
+
+def _discard(task: asyncio.Task):
+    """Closes the response of a hedge that lost the race (if it produced one)."""
+    if not task.cancelled() and task.exception() is None:
+        asyncio.create_task(task.result().aclose())
+
+async def _send_hedged(pool, make_request: Callable[[str], httpx.Request], stream: bool) -> httpx.Response:
+    """
+    Sends to the primary; if it has not answered within UPSTREAM_HEDGE_DELAY, races a replica.
+    The first successful response wins and the other call is cancelled.
+    """
+    primary = asyncio.create_task(pool.client.send(make_request(pool.base_url), stream=stream))
+    done, _ = await asyncio.wait({primary}, timeout=settings.UPSTREAM_HEDGE_DELAY)
+    if done:
+        return primary.result()
+
+    pool.hedges_total += 1
+    replica = random.choice(pool.replica_urls)
+    backup = asyncio.create_task(pool.client.send(make_request(replica), stream=stream))
+    pending = {primary, backup}
+    error = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                for loser in pending:
+                    loser.cancel()
+                    loser.add_done_callback(_discard)
+                for other in done - {task}:
+                    _discard(other)
+                return task.result()
+            error = task.exception()
+    raise error
+
+async def send_resilient(pool, make_request: Callable[[str], httpx.Request], idempotent: bool, stream: bool = False) -> httpx.Response:
+    """
+    Sends a request through the pool's circuit breaker.
+
+    - Idempotent calls are retried on transport errors and 502/503/504 with jittered backoff.
+    - Idempotent calls are hedged against a replica when the pool has replicas and hedging is on.
+    - Non-idempotent calls (streamed bodies) are attempted exactly once.
+
+    Raises:
+        CircuitOpenError: If the upstream's breaker is open.
+        httpx.TransportError: If every attempt failed at the transport level.
+    """
+    attempts = 1 + (settings.UPSTREAM_RETRIES if idempotent else 0)
+    hedge = idempotent and pool.replica_urls and settings.UPSTREAM_HEDGE_DELAY > 0
+
+    for attempt in range(attempts):
+        last_attempt = attempt == attempts - 1
+        pool.breaker.allow()
+        try:
+            if hedge:
+                resp = await _send_hedged(pool, make_request, stream)
+            else:
+                resp = await pool.client.send(make_request(pool.base_url), stream=stream)
+        except httpx.TransportError:
+            pool.breaker.record_failure()
+            if last_attempt:
+                raise
+        except BaseException:
+            # Cancellation or programming error: free the half-open probe slot
+            pool.breaker.probe_in_flight = False
+            raise
+        else:
+            if resp.status_code not in RETRYABLE_STATUS:
+                pool.breaker.record_success()
+                return resp
+            pool.breaker.record_failure()
+            if last_attempt:
+                return resp
+            await resp.aclose()
+
+        pool.retries_total += 1
+        await asyncio.sleep(backoff_delay(attempt))
@@ -1,8 +1,14 @@
-import httpx
-from fastapi import HTTPException, Security, Request
+import time
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import parse_qs
+from jose import jwt, JWTError
+from fastapi import HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from config import settings
-import logging
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO)
@@ -10,31 +16,168 @@ logger = logging.getLogger("Gateway_Security")
 
 security = HTTPBearer()
 
+# Identity headers injected for downstream services. Client-supplied copies are always stripped.
+USER_HEADER = "x-user-id"
+VERIFIED_HEADER = "x-auth-verified"
+
+# Reachable without a token even when GATEWAY_AUTH_REQUIRED is on
+PUBLIC_PATHS = ("/health", "/diagnostics", "/docs", "/openapi.json",
+                "/auth/login", "/auth/register", "/auth/refresh", "/auth/reset-password")
+
+class ClaimsCache:
+    """
+    Bounded LRU of verified JWT claims keyed by token digest.
+    Entries are dropped once the token's 'exp' has passed, so a hit is always a still-valid token.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self.digest(token)
+        claims = self.entries.get(key)
+        if claims is None:
+            self.misses += 1
+            return None
+        if claims.get("exp") is not None and claims["exp"] <= time.time():
+            del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: dict):
+        key = self.digest(token)
+        self.entries[key] = claims
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+        }
+
+claims_cache = ClaimsCache(max_entries=settings.GATEWAY_AUTH_CACHE_SIZE)
+
+def decode_token(token: str) -> dict:
+    """
+    Verifies an access token locally (shared secret) and returns its claims.
+    Each distinct token is HMAC-verified once; later calls are served from the claims cache.
+
+    Raises:
+        JWTError: If the signature, expiry or payload is invalid.
+    """
+    claims = claims_cache.get(token)
+    if claims is not None:
+        return claims
+
+    claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    if claims.get("sub") is None:
+        raise JWTError("Invalid token payload")
+    if claims.get("type", "access") != "access":
+        raise JWTError("Not an access token")
+
+    claims_cache.put(token, claims)
+    return claims
+
 async def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)):
     """
-    Validates the JWT token by calling the Auth Service (Introspection) 
-    OR by verifying the signature locally if we share the secret key.
-    
-    For Microservices, local verification (if secret is shared) is faster (no network hop).
+    Validates the JWT token by verifying the signature locally (shared secret).
+
+    For Microservices, local verification is faster than calling the Auth Service (no network hop).
     """
-    token = credentials.credentials
-    
     try:
-        # Option 1: Fast Local Verification (Shared Secret)
-        from jose import jwt, JWTError
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token payload")
-        return username
-        
-        # Option 2: Remote Verification (Call Auth Service)
-        # async with httpx.AsyncClient() as client:
-        #     resp = await client.post(f"{settings.AUTH_SERVICE_URL}/verify", json={"token": token})
-        #     if resp.status_code != 200:
-        #          raise HTTPException(status_code=401, detail="Invalid token")
-        #     return resp.json()
-            
-    except Exception as e:
+        return decode_token(credentials.credentials)["sub"]
+    except JWTError as e:
         logger.warning(f"Authentication Failed: {str(e)}")
-        raise HTTPException(status_code=401, detail="Could not validate credentials")
\ No newline at end of file
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+
+class GatewayAuthMiddleware:
+    """
+    ASGI middleware that authenticates HTTP requests and WebSocket handshakes once, at the edge.
+
+    - Bearer header (or '?token=' on WebSockets) is verified through the claims cache.
+    - On success the identity is forwarded as 'X-User-Id' / 'X-Auth-Verified' headers and
+      stored in 'scope["state"]["user"]', so downstream services can skip re-verification.
+    - Missing or invalid (expired, refresh, ...) tokens pass through anonymously on public paths
+      and whenever GATEWAY_AUTH_REQUIRED is off; otherwise they get 401 (HTTP) or a rejected
+      handshake (WebSocket). Routes that need identity still enforce it themselves.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+
+        # Never trust identity headers coming from the outside
+        headers = [(k, v) for k, v in scope["headers"] if k not in (USER_HEADER.encode(), VERIFIED_HEADER.encode())]
+        token = self._extract_token(scope, headers)
+
+        claims = None
+        if token:
+            try:
+                claims = decode_token(token)
+            except JWTError as e:
+                # A stale/refresh token must not lock the user out of '/auth/*' or anonymous routes
+                logger.warning(f"Authentication Failed: {str(e)}")
+        if claims is None and settings.GATEWAY_AUTH_REQUIRED and not self._is_public(scope):
+            return await self._reject(scope, receive, send)
+
+        if claims is not None:
+            headers.append((USER_HEADER.encode(), str(claims["sub"]).encode()))
+            headers.append((VERIFIED_HEADER.encode(), b"1"))
+            scope.setdefault("state", {})["user"] = claims["sub"]
+
+        scope = dict(scope, headers=headers)
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def _is_public(scope) -> bool:
+        # CORS preflights never carry credentials
+        if scope["type"] == "http" and scope["method"] == "OPTIONS":
+            return True
+        return scope["path"].startswith(PUBLIC_PATHS)
+
+    @staticmethod
+    def _extract_token(scope, headers) -> Optional[str]:
+        for key, value in headers:
+            if key == b"authorization":
+                scheme, _, credentials = value.decode("latin-1").partition(" ")
+                if scheme.lower() == "bearer" and credentials:
+                    return credentials.strip()
+        if scope["type"] == "websocket":
+            # Browsers cannot set headers on WebSockets, so the client sends '?token='
+            token = parse_qs(scope.get("query_string", b"").decode()).get("token", [None])[0]
+            if token and token not in ("null", "undefined", "None"):
+                return token
+        return None
+
+    @staticmethod
+    async def _reject(scope, receive, send):
+        if scope["type"] == "websocket":
+            # Closing before accept makes the server answer the handshake with 403
+            await receive()
+            await send({"type": "websocket.close", "code": 1008})
+            return
+        body = json.dumps({"detail": "Could not validate credentials"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 401,
+            "headers": [(b"content-type", b"application/json"), (b"www-authenticate", b"Bearer")],
+        })
+        await send({"type": "http.response.body", "body": body})
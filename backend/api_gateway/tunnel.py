@@ -0,0 +1,367 @@
+import time
+import uuid
+import json
+import struct
+import asyncio
+import logging
+import itertools
+from typing import Dict, List, Optional
+import websockets
+from fastapi import WebSocket, WebSocketDisconnect
+from config import settings
+from compression import client_ws_extensions
+
+logger = logging.getLogger("Gateway_Tunnel")
+
+# --- MUX FRAMING ---
+# Every multiplexed frame is a binary WS message: [channel id: uint32][kind: uint8][payload].
+# Must stay in sync with backend/cortex/routers/mux.py.
+MUX_HEADER = struct.Struct("!IB")
+KIND_OPEN, KIND_TEXT, KIND_BINARY, KIND_CLOSE = 0, 1, 2, 3
+
+def encode_frame(channel_id: int, kind: int, payload: bytes = b"") -> bytes:
+    return MUX_HEADER.pack(channel_id, kind) + payload
+
+def decode_frame(data: bytes):
+    channel_id, kind = MUX_HEADER.unpack_from(data)
+    return channel_id, kind, data[MUX_HEADER.size:]
+
+# --- METRICS ---
+class TunnelMetrics:
+    """
+    Per-tunnel counters. 'up' is Client -> Cortex, 'down' is Cortex -> Client.
+    """
+
+    def __init__(self, session_id: str, mode: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.session_id = session_id
+        self.mode = mode
+        self.opened_at = time.time()
+        self.bytes_up = 0
+        self.bytes_down = 0
+        self.frames_up = 0
+        self.frames_down = 0
+        self.up_queue: Optional[asyncio.Queue] = None
+        self.down_queue: Optional[asyncio.Queue] = None
+
+    def count_up(self, payload):
+        self.frames_up += 1
+        self.bytes_up += len(payload)
+
+    def count_down(self, payload):
+        self.frames_down += 1
+        self.bytes_down += len(payload)
+
+    def snapshot(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "mode": self.mode,
+            "age_s": round(time.time() - self.opened_at, 1),
+            "bytes_up": self.bytes_up,
+            "bytes_down": self.bytes_down,
+            "frames_up": self.frames_up,
+            "frames_down": self.frames_down,
+            "up_queue_depth": self.up_queue.qsize() if self.up_queue else 0,
+            "down_queue_depth": self.down_queue.qsize() if self.down_queue else 0,
+        }
+
+class TunnelRegistry:
+    """Tracks live tunnels and lifetime totals for diagnostics."""
+
+    def __init__(self):
+        self.active: Dict[str, TunnelMetrics] = {}
+        self.opened_total = 0
+        self.bytes_up_total = 0
+        self.bytes_down_total = 0
+
+    def open(self, session_id: str, mode: str) -> TunnelMetrics:
+        metrics = TunnelMetrics(session_id, mode)
+        self.active[metrics.id] = metrics
+        self.opened_total += 1
+        return metrics
+
+    def close(self, metrics: TunnelMetrics):
+        self.active.pop(metrics.id, None)
+        self.bytes_up_total += metrics.bytes_up
+        self.bytes_down_total += metrics.bytes_down
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self.active),
+            "opened_total": self.opened_total,
+            "bytes_up_total": self.bytes_up_total + sum(m.bytes_up for m in self.active.values()),
+            "bytes_down_total": self.bytes_down_total + sum(m.bytes_down for m in self.active.values()),
+            "tunnels": {tid: m.snapshot() for tid, m in self.active.items()},
+        }
+
+tunnel_registry = TunnelRegistry()
+
+# --- CLIENT SIDE HELPERS ---
+def end_queue(queue: asyncio.Queue):
+    """
+    Queues the end-of-stream sentinel without waiting. Pumps call this from 'finally', where
+    they may have been cancelled with a full queue and nobody left to drain it; the sentinel
+    is then dropped, since 'run_until_first_exit' is already cancelling the reader.
+    """
+    try:
+        queue.put_nowait(None)
+    except asyncio.QueueFull:
+        pass
+
+async def pump_client_to_queue(client_ws: WebSocket, queue: asyncio.Queue, metrics: TunnelMetrics):
+    """
+    Reads browser frames into a bounded queue.
+    When the queue is full, 'put' blocks and we stop reading from the client (backpressure).
+    """
+    try:
+        while True:
+            message = await client_ws.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") is not None:
+                payload = message["text"]
+            elif message.get("bytes") is not None:
+                payload = message["bytes"]
+            else:
+                continue
+            metrics.count_up(payload)
+            await queue.put(payload)
+    except RuntimeError:
+        pass # Socket already closed
+    finally:
+        end_queue(queue)
+
+async def drain_queue_to_client(client_ws: WebSocket, queue: asyncio.Queue, metrics: TunnelMetrics):
+    """
+    Writes queued upstream frames to the browser, one at a time.
+    A slow client leaves frames in the queue, which in turn stalls the upstream reader.
+    """
+    while True:
+        message = await queue.get()
+        if message is None:
+            break
+        metrics.count_down(message)
+        if isinstance(message, str):
+            await client_ws.send_text(message)
+        else:
+            await client_ws.send_bytes(message)
+
+async def run_until_first_exit(*coros):
+    """Runs the pumps concurrently; once one side finishes, the others are cancelled."""
+    tasks = [asyncio.create_task(c) for c in coros]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            exc = task.exception()
+            if exc and not isinstance(exc, (websockets.exceptions.ConnectionClosed, WebSocketDisconnect)):
+                raise exc
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+# --- DIRECT MODE ---
+async def run_direct_tunnel(client_ws: WebSocket, target_url: str, session_id: str):
+    """
+    One dedicated upstream socket per browser socket, with bounded queues in both directions.
+    """
+    metrics = tunnel_registry.open(session_id, "direct")
+    up = asyncio.Queue(maxsize=settings.WS_TUNNEL_QUEUE_SIZE)
+    down = asyncio.Queue(maxsize=settings.WS_TUNNEL_QUEUE_SIZE)
+    metrics.up_queue, metrics.down_queue = up, down
+
+    try:
+        async with websockets.connect(target_url, max_queue=settings.WS_UPSTREAM_MAX_QUEUE,
+                                              extensions=client_ws_extensions()) as server_ws:
+
+            async def queue_to_server():
+                while True:
+                    message = await up.get()
+                    if message is None:
+                        break
+                    await server_ws.send(message)
+
+            async def server_to_queue():
+                try:
+                    async for message in server_ws:
+                        await down.put(message)
+                finally:
+                    end_queue(down)
+
+            await run_until_first_exit(
+                pump_client_to_queue(client_ws, up, metrics),
+                queue_to_server(),
+                server_to_queue(),
+                drain_queue_to_client(client_ws, down, metrics),
+            )
+    finally:
+        tunnel_registry.close(metrics)
+
+# --- MULTIPLEXED MODE ---
+class MuxChannel:
+    """One client session riding on a shared upstream connection."""
+
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.queue = asyncio.Queue(maxsize=settings.WS_TUNNEL_QUEUE_SIZE)
+
+    def abort(self):
+        """Drops anything buffered and wakes the writer so the session can close."""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+class MuxConnection:
+    """
+    A single upstream socket to Cortex carrying many session-tagged channels.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.ws = None
+        self.channels: Dict[int, MuxChannel] = {}
+        self.outbound = asyncio.Queue(maxsize=settings.WS_TUNNEL_QUEUE_SIZE * 4)
+        self._ids = itertools.count(1)
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def alive(self) -> bool:
+        return self.ws is not None and not any(t.done() for t in self._tasks)
+
+    async def connect(self):
+        self.ws = await websockets.connect(self.url, max_queue=settings.WS_UPSTREAM_MAX_QUEUE,
+                                           extensions=client_ws_extensions())
+        self._tasks = [asyncio.create_task(self._reader()), asyncio.create_task(self._writer())]
+        logger.info(f"🔀 Mux connection established: {self.url}")
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        if self.ws is not None:
+            await self.ws.close()
+        self._abort_all()
+
+    def _abort_all(self):
+        for channel in list(self.channels.values()):
+            channel.abort()
+        self.channels.clear()
+
+    async def _writer(self):
+        while True:
+            frame = await self.outbound.get()
+            await self.ws.send(frame)
+
+    async def _reader(self):
+        try:
+            async for message in self.ws:
+                if isinstance(message, str):
+                    continue # Mux protocol is binary only
+                channel_id, kind, payload = decode_frame(message)
+                channel = self.channels.get(channel_id)
+                if channel is None:
+                    continue
+                if kind == KIND_CLOSE:
+                    self.channels.pop(channel_id, None)
+                    try:
+                        channel.queue.put_nowait(None)
+                    except asyncio.QueueFull:
+                        channel.abort() # Never wait on one channel in the shared demux loop
+                    continue
+
+                item = payload.decode("utf-8") if kind == KIND_TEXT else payload
+                try:
+                    # Shared socket: a stuck client must not stall every other session
+                    await asyncio.wait_for(channel.queue.put(item), settings.WS_TUNNEL_SLOW_CONSUMER_TIMEOUT)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Dropping slow mux channel {channel_id}")
+                    self.channels.pop(channel_id, None)
+                    channel.abort()
+                    await self.outbound.put(encode_frame(channel_id, KIND_CLOSE))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self._abort_all()
+
+    async def open_channel(self, session_id: str, params: dict) -> MuxChannel:
+        channel = MuxChannel(next(self._ids))
+        self.channels[channel.id] = channel
+        handshake = json.dumps({"session_id": session_id, "params": params}).encode()
+        await self.outbound.put(encode_frame(channel.id, KIND_OPEN, handshake))
+        return channel
+
+    async def send(self, channel_id: int, message):
+        if isinstance(message, str):
+            frame = encode_frame(channel_id, KIND_TEXT, message.encode("utf-8"))
+        else:
+            frame = encode_frame(channel_id, KIND_BINARY, message)
+        await self.outbound.put(frame)
+
+    async def close_channel(self, channel_id: int):
+        if self.channels.pop(channel_id, None) is not None and self.alive:
+            await self.outbound.put(encode_frame(channel_id, KIND_CLOSE))
+
+class MuxPool:
+    """
+    A small, fixed set of upstream mux connections shared by all client sessions.
+    New channels go to the least loaded connection; dead connections are replaced lazily.
+    """
+
+    def __init__(self, url: str, size: int):
+        self.url = url
+        self.size = size
+        self.connections: List[MuxConnection] = []
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> MuxConnection:
+        async with self._lock:
+            self.connections = [c for c in self.connections if c.alive]
+            if len(self.connections) < self.size:
+                conn = MuxConnection(self.url)
+                await conn.connect()
+                self.connections.append(conn)
+            return min(self.connections, key=lambda c: len(c.channels))
+
+    async def close(self):
+        for conn in self.connections:
+            await conn.close()
+        self.connections = []
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "connections": [
+                {"alive": c.alive, "channels": len(c.channels), "outbound_depth": c.outbound.qsize()}
+                for c in self.connections
+            ],
+        }
+
+async def run_mux_tunnel(pool: MuxPool, client_ws: WebSocket, session_id: str, params: dict):
+    """
+    Bridges one browser socket onto a channel of a shared upstream connection.
+    """
+    metrics = tunnel_registry.open(session_id, "mux")
+    up = asyncio.Queue(maxsize=settings.WS_TUNNEL_QUEUE_SIZE)
+    conn, channel = None, None
+
+    async def queue_to_upstream():
+        while True:
+            message = await up.get()
+            if message is None:
+                break
+            await conn.send(channel.id, message)
+
+    try:
+        # Inside the try: a failed connect must still close the registry entry
+        conn = await pool.acquire()
+        channel = await conn.open_channel(session_id, params)
+        metrics.up_queue, metrics.down_queue = up, channel.queue
+
+        await run_until_first_exit(
+            pump_client_to_queue(client_ws, up, metrics),
+            queue_to_upstream(),
+            drain_queue_to_client(client_ws, channel.queue, metrics),
+        )
+    finally:
+        if channel is not None:
+            await conn.close_channel(channel.id)
+        tunnel_registry.close(metrics)
@@ -0,0 +1,136 @@
+import time
+import logging
+from typing import Dict, List, Optional
+import httpx
+from config import settings
+from resilience import CircuitBreaker
+
+logger = logging.getLogger("Gateway_Upstream")
+
+class UpstreamPool:
+    """
+    A long-lived, pooled HTTP client bound to a single upstream service.
+    Keeps connections alive between proxied calls and tracks basic traffic stats.
+    """
+
+    def __init__(self, name: str, base_url: str, http2: bool = False, replica_urls: List[str] = None):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        # Extra instances used for hedged reads
+        self.replica_urls = [u.rstrip("/") for u in (replica_urls or [])]
+        self.http2 = http2
+        self.client: Optional[httpx.AsyncClient] = None
+        self.breaker = CircuitBreaker(name, settings.BREAKER_FAILURE_THRESHOLD, settings.BREAKER_RECOVERY_TIMEOUT)
+
+        # Traffic counters (exposed via diagnostics)
+        self.requests_total = 0
+        self.errors_total = 0
+        self.retries_total = 0
+        self.hedges_total = 0
+        self.in_flight = 0
+        self.created_at = time.time()
+
+    def open(self):
+        """Creates the underlying client with the configured pool limits."""
+        limits = httpx.Limits(
+            max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY,
+        )
+        timeout = httpx.Timeout(settings.UPSTREAM_TIMEOUT, connect=settings.UPSTREAM_CONNECT_TIMEOUT)
+
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning(f"⚠️ HTTP/2 requested for '{self.name}' but 'h2' is not installed. Using HTTP/1.1.")
+                http2 = False
+
+        self.client = httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+        self.http2 = http2
+        logger.info(f"🔌 Upstream pool ready: {self.name} -> {self.base_url} (http2={http2})")
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def url(self, path: str, base_url: str = None) -> str:
+        return f"{(base_url or self.base_url)}/{path.lstrip('/')}"
+
+    def stats(self) -> dict:
+        """
+        Returns pool statistics.
+        Connection-level numbers are read from the httpcore pool when available.
+        """
+        connections = []
+        transport = getattr(self.client, "_transport", None)
+        pool = getattr(transport, "_pool", None)
+        if pool is not None:
+            connections = list(getattr(pool, "connections", []))
+
+        idle = sum(1 for c in connections if getattr(c, "is_idle", lambda: False)())
+        return {
+            "base_url": self.base_url,
+            "replicas": self.replica_urls,
+            "breaker": self.breaker.snapshot(),
+            "http2": self.http2,
+            "open": self.client is not None,
+            "connections": len(connections),
+            "idle_connections": idle,
+            "active_connections": len(connections) - idle,
+            "in_flight": self.in_flight,
+            "requests_total": self.requests_total,
+            "errors_total": self.errors_total,
+            "retries_total": self.retries_total,
+            "hedges_total": self.hedges_total,
+            "uptime_s": round(time.time() - self.created_at, 1),
+        }
+
+class UpstreamRegistry:
+    """
+    Gateway-wide registry of upstream pools.
+    Created once in the app lifespan and shared by every proxy route.
+    """
+
+    def __init__(self):
+        self.pools: Dict[str, UpstreamPool] = {}
+
+    def register(self, name: str, base_url: str, http2: bool = False, replica_urls: List[str] = None) -> UpstreamPool:
+        pool = UpstreamPool(name, base_url, http2=http2, replica_urls=replica_urls)
+        self.pools[name] = pool
+        return pool
+
+    def get(self, name: str) -> UpstreamPool:
+        pool = self.pools.get(name)
+        if pool is None or pool.client is None:
+            raise KeyError(f"Upstream '{name}' is not registered or not started")
+        return pool
+
+    async def startup(self):
+        for pool in self.pools.values():
+            pool.open()
+
+    async def shutdown(self):
+        for pool in self.pools.values():
+            await pool.close()
+        logger.info("Upstream pools closed.")
+
+    def stats(self) -> dict:
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+    def breakers(self) -> dict:
+        return {name: pool.breaker.snapshot() for name, pool in self.pools.items()}
+
+def parse_replicas(value: str) -> List[str]:
+    return [u.strip() for u in value.split(",") if u.strip()]
+
+# Singleton Instance
+upstreams = UpstreamRegistry()
+upstreams.register("auth", settings.AUTH_SERVICE_URL, http2=settings.UPSTREAM_HTTP2,
+                   replica_urls=parse_replicas(settings.AUTH_SERVICE_REPLICAS))
+upstreams.register("info", settings.INFO_SERVICE_URL, http2=settings.UPSTREAM_HTTP2,
+                   replica_urls=parse_replicas(settings.INFO_SERVICE_REPLICAS))
+upstreams.register("stt", settings.STT_SERVICE_URL, http2=settings.UPSTREAM_HTTP2)
+upstreams.register("cortex", settings.CORTEX_URL, http2=settings.UPSTREAM_HTTP2)
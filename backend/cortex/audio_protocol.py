@@ -0,0 +1,155 @@
+import struct
+import logging
+from typing import List, Optional
+from fastapi import WebSocket
+from config import settings
+
+logger = logging.getLogger("Cortex_Audio")
+
+# Opus is optional: it needs the 'opuslib' package and the system libopus
+try:
+    import opuslib
+except Exception: # ImportError, or libopus missing at load time
+    opuslib = None
+
+# --- FRAMING ---
+# Negotiated per socket with {"type": "audio_config", "codec": "pcm16" | "opus"}.
+# Every audio message is then a binary WS message: [header][payload]
+#   header  = version u8, codec u8, flags u16, turn id u32, sequence u32, sample rate u32 (network order)
+#   payload = PCM16 mono little-endian samples (codec 1)
+#             or Opus packets, each prefixed with its length as u16 (codec 2)
+# Without negotiation the socket keeps the legacy framing: one standalone WAV per sentence.
+AUDIO_HEADER = struct.Struct("!BBHIII")
+PROTOCOL_VERSION = 1
+CODEC_PCM16, CODEC_OPUS = 1, 2
+CODECS = {"pcm16": CODEC_PCM16, "opus": CODEC_OPUS}
+FLAG_SEGMENT_END = 0x1  # Last frame of a sentence
+OPUS_PACKET_LENGTH = struct.Struct("!H")
+OPUS_FRAME_MS = 20
+
+def encode_audio_frame(codec: int, flags: int, turn_id: int, seq: int, sample_rate: int, payload: bytes = b"") -> bytes:
+    return AUDIO_HEADER.pack(PROTOCOL_VERSION, codec, flags, turn_id, seq, sample_rate) + payload
+
+def decode_audio_frame(data: bytes):
+    version, codec, flags, turn_id, seq, sample_rate = AUDIO_HEADER.unpack_from(data)
+    return {"version": version, "codec": codec, "flags": flags, "turn_id": turn_id, "seq": seq,
+            "sample_rate": sample_rate, "payload": data[AUDIO_HEADER.size:]}
+
+class AudioFormat:
+    """Audio framing agreed with one client ('framed' False = legacy WAV per sentence)."""
+    __slots__ = ("framed", "codec", "sample_rate")
+
+    def __init__(self, framed: bool = False, codec: str = "wav", sample_rate: int = settings.TTS_SAMPLE_RATE):
+        self.framed = framed
+        self.codec = codec
+        self.sample_rate = sample_rate
+
+    @classmethod
+    def negotiate(cls, request: dict) -> "AudioFormat":
+        """
+        Picks the format for an 'audio_config' request. Unknown codecs fall back to legacy WAV;
+        Opus falls back to PCM16 when no encoder is available.
+        """
+        codec = str(request.get("codec", "wav")).lower()
+        if codec not in CODECS:
+            return cls()
+        if codec == "opus" and opuslib is None:
+            logger.warning("⚠️ Opus requested but opuslib/libopus is unavailable, using pcm16")
+            codec = "pcm16"
+        return cls(framed=True, codec=codec)
+
+    def describe(self) -> dict:
+        """Reply sent to the client so it knows how to parse the binary messages."""
+        if not self.framed:
+            return {"type": "audio_config", "framing": "wav"}
+        return {
+            "type": "audio_config",
+            "framing": "framed",
+            "codec": self.codec,
+            "sample_rate": self.sample_rate,
+            "channels": 1,
+            "header": {"version": PROTOCOL_VERSION, "bytes": AUDIO_HEADER.size,
+                       "fields": ["version:u8", "codec:u8", "flags:u16", "turn_id:u32", "seq:u32", "sample_rate:u32"]},
+        }
+
+class OpusStreamEncoder:
+    """Cuts a PCM16 stream into fixed 20 ms Opus frames, carrying the remainder between chunks."""
+
+    def __init__(self, sample_rate: int):
+        self.encoder = opuslib.Encoder(sample_rate, 1, opuslib.APPLICATION_VOIP)
+        self.frame_samples = sample_rate * OPUS_FRAME_MS // 1000
+        self.buffer = b""
+
+    def encode(self, pcm: bytes, flush: bool = False) -> List[bytes]:
+        self.buffer += pcm
+        frame_bytes = self.frame_samples * 2
+        if flush and self.buffer and len(self.buffer) % frame_bytes:
+            self.buffer += b"\x00" * (frame_bytes - len(self.buffer) % frame_bytes)  # Pad with silence
+        packets = []
+        while len(self.buffer) >= frame_bytes:
+            packets.append(self.encoder.encode(self.buffer[:frame_bytes], self.frame_samples))
+            self.buffer = self.buffer[frame_bytes:]
+        return packets
+
+class FramedAudioSink:
+    """
+    Sends one turn's audio as framed binary messages. PCM chunks are forwarded as they arrive
+    from TTS (encoded to Opus if negotiated); 'end_segment' marks the end of a sentence.
+    The turn id lets clients drop frames of a turn they have already interrupted.
+
+    Args:
+        websocket (WebSocket): Client socket.
+        audio_format (AudioFormat): Negotiated framed format.
+        turn_id (int): Per-socket turn counter.
+    """
+
+    def __init__(self, websocket: WebSocket, audio_format: AudioFormat, turn_id: int):
+        self.websocket = websocket
+        self.format = audio_format
+        self.codec = CODECS[audio_format.codec]
+        self.turn_id = turn_id
+        self.seq = 0
+        self._odd_byte = b"" # HTTP chunks may split a sample
+        self._opus = OpusStreamEncoder(audio_format.sample_rate) if self.codec == CODEC_OPUS else None
+
+    async def write(self, pcm: bytes):
+        pcm = self._odd_byte + pcm
+        if len(pcm) % 2:
+            pcm, self._odd_byte = pcm[:-1], pcm[-1:]
+        else:
+            self._odd_byte = b""
+        await self._send(self._payload(pcm))
+
+    async def end_segment(self):
+        self._odd_byte = b""
+        await self._send(self._payload(b"", flush=True), FLAG_SEGMENT_END, force=True)
+
+    def _payload(self, pcm: bytes, flush: bool = False) -> bytes:
+        if self._opus is None:
+            return pcm
+        return b"".join(OPUS_PACKET_LENGTH.pack(len(p)) + p for p in self._opus.encode(pcm, flush))
+
+    async def _send(self, payload: bytes, flags: int = 0, force: bool = False):
+        if not payload and not force:
+            return
+        await self.websocket.send_bytes(
+            encode_audio_frame(self.codec, flags, self.turn_id, self.seq, self.format.sample_rate, payload)
+        )
+        self.seq += 1
+
+class WavAudioSink:
+    """Legacy framing: each sentence's WAV is sent as-is."""
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+
+    async def write(self, audio_bytes: bytes):
+        await self.websocket.send_bytes(audio_bytes)
+
+    async def end_segment(self):
+        pass
+
+def create_audio_sink(websocket: WebSocket, audio_format: Optional[AudioFormat], turn_id: int):
+    if audio_format is None or not audio_format.framed:
+        return WavAudioSink(websocket)
+    return FramedAudioSink(websocket, audio_format, turn_id)
@@ -17,11 +17,36 @@ class Settings(BaseSettings):
     # Personas klasörünü data/personas altında tutuyoruz
     # Docker volume ile burayı kalıcı hale getireceğiz
     PERSONAS_DIR: str = os.getenv("PERSONAS_DIR", os.path.join(BASE_DIR, "data", "personas"))
+    # Seconds between persona file change checks (see persona_registry.py)
+    PERSONA_RELOAD_INTERVAL: float = float(os.getenv("PERSONA_RELOAD_INTERVAL", "2.0"))
 
     # Vector Memory (Qdrant)
     QDRANT_URL: str = os.getenv("QDRANT_URL", "http://localhost:6333")
     EMBEDDING_MODEL: str = "BAAI/bge-small-en-v1.5" # Efficient & High Performance
     COLLECTION_NAME: str = "neural_memory"
+    EMBEDDING_DIM: int = 384 # bge-small-en-v1.5 output dimension
+    # Vector store backend (see vector_store.py): "qdrant", "local" (embedded) or "fallback" (qdrant + local mirror)
+    VECTOR_STORE_BACKEND: str = os.getenv("VECTOR_STORE_BACKEND", "qdrant")
+    VECTOR_STORE_DIR: str = os.getenv("VECTOR_STORE_DIR", os.path.join(BASE_DIR, "data", "vectors"))
+    LOCAL_ANN_THRESHOLD: int = int(os.getenv("LOCAL_ANN_THRESHOLD", "20000"))  # Rows before switching to IVF
+    LOCAL_ANN_NPROBE: int = int(os.getenv("LOCAL_ANN_NPROBE", "8"))
+    # Startup: load the embedding model in a background warm-up task (otherwise on first use).
+    # '/ready' waits for memory only when READY_REQUIRES_MEMORY is set (the chat path doesn't need it).
+    MEMORY_PRELOAD: bool = os.getenv("MEMORY_PRELOAD", "true").lower() == "true"
+    READY_REQUIRES_MEMORY: bool = os.getenv("READY_REQUIRES_MEMORY", "false").lower() == "true"
+    # Embedding micro-batching (see embedder.py)
+    EMBED_BATCH_SIZE: int = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+    EMBED_MAX_WAIT_MS: float = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+    EMBED_WORKERS: int = int(os.getenv("EMBED_WORKERS", "1"))
+    # Embedding cache (see embedding_cache.py): in-process LRU + optional Redis tier on REDIS_URL
+    EMBED_CACHE_MAX_ENTRIES: int = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "10000"))
+    EMBED_CACHE_REDIS: bool = os.getenv("EMBED_CACHE_REDIS", "false").lower() == "true"
+    EMBED_CACHE_TTL: int = int(os.getenv("EMBED_CACHE_TTL", "604800"))  # 7 days
+    # Bulk ingestion (POST /api/memory/bulk)
+    INGEST_CHUNK_SIZE: int = int(os.getenv("INGEST_CHUNK_SIZE", "800"))        # Characters per chunk
+    INGEST_CHUNK_OVERLAP: int = int(os.getenv("INGEST_CHUNK_OVERLAP", "120"))
+    INGEST_EMBED_BATCH: int = int(os.getenv("INGEST_EMBED_BATCH", "64"))
+    INGEST_UPSERT_BATCH: int = int(os.getenv("INGEST_UPSERT_BATCH", "256"))
 
     # Microservice Endpoints (Service Discovery)
     # Varsayılan değerler docker-compose servis isimlerine göre ayarlandı
@@ -29,7 +54,49 @@ class Settings(BaseSettings):
     TTS_SERVICE_URL: str = os.getenv("TTS_SERVICE_URL", "http://tts_service:8001")
     STT_SERVICE_URL: str = os.getenv("STT_SERVICE_URL", "http://stt_service:8003")
     FINANCE_SERVICE_URL: str = os.getenv("FINANCE_SERVICE_URL", "http://finance_service:8006")
+    INFO_SERVICE_URL: str = os.getenv("INFO_SERVICE_URL", "http://info_service:8000")
     
+    # Service Client Pools (one long-lived client per downstream service)
+    SERVICE_MAX_CONNECTIONS: int = int(os.getenv("SERVICE_MAX_CONNECTIONS", "50"))
+    SERVICE_MAX_KEEPALIVE: int = int(os.getenv("SERVICE_MAX_KEEPALIVE", "20"))
+    SERVICE_KEEPALIVE_EXPIRY: float = float(os.getenv("SERVICE_KEEPALIVE_EXPIRY", "30.0"))
+    SERVICE_CONNECT_TIMEOUT: float = float(os.getenv("SERVICE_CONNECT_TIMEOUT", "5.0"))
+    LLM_TIMEOUT: float = float(os.getenv("LLM_TIMEOUT", "45.0"))
+    TTS_TIMEOUT: float = float(os.getenv("TTS_TIMEOUT", "10.0"))
+    FINANCE_TIMEOUT: float = float(os.getenv("FINANCE_TIMEOUT", "5.0"))
+    INFO_TIMEOUT: float = float(os.getenv("INFO_TIMEOUT", "5.0"))
+
+    # Speculative tool prefetch (see tools.py): finance/info lookups start with the turn,
+    # and the LLM prompt waits at most TOOL_PREFETCH_DEADLINE_MS for them.
+    TOOL_PREFETCH_ENABLED: bool = os.getenv("TOOL_PREFETCH_ENABLED", "true").lower() == "true"
+    TOOL_PREFETCH_DEADLINE_MS: float = float(os.getenv("TOOL_PREFETCH_DEADLINE_MS", "350"))
+    TOOL_MAX_SYMBOLS: int = int(os.getenv("TOOL_MAX_SYMBOLS", "3"))
+
+    # Voice Pipeline (LLM -> TTS)
+    TTS_LOOKAHEAD: int = int(os.getenv("TTS_LOOKAHEAD", "2"))                    # Sentences synthesized ahead of playback
+    TTS_SENTENCE_QUEUE_SIZE: int = int(os.getenv("TTS_SENTENCE_QUEUE_SIZE", "32"))
+    TTS_SAMPLE_RATE: int = int(os.getenv("TTS_SAMPLE_RATE", "24000"))            # PCM16 rate of the TTS Service (framed audio)
+    # Sentence segmentation of the token stream (see segmenter.py)
+    SEGMENT_MIN_CHARS: int = int(os.getenv("SEGMENT_MIN_CHARS", "8"))
+    SEGMENT_MAX_CHARS: int = int(os.getenv("SEGMENT_MAX_CHARS", "220"))
+    EAGER_FIRST_CLAUSE: bool = os.getenv("EAGER_FIRST_CLAUSE", "true").lower() == "true"
+    FIRST_CLAUSE_MIN_CHARS: int = int(os.getenv("FIRST_CLAUSE_MIN_CHARS", "15"))
+    # Attach per-turn timings to 'generation_end' (clients can also ask per message: {"timings": true})
+    SEND_TURN_TIMINGS: bool = os.getenv("SEND_TURN_TIMINGS", "false").lower() == "true"
+    
+    # Semantic response cache (see response_cache.py). Opt-in globally and per persona (traits.response_cache).
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+    RESPONSE_CACHE_DEFAULT_OPT_IN: bool = os.getenv("RESPONSE_CACHE_DEFAULT_OPT_IN", "false").lower() == "true"
+    RESPONSE_CACHE_THRESHOLD: float = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.93"))   # Cosine similarity
+    RESPONSE_CACHE_TTL: float = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+    RESPONSE_CACHE_AUDIO: bool = os.getenv("RESPONSE_CACHE_AUDIO", "true").lower() == "true"  # Replay audio too
+    RESPONSE_CACHE_MAX_TEMPERATURE: float = float(os.getenv("RESPONSE_CACHE_MAX_TEMPERATURE", "0.8"))
+    RESPONSE_CACHE_MAX_QUERY_CHARS: int = int(os.getenv("RESPONSE_CACHE_MAX_QUERY_CHARS", "200"))
+
+    # Sessions are bound to the gateway-verified user that opened them (see session_owners.py)
+    SESSION_OWNERS_MAX: int = int(os.getenv("SESSION_OWNERS_MAX", "10000"))
+
     # Redis
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
@@ -0,0 +1,126 @@
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from config import settings
+
+logger = logging.getLogger("Cortex_Embedder")
+
+class BatchEmbedder:
+    """
+    Async front-end for a synchronous embedding model (fastembed 'TextEmbedding').
+
+    Inference runs in a small thread pool so the event loop (and every WebSocket session) keeps
+    running. Concurrent 'embed' calls are collected into micro-batches: the first request opens a
+    window of 'max_wait_ms', and everything that arrives within it (up to 'batch_size' texts) is
+    embedded in a single model call.
+
+    Args:
+        model: Object exposing 'embed(texts) -> Iterable[vector]'.
+        batch_size (int): Maximum number of texts per model call.
+        max_wait_ms (float): How long the first request waits for others to join its batch.
+        workers (int): Threads running inference (ONNX already parallelizes within a batch).
+    """
+
+    def __init__(self, model, batch_size: int = settings.EMBED_BATCH_SIZE,
+                 max_wait_ms: float = settings.EMBED_MAX_WAIT_MS, workers: int = settings.EMBED_WORKERS):
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="embed")
+        self.slots = asyncio.Semaphore(max(1, workers))
+        self.queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight = set()
+
+        # Metrics
+        self.batches_total = 0
+        self.texts_total = 0
+        self.inference_seconds = 0.0
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embeds texts, sharing model calls with any concurrent callers."""
+        if not texts:
+            return []
+        self._ensure_worker()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            await self.queue.put((text, future))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    async def embed_one(self, text: str) -> List[float]:
+        return (await self.embed([text]))[0]
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, *self._inflight, return_exceptions=True)
+            self._worker = None
+        self.executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        return {
+            "batches_total": self.batches_total,
+            "texts_total": self.texts_total,
+            "avg_batch_size": round(self.texts_total / self.batches_total, 2) if self.batches_total else 0.0,
+            "inference_seconds": round(self.inference_seconds, 3),
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+        }
+
+    # --- INTERNALS ---
+
+    def _ensure_worker(self):
+        # Created lazily so the queue and task bind to the running event loop
+        if self._worker is None or self._worker.done():
+            self.queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._collect())
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Bound concurrent inference to the pool size; the next batch keeps filling meanwhile
+            await self.slots.acquire()
+            task = asyncio.create_task(self._run_batch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        try:
+            texts = [text for text, _ in batch]
+            start = time.perf_counter()
+            vectors = await asyncio.get_running_loop().run_in_executor(self.executor, self._infer, texts)
+            self.inference_seconds += time.perf_counter() - start
+            self.batches_total += 1
+            self.texts_total += len(texts)
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+        except Exception as e:
+            logger.error(f"Embedding batch failed ({len(batch)} texts): {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.slots.release()
+            for _, future in batch:
+                if not future.done():
+                    future.cancel() # Shutdown mid-batch: don't leave callers waiting
+
+    def _infer(self, texts: List[str]) -> List[List[float]]:
+        # Runs in the worker thread
+        return [vector.tolist() if hasattr(vector, "tolist") else list(vector) for vector in self.model.embed(texts)]
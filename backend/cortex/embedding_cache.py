@@ -0,0 +1,134 @@
+import hashlib
+import logging
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from config import settings
+
+logger = logging.getLogger("Cortex_EmbeddingCache")
+
+# Optional shared tier: only used when the redis client library is installed
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+def pack_vector(vector: List[float]) -> bytes:
+    """Stores a vector compactly as float32 bytes (384 dims -> 1.5 KB)."""
+    return array("f", vector).tobytes()
+
+def unpack_vector(blob: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache: in-process LRU in front of an optional Redis tier.
+
+    Keys are 'emb:<model>:<sha256(text)>', so changing EMBEDDING_MODEL never serves stale vectors.
+    Redis errors are logged and treated as misses; the cache never blocks embedding.
+
+    Args:
+        model_name (str): Embedding model identifier (part of every key).
+        max_entries (int): Capacity of the in-process LRU.
+        redis_url (str): Enables the Redis tier when set.
+        ttl (int): Expiry of Redis entries in seconds.
+    """
+
+    def __init__(self, model_name: str, max_entries: int = settings.EMBED_CACHE_MAX_ENTRIES,
+                 redis_url: Optional[str] = None, ttl: int = settings.EMBED_CACHE_TTL):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self.redis = None
+        if redis_url:
+            if aioredis is None:
+                logger.warning("⚠️ Embedding cache Redis tier requested but 'redis' is not installed.")
+            else:
+                self.redis = aioredis.from_url(redis_url)
+
+        # Metrics
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.redis_errors = 0
+
+    def key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"emb:{self.model_name}:{digest}"
+
+    async def get_many(self, texts: List[str]) -> Dict[str, List[float]]:
+        """Returns cached vectors for the given texts (missing texts are omitted)."""
+        found: Dict[str, List[float]] = {}
+        remote = []
+        for text in dict.fromkeys(texts):
+            k = self.key(text)
+            blob = self.entries.get(k)
+            if blob is not None:
+                self.entries.move_to_end(k)
+                found[text] = unpack_vector(blob)
+                self.local_hits += 1
+            else:
+                remote.append((text, k))
+
+        remote_hits = 0
+        if remote and self.redis is not None:
+            try:
+                blobs = await self.redis.mget([k for _, k in remote])
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"⚠️ Embedding cache Redis read failed: {e}")
+                blobs = [None] * len(remote)
+            for (text, k), blob in zip(remote, blobs):
+                if blob is not None:
+                    self._remember(k, blob)
+                    found[text] = unpack_vector(blob)
+                    remote_hits += 1
+
+        self.redis_hits += remote_hits
+        self.misses += len(remote) - remote_hits
+        return found
+
+    async def put_many(self, vectors: Dict[str, List[float]]):
+        """Stores freshly computed vectors in both tiers."""
+        if not vectors:
+            return
+        blobs = {self.key(text): pack_vector(vector) for text, vector in vectors.items()}
+        for k, blob in blobs.items():
+            self._remember(k, blob)
+
+        if self.redis is not None:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for k, blob in blobs.items():
+                        pipe.set(k, blob, ex=self.ttl)
+                    await pipe.execute()
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"⚠️ Embedding cache Redis write failed: {e}")
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "model": self.model_name,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "redis_enabled": self.redis is not None,
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "redis_errors": self.redis_errors,
+            "hit_rate": round((self.local_hits + self.redis_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    def _remember(self, k: str, blob: bytes):
+        self.entries[k] = blob
+        self.entries.move_to_end(k)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
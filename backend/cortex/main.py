@@ -1,19 +1,23 @@
 import logging
 import asyncio
-import httpx
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 
 # Internal Configuration & Clients
 from config import settings
 from services_client import service_client
 from memory import memory_engine
+from readiness import readiness
+from response_cache import response_cache
+from session_owners import session_owners
+from metrics import voice_metrics
 
 # --- ROUTER IMPORTS ---
 # We integrate the modular routers here.
 # Note: Ensure 'backend/cortex/routers/chat.py' exists and dependencies are met.
-from routers import chat, personas
+from routers import chat, personas, mux, memories
 
 # Configure Logging
 logging.basicConfig(
@@ -22,11 +26,35 @@ logging.basicConfig(
 )
 logger = logging.getLogger("Cortex_Core")
 
+# --- STARTUP & SHUTDOWN ---
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Opens pooled service clients, then runs the heavy warm-ups (embedding model, vector store,
+    LLM) in the background so the server starts accepting connections immediately.
+    Closes the pooled connections on shutdown.
+    """
+    readiness.register("service_clients", required=True)
+    readiness.register_many(["embedding_model", "vector_store"], required=settings.READY_REQUIRES_MEMORY)
+    readiness.register("llm_warmup")
+
+    async with readiness.track("service_clients"):
+        await service_client.startup()
+    logger.info("🔥 Cortex Online. Initiating Warm-up Sequence...")
+    warmup_tasks = [asyncio.create_task(warmup_llm()), asyncio.create_task(warmup_memory())]
+    yield
+    for task in warmup_tasks:
+        task.cancel()
+    await service_client.shutdown()
+    await memory_engine.close()
+
 # Initialize FastAPI App
 app = FastAPI(
     title=settings.PROJECT_NAME, 
     version=settings.VERSION,
-    description="Neural Orchestrator (Cortex) - Manages LLM, Memory, and System State."
+    description="Neural Orchestrator (Cortex) - Manages LLM, Memory, and System State.",
+    lifespan=lifespan
 )
 
 # CORS Configuration
@@ -43,19 +71,11 @@ app.add_middleware(
 # This activates the advanced endpoints defined in the 'routers' folder.
 # e.g., /api/chat, /api/memory, /api/architect
 app.include_router(chat.router)
-# app.include_router(personas.router) # Uncomment when personas router is fully ready
+app.include_router(mux.router)   # Multiplexed sessions from the API Gateway
+app.include_router(memories.router)  # Memory creation & bulk ingestion
+app.include_router(personas.router)  # Persona CRUD (served from the in-memory registry)
 # app.include_router(system.router)   # Uncomment when system router is fully ready
 
-# --- STARTUP & SHUTDOWN EVENTS ---
-
-@app.on_event("startup")
-async def startup_event():
-    """
-    Executes system warm-up tasks on startup.
-    """
-    logger.info("🔥 Cortex Online. Initiating Warm-up Sequence...")
-    asyncio.create_task(warmup_llm())
-
 async def warmup_llm():
     """
     Sends a dummy request to LLM Service to load models into GPU memory.
@@ -67,26 +87,72 @@ async def warmup_llm():
             logger.warning("⚠️ LLM_SERVICE_URL is not set. Skipping warm-up.")
             return
 
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            # We assume the LLM service has a standard /chat or health endpoint
-            await client.post(f"{settings.LLM_SERVICE_URL}/chat", json={
-                "message": "ping", 
-                "conversation_id": "warmup", 
-                "stream": False
-            })
+        async with readiness.track("llm_warmup"):
+            await service_client.warmup_llm()
         logger.info("✅ LLM Warm-up Signal Sent.")
     except Exception as e:
         logger.warning(f"⚠️ LLM Warm-up signal failed (Non-critical): {e}")
 
+async def warmup_memory():
+    """
+    Loads the embedding model and checks the vector store in the background.
+    If this fails, memory is loaded on first use instead.
+    """
+    if not settings.MEMORY_PRELOAD:
+        return
+    results = await asyncio.gather(memory_engine.load(), memory_engine.connect(), return_exceptions=True)
+    errors = [r for r in results if isinstance(r, Exception)]
+    if errors:
+        logger.warning(f"⚠️ Memory warm-up failed (will retry on first use): {errors}")
+    else:
+        logger.info("✅ Memory subsystem ready.")
+
 # --- CORE ENDPOINTS ---
 
 @app.get("/health")
 def health_check():
     """
-    Service health check endpoint.
+    Liveness check: the process is up and serving requests.
     """
     return {"status": "active", "role": "orchestrator", "version": settings.VERSION}
 
+@app.get("/ready")
+def readiness_check():
+    """
+    Readiness check: 200 once every required subsystem has loaded, 503 before.
+    Reports each subsystem's state and load time.
+    """
+    snapshot = readiness.snapshot()
+    return JSONResponse(status_code=200 if snapshot["ready"] else 503, content=snapshot)
+
+@app.get("/metrics")
+def metrics():
+    """
+    Voice pipeline latency histograms in the Prometheus text format.
+    """
+    return PlainTextResponse(voice_metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/diagnostics/memory")
+def memory_diagnostics():
+    """
+    Embedding batcher and embedding cache statistics (hit rate, batch sizes).
+    """
+    return memory_engine.stats()
+
+@app.get("/diagnostics/response_cache")
+def response_cache_diagnostics():
+    """
+    Semantic response cache statistics.
+    """
+    return response_cache.stats()
+
+@app.get("/diagnostics/sessions")
+def session_diagnostics():
+    """
+    Sessions bound to a gateway-verified user, and reconnects refused for another user.
+    """
+    return session_owners.stats()
+
 @app.post("/interact")
 async def interact_legacy_proxy(request: Request):
     """
@@ -107,23 +173,18 @@ async def interact_legacy_proxy(request: Request):
         logger.info(f"🧠 Processing Legacy Interaction: {query} (Session: {session_id})")
 
         # Basic LLM Payload Construction
-        llm_payload = {
-            "message": query,
-            "conversation_id": session_id,
-            "stream": True
-        }
+        llm_payload = service_client.build_llm_payload(query, session_id)
 
         # Retrieve Context (Simple RAG) - Optional
         # if body.get("enable_memory", True):
-        #    memories = memory_engine.search_memory(query, limit=2)
+        #    memories = await memory_engine.search_memory(query, limit=2)
         #    if memories:
         #        context = "\n".join(memories)
         #        llm_payload["system_prompt"] = f"Context:\n{context}"
 
-        # Proxy stream from LLM Service
-        target_url = f"{settings.LLM_SERVICE_URL}/chat"
+        # Proxy stream from LLM Service (pooled connection)
         return StreamingResponse(
-            proxy_stream_generator(target_url, llm_payload),
+            service_client.stream_llm_raw(llm_payload),
             media_type="text/event-stream"
         )
         
@@ -133,15 +194,3 @@ async def interact_legacy_proxy(request: Request):
             status_code=500, 
             content={"error": str(e), "detail": "Orchestration failed."}
         )
-
-async def proxy_stream_generator(url: str, payload: dict):
-    """
-    Helper function to proxy Server-Sent Events (SSE) from the LLM Service.
-    """
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        try:
-            async with client.stream("POST", url, json=payload) as response:
-                async for chunk in response.aiter_bytes():
-                    yield chunk
-        except Exception as e:
-            yield f"Error calling LLM Service: {str(e)}".encode()
\ No newline at end of file
@@ -1,103 +1,241 @@
+import uuid
+import asyncio
 import logging
-from typing import List, Dict, Any
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
-from fastembed import TextEmbedding
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 from config import settings
+from embedder import BatchEmbedder
+from embedding_cache import EmbeddingCache
+from vector_store import VectorStore, create_vector_store
+from readiness import readiness
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("Cortex_Memory")
 
+def chunk_text(text: str, chunk_size: int = settings.INGEST_CHUNK_SIZE, overlap: int = settings.INGEST_CHUNK_OVERLAP) -> List[str]:
+    """
+    Splits a long text into chunks of at most 'chunk_size' characters, sharing 'overlap'
+    characters between neighbours so facts on a boundary stay retrievable.
+    Cuts are moved back to whitespace when possible so words are not split.
+    """
+    text = text.strip()
+    if len(text) <= chunk_size:
+        return [text] if text else []
+
+    overlap = max(0, min(overlap, chunk_size // 2))
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            cut = text.rfind(" ", start + chunk_size // 2, end)
+            if cut != -1:
+                end = cut
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        # Step back by the overlap, then forward to the next word start
+        next_start = max(end - overlap, start + 1)
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 and next_start > 0 and text[next_start - 1] != " " else next_start
+    return chunks
+
 class SemanticMemory:
     """
     Manages Long-Term Memory using Vector Embeddings.
-    Uses Qdrant for storage and FastEmbed for generating embeddings locally.
+    Uses a pluggable 'VectorStore' (Qdrant by default) for storage and FastEmbed for generating embeddings locally.
+
+    The API is async: embeddings are computed off the event loop by a shared 'BatchEmbedder'
+    (concurrent sessions are micro-batched together).
     """
-    
-    def __init__(self):
-        # Initialize Qdrant Client
-        self.client = QdrantClient(url=settings.QDRANT_URL)
-        
-        # Initialize Embedding Model (Lazy Loading handled by library usually, but we init here)
-        logger.info(f"🧠 Loading Embedding Model: {settings.EMBEDDING_MODEL}")
-        self.embedding_model = TextEmbedding(model_name=settings.EMBEDDING_MODEL)
-        
-        # Ensure Collection Exists
-        self._initialize_collection()
-
-    def _initialize_collection(self):
-        """Creates the Qdrant collection if it doesn't exist."""
+
+    def __init__(self, store: VectorStore = None):
+        # Initialize Vector Store (Qdrant, embedded local index, or both - VECTOR_STORE_BACKEND)
+        self.store = store or create_vector_store()
+
+        # Embedding Model is loaded lazily ('load'), off the import path and off the event loop
+        self.embedding_model = None
+        self.embedder: Optional[BatchEmbedder] = None
+        self._load_lock = asyncio.Lock()
+        self.cache = EmbeddingCache(
+            settings.EMBEDDING_MODEL,
+            redis_url=settings.REDIS_URL if settings.EMBED_CACHE_REDIS else None
+        )
+
+    async def load(self):
+        """
+        Loads the embedding model in a worker thread. Called by the startup warm-up task,
+        or on first use if memory is needed before the warm-up finished. Safe to call repeatedly.
+        """
+        if self.embedder is not None:
+            return
+        async with self._load_lock:
+            if self.embedder is not None:
+                return
+            async with readiness.track("embedding_model"):
+                logger.info(f"🧠 Loading Embedding Model: {settings.EMBEDDING_MODEL}")
+                self.embedding_model = await asyncio.to_thread(self._load_model)
+                self.embedder = BatchEmbedder(self.embedding_model)
+
+    @staticmethod
+    def _load_model():
+        from fastembed import TextEmbedding # Heavy import (onnxruntime)
+        return TextEmbedding(model_name=settings.EMBEDDING_MODEL)
+
+    async def _initialize_collection(self):
+        """Ensures the collection exists (backends cache the result)."""
         try:
-            collections = self.client.get_collections()
-            exists = any(c.name == settings.COLLECTION_NAME for c in collections.collections)
-            
-            if not exists:
-                logger.info(f"Creating memory collection: {settings.COLLECTION_NAME}")
-                self.client.create_collection(
-                    collection_name=settings.COLLECTION_NAME,
-                    vectors_config=models.VectorParams(
-                        size=384, # bge-small-en-v1.5 output dimension
-                        distance=models.Distance.COSINE
-                    )
-                )
+            await self.store.ensure_collection()
         except Exception as e:
             logger.error(f"Failed to initialize memory: {e}")
 
-    def add_memory(self, text: str, metadata: Dict[str, Any] = None):
+    async def connect(self):
+        """Startup check of the vector store, reported as the 'vector_store' subsystem."""
+        async with readiness.track("vector_store"):
+            await self.store.ensure_collection()
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Returns one vector per text, serving repeated texts from the embedding cache
+        and batching the rest through the shared embedder.
+        """
+        vectors = await self.cache.get_many(texts)
+        missing = [text for text in dict.fromkeys(texts) if text not in vectors]
+        if missing:
+            await self.load()
+            fresh = dict(zip(missing, await self.embedder.embed(missing)))
+            await self.cache.put_many(fresh)
+            vectors.update(fresh)
+        return [vectors[text] for text in texts]
+
+    async def add_memory(self, text: str, metadata: Dict[str, Any] = None) -> Optional[str]:
         """
         Embeds and stores a piece of text into vector memory.
+        Returns the new point id, or None if it could not be stored (the error is logged).
         """
         try:
-            # Generate Embedding (Returns generator, convert to list)
-            embeddings = list(self.embedding_model.embed([text]))
-            vector = embeddings[0]
-            
-            # Upsert to Qdrant
-            import uuid
+            await self._initialize_collection()
+
+            # Generate Embedding (cached, or batched with concurrent callers off the event loop)
+            vector = (await self.embed([text]))[0]
+
+            # Upsert to the vector store
             point_id = str(uuid.uuid4())
-            
+
             payload = {"content": text}
             if metadata:
                 payload.update(metadata)
-            
-            self.client.upsert(
-                collection_name=settings.COLLECTION_NAME,
-                points=[
-                    models.PointStruct(
-                        id=point_id,
-                        vector=vector,
-                        payload=payload
-                    )
-                ]
-            )
+
+            await self.store.upsert([point_id], [vector], [payload])
             logger.info(f"💾 Memory Stored: {text[:30]}...")
+            return point_id
         except Exception as e:
             logger.error(f"Error adding memory: {e}")
+            return None
 
-    def search_memory(self, query: str, limit: int = 3) -> List[str]:
+    async def search_memory(self, query: str, limit: int = 3) -> List[str]:
         """
         Semantically searches the memory for relevant context.
         """
         try:
+            await self._initialize_collection()
+
             # Embed Query
-            query_embedding = list(self.embedding_model.embed([query]))[0]
-            
-            # Search Qdrant
-            results = self.client.search(
-                collection_name=settings.COLLECTION_NAME,
-                query_vector=query_embedding,
-                limit=limit
-            )
-            
+            query_embedding = (await self.embed([query]))[0]
+
+            # Search the vector store
+            hits = await self.store.search(query_embedding, limit)
+
             # Extract content
-            context = [hit.payload["content"] for hit in results if "content" in hit.payload]
+            context = [payload["content"] for _, payload in hits if "content" in payload]
             logger.info(f"🔍 Memory Retrieval: Found {len(context)} relevant items.")
             return context
-            
+
         except Exception as e:
             logger.error(f"Error searching memory: {e}")
             return []
 
+    async def ingest(
+        self,
+        records: List[Tuple[str, Dict[str, Any]]],
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Bulk ingestion: chunks every text, embeds chunks in batches and upserts them in batches
+        with 'wait=False' (Qdrant acknowledges without waiting for indexing).
+        The next batch is embedded while the previous upsert is in flight.
+
+        Args:
+            records: (text, metadata) pairs. Metadata is copied onto every chunk.
+            chunk_size (int): Characters per chunk (defaults to INGEST_CHUNK_SIZE).
+            chunk_overlap (int): Overlap between chunks (defaults to INGEST_CHUNK_OVERLAP).
+
+        Yields:
+            Progress events: 'chunked', then one 'progress' per upsert batch, then 'done' (or 'error').
+        """
+        chunk_size = chunk_size or settings.INGEST_CHUNK_SIZE
+        chunk_overlap = settings.INGEST_CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+
+        chunks = []
+        for source_index, (text, metadata) in enumerate(records):
+            parts = chunk_text(text, chunk_size, chunk_overlap)
+            for chunk_index, part in enumerate(parts):
+                payload = dict(metadata or {})
+                payload.update({"content": part, "source_index": source_index,
+                                "chunk_index": chunk_index, "chunk_count": len(parts)})
+                chunks.append((part, payload))
+
+        total = len(chunks)
+        yield {"stage": "chunked", "records": len(records), "chunks": total}
+
+        await self._initialize_collection()
+        embedded = upserted = 0
+        points: List[Tuple[str, List[float], Dict[str, Any]]] = []
+        pending_upsert: Optional[asyncio.Task] = None
+        try:
+            for i in range(0, total, settings.INGEST_EMBED_BATCH):
+                batch = chunks[i:i + settings.INGEST_EMBED_BATCH]
+                vectors = await self.embed([text for text, _ in batch])
+                embedded += len(batch)
+                points.extend(
+                    (str(uuid.uuid4()), vector, payload)
+                    for (_, payload), vector in zip(batch, vectors)
+                )
+
+                while len(points) >= settings.INGEST_UPSERT_BATCH or (points and embedded == total):
+                    send, points = points[:settings.INGEST_UPSERT_BATCH], points[settings.INGEST_UPSERT_BATCH:]
+                    if pending_upsert is not None:
+                        await pending_upsert
+                        yield {"stage": "progress", "embedded": embedded, "upserted": upserted, "total": total}
+                    pending_upsert = asyncio.create_task(self._upsert_batch(send))
+                    upserted += len(send)
+
+            if pending_upsert is not None:
+                await pending_upsert
+            logger.info(f"💾 Bulk Ingest: {total} chunks from {len(records)} records.")
+            yield {"stage": "done", "embedded": embedded, "upserted": upserted, "total": total}
+        except Exception as e:
+            if pending_upsert is not None:
+                pending_upsert.cancel()
+            logger.error(f"Error during bulk ingest: {e}")
+            yield {"stage": "error", "error": str(e), "embedded": embedded, "total": total}
+
+    async def _upsert_batch(self, points: List[Tuple[str, List[float], Dict[str, Any]]]):
+        ids, vectors, payloads = zip(*points)
+        await self.store.upsert(list(ids), list(vectors), list(payloads), wait=False)
+
+    async def close(self):
+        """Stops the embedding workers and closes the vector store."""
+        if self.embedder is not None:
+            await self.embedder.close()
+        await self.cache.close()
+        await self.store.close()
+
+    def stats(self) -> dict:
+        return {"embedder": self.embedder.stats() if self.embedder else None, "embedding_cache": self.cache.stats(), "vector_store": self.store.stats()}
+
 # Singleton Instance
-memory_engine = SemanticMemory()
\ No newline at end of file
+memory_engine = SemanticMemory()
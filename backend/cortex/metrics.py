@@ -0,0 +1,165 @@
+import time
+import bisect
+from typing import Dict, List, Optional, Sequence
+
+# Latency buckets in seconds (voice turns live between ~50 ms and a few seconds)
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0)
+RATE_BUCKETS = (5, 10, 20, 30, 50, 75, 100, 150, 200, 400)
+
+class Histogram:
+    """Cumulative histogram rendered in the Prometheus text exposition format."""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum:.6f}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+class Counter:
+    """Counter with a single label dimension."""
+
+    def __init__(self, name: str, help_text: str, label: str):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.values: Dict[str, int] = {}
+
+    def inc(self, label_value: str):
+        self.values[label_value] = self.values.get(label_value, 0) + 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for value, count in sorted(self.values.items()):
+            lines.append(f'{self.name}{{{self.label}="{value}"}} {count}')
+        return lines
+
+class VoiceMetrics:
+    """Process-wide voice pipeline metrics, exported on '/metrics'."""
+
+    def __init__(self):
+        self.llm_ttft = Histogram("cortex_llm_time_to_first_token_seconds", "LLM request to first token.")
+        self.first_token = Histogram("cortex_time_to_first_token_seconds", "Turn start to first LLM token (includes tool wait and cache lookup).")
+        self.llm_tokens_per_second = Histogram("cortex_llm_tokens_per_second", "LLM streaming rate after the first token.", RATE_BUCKETS)
+        self.first_sentence = Histogram("cortex_time_to_first_sentence_seconds", "Turn start to first complete sentence.")
+        self.tts_latency = Histogram("cortex_tts_latency_seconds", "TTS request latency per sentence.")
+        self.first_audio = Histogram("cortex_time_to_first_audio_seconds", "Turn start to first audio frame sent.")
+        self.turn_duration = Histogram("cortex_turn_duration_seconds", "Total voice turn duration.")
+        self.turns = Counter("cortex_turns_total", "Voice turns by outcome.", "outcome")
+        self.tool_latency = Histogram("cortex_tool_latency_seconds", "Prefetched finance/info lookup latency.")
+        self.tool_calls = Counter("cortex_tool_calls_total", "Prefetched lookups by result.", "result")
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.llm_ttft, self.first_token, self.llm_tokens_per_second, self.first_sentence,
+                       self.tts_latency, self.first_audio, self.turn_duration, self.turns,
+                       self.tool_latency, self.tool_calls):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Singleton Instance
+voice_metrics = VoiceMetrics()
+
+class TurnTimer:
+    """
+    Collects the timings of one voice turn. Marks are idempotent ('first_*' keep the first value),
+    so they can be called from the hot loop without checks.
+    """
+
+    def __init__(self, metrics: VoiceMetrics = voice_metrics):
+        self.metrics = metrics
+        self.start = time.perf_counter()
+        self.llm_started_at: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+        self.last_token_at: Optional[float] = None
+        self.first_sentence_at: Optional[float] = None
+        self.first_audio_at: Optional[float] = None
+        self.tokens = 0
+        self.tts_latencies: List[float] = []
+        self.finished_at: Optional[float] = None
+        self.prefetch_wait: Optional[float] = None
+
+    def llm_started(self):
+        """Marks the LLM request (TTFT is measured from here, after any pre-LLM work)."""
+        if self.llm_started_at is None:
+            self.llm_started_at = time.perf_counter()
+
+    def token(self):
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        self.last_token_at = now
+        self.tokens += 1
+
+    def sentence(self):
+        if self.first_sentence_at is None:
+            self.first_sentence_at = time.perf_counter()
+
+    def audio(self, _audio_bytes: bytes = b""):
+        if self.first_audio_at is None:
+            self.first_audio_at = time.perf_counter()
+
+    def tts(self, seconds: float):
+        self.tts_latencies.append(seconds)
+        self.metrics.tts_latency.observe(seconds)
+
+    def tokens_per_second(self) -> Optional[float]:
+        if self.tokens < 2 or self.last_token_at == self.first_token_at:
+            return None
+        return (self.tokens - 1) / (self.last_token_at - self.first_token_at)
+
+    def finish(self, outcome: str):
+        """Records the turn into the histograms (once)."""
+        if self.finished_at is not None:
+            return
+        self.finished_at = time.perf_counter()
+        m = self.metrics
+        if self.first_token_at is not None:
+            m.first_token.observe(self.first_token_at - self.start)
+            if self.llm_started_at is not None:
+                m.llm_ttft.observe(self.first_token_at - self.llm_started_at)
+        rate = self.tokens_per_second()
+        if rate is not None:
+            m.llm_tokens_per_second.observe(rate)
+        if self.first_sentence_at is not None:
+            m.first_sentence.observe(self.first_sentence_at - self.start)
+        if self.first_audio_at is not None:
+            m.first_audio.observe(self.first_audio_at - self.start)
+        if outcome in ("completed", "cached"):
+            m.turn_duration.observe(self.finished_at - self.start)
+        m.turns.inc(outcome)
+
+    def summary(self) -> dict:
+        """Per-turn timings in milliseconds (sent to the client with 'generation_end')."""
+        def ms(mark):
+            return round((mark - self.start) * 1000, 1) if mark is not None else None
+        rate = self.tokens_per_second()
+        ttft = self.first_token_at - self.llm_started_at if None not in (self.first_token_at, self.llm_started_at) else None
+        return {
+            "llm_ttft_ms": round(ttft * 1000, 1) if ttft is not None else None,
+            "first_token_ms": ms(self.first_token_at),
+            "tokens": self.tokens,
+            "tokens_per_second": round(rate, 1) if rate is not None else None,
+            "first_sentence_ms": ms(self.first_sentence_at),
+            "first_audio_ms": ms(self.first_audio_at),
+            "tool_wait_ms": round(self.prefetch_wait * 1000, 1) if self.prefetch_wait is not None else None,
+            "tts_ms": [round(s * 1000, 1) for s in self.tts_latencies],
+            "total_ms": ms(self.finished_at or time.perf_counter()),
+        }
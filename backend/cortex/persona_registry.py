@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from config import settings
+
+logger = logging.getLogger("Cortex_Personas")
+
+# Fallback voices for personas without a config file (or without a 'voice' field)
+# Maps persona IDs to Kokoro voice codes
+DEFAULT_VOICES = {
+    "default": "af_sarah",   # Default Female
+    "nova": "af_sarah",
+    "sage": "am_michael",    # Example Male
+    "cipher": "bf_emma",
+    "architect": "am_adam"
+}
+DEFAULT_VOICE = "af_sarah"
+
+def safe_persona_id(persona_id: str) -> str:
+    """Restricts IDs to URL/file-safe characters (used as file names)."""
+    return "".join([c for c in persona_id if c.isalnum() or c in ('-', '_')]).lower()
+
+class PersonaEntry:
+    __slots__ = ("data", "mtime_ns", "size", "etag")
+
+    def __init__(self, data: dict, mtime_ns: int, size: int):
+        self.data = data
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.etag = f'W/"{mtime_ns:x}-{size:x}"'
+
+class PersonaRegistry:
+    """
+    In-memory persona store backed by 'PERSONAS_DIR/*.json'.
+
+    Files are parsed once and kept in memory. At most every 'reload_interval' seconds a lookup
+    re-stats the directory (no reads) and re-parses only files whose mtime/size changed, so edits
+    made outside the API are picked up without per-request globbing. Writes through the registry
+    update the cache immediately.
+
+    Args:
+        directory (str): Folder holding one '<id>.json' per persona.
+        reload_interval (float): Minimum seconds between change checks.
+    """
+
+    def __init__(self, directory: str = settings.PERSONAS_DIR, reload_interval: float = settings.PERSONA_RELOAD_INTERVAL):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self.entries: Dict[str, PersonaEntry] = {}
+        self.files: Dict[str, str] = {}  # file name -> persona id
+        self.list_etag = 'W/"0"'
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    # --- READS ---
+
+    def get(self, persona_id: str) -> Optional[dict]:
+        entry = self.get_entry(persona_id)
+        return entry.data if entry else None
+
+    def get_entry(self, persona_id: str) -> Optional[PersonaEntry]:
+        self._maybe_refresh()
+        return self.entries.get(safe_persona_id(persona_id))
+
+    def list(self) -> Tuple[List[dict], str]:
+        """Returns all personas (sorted by id) and the collection ETag."""
+        self._maybe_refresh()
+        return [self.entries[k].data for k in sorted(self.entries)], self.list_etag
+
+    def resolve(self, persona_id: str) -> Tuple[str, Optional[str]]:
+        """Returns (voice, system_prompt) for a chat turn. Unknown personas get defaults."""
+        persona = self.get(persona_id) or {}
+        voice = persona.get("voice") or DEFAULT_VOICES.get(persona_id, DEFAULT_VOICE)
+        return voice, persona.get("system_prompt")
+
+    # --- WRITES ---
+
+    def save(self, persona_id: str, data: dict) -> PersonaEntry:
+        safe_id = safe_persona_id(persona_id)
+        path = os.path.join(self.directory, f"{safe_id}.json")
+        tmp_path = f"{path}.tmp"
+        with self._lock:
+            # Atomic replace: readers (and other processes) never see a half-written file
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, path)
+            stat = os.stat(path)
+            entry = PersonaEntry(data, stat.st_mtime_ns, stat.st_size)
+            self.entries[safe_id] = entry
+            self.files[f"{safe_id}.json"] = safe_id
+            self._update_list_etag()
+        return entry
+
+    def delete(self, persona_id: str) -> bool:
+        safe_id = safe_persona_id(persona_id)
+        path = os.path.join(self.directory, f"{safe_id}.json")
+        with self._lock:
+            existed = os.path.exists(path)
+            if existed:
+                os.remove(path)
+            self.entries.pop(safe_id, None)
+            self.files.pop(f"{safe_id}.json", None)
+            self._update_list_etag()
+        return existed
+
+    # --- CHANGE DETECTION ---
+
+    def invalidate(self):
+        """Forces a change check on the next lookup."""
+        self._checked_at = 0.0
+
+    def _maybe_refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            self._refresh()
+
+    def _refresh(self):
+        try:
+            scanned = {e.name: e.stat() for e in os.scandir(self.directory)
+                       if e.name.endswith(".json") and e.is_file()}
+        except FileNotFoundError:
+            scanned = {}
+
+        changed = False
+        # Removed files
+        for name in list(self.files):
+            if name not in scanned:
+                self.entries.pop(self.files.pop(name), None)
+                changed = True
+
+        # New or modified files
+        for name, stat in scanned.items():
+            persona_id = self.files.get(name)
+            current = self.entries.get(persona_id) if persona_id else None
+            if current and current.mtime_ns == stat.st_mtime_ns and current.size == stat.st_size:
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "r") as f:
+                    data = json.load(f)
+            except Exception as e:
+                logger.warning(f"Skipping corrupt persona file {name}: {e}")
+                continue
+            if "id" not in data:
+                continue
+            if persona_id and persona_id != safe_persona_id(data["id"]):
+                self.entries.pop(persona_id, None)
+            persona_id = safe_persona_id(data["id"])
+            self.files[name] = persona_id
+            self.entries[persona_id] = PersonaEntry(data, stat.st_mtime_ns, stat.st_size)
+            changed = True
+
+        if changed:
+            self._update_list_etag()
+            logger.info(f"🎭 Persona registry loaded: {len(self.entries)} personas")
+
+    def _update_list_etag(self):
+        digest = hashlib.sha1("|".join(f"{k}:{self.entries[k].etag}" for k in sorted(self.entries)).encode()).hexdigest()
+        self.list_etag = f'W/"{digest[:16]}"'
+
+# Singleton Instance
+persona_registry = PersonaRegistry()
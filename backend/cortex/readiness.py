@@ -0,0 +1,80 @@
+import time
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable
+
+logger = logging.getLogger("Cortex_Readiness")
+
+PENDING, LOADING, READY, FAILED = "pending", "loading", "ready", "failed"
+
+class Subsystem:
+    def __init__(self, name: str, required: bool):
+        self.name = name
+        self.required = required
+        self.state = PENDING
+        self.started_at = None
+        self.duration_ms = None
+        self.error = None
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "required": self.required,
+            "duration_ms": self.duration_ms,
+            "error": self.error,
+        }
+
+class Readiness:
+    """
+    Tracks the load state and timing of Cortex's heavy subsystems.
+
+    '/health' only says the process is alive; '/ready' is true once every *required*
+    subsystem is ready. Optional subsystems (warm-ups, lazily loaded models) are reported
+    but do not hold back traffic.
+    """
+
+    def __init__(self):
+        self.subsystems: Dict[str, Subsystem] = {}
+        self.created_at = time.perf_counter()
+
+    def register(self, name: str, required: bool = False):
+        self.subsystems[name] = Subsystem(name, required)
+
+    def register_many(self, names: Iterable[str], required: bool = False):
+        for name in names:
+            self.register(name, required)
+
+    @asynccontextmanager
+    async def track(self, name: str):
+        """Marks a subsystem loading -> ready (or failed, re-raising the error)."""
+        subsystem = self.subsystems.get(name)
+        if subsystem is None:
+            self.register(name)
+            subsystem = self.subsystems[name]
+        subsystem.state = LOADING
+        subsystem.error = None
+        subsystem.started_at = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            subsystem.state = FAILED
+            subsystem.error = str(e)
+            raise
+        else:
+            subsystem.state = READY
+        finally:
+            subsystem.duration_ms = round((time.perf_counter() - subsystem.started_at) * 1000, 1)
+            logger.info(f"⏱️ {name}: {subsystem.state} in {subsystem.duration_ms} ms")
+
+    def is_ready(self) -> bool:
+        return all(s.state == READY for s in self.subsystems.values() if s.required)
+
+    def snapshot(self) -> dict:
+        return {
+            "ready": self.is_ready(),
+            "uptime_s": round(time.perf_counter() - self.created_at, 1),
+            "subsystems": {name: s.snapshot() for name, s in self.subsystems.items()},
+        }
+
+# Singleton Instance
+readiness = Readiness()
@@ -0,0 +1,157 @@
+import re
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import List, Optional
+import numpy as np
+from config import settings
+
+logger = logging.getLogger("Cortex_ResponseCache")
+
+# Queries that lean on earlier turns ("what about tomorrow?", "tell me more", "why is that?")
+# must be answered by the LLM with history, never from the cache.
+FOLLOW_UP_PATTERN = re.compile(
+    r"^(and|but|so|also|then|what about|how about|why|ok(ay)?|yes|no)\b"
+    r"|\b(it|its|that|this|those|these|they|them|their|he|she|him|her|his|there|more|again|else|above|previous|earlier|same)\b",
+    re.IGNORECASE,
+)
+# Queries about the user or the conversation itself ("what's my name", "remind me what I said",
+# "our plan") depend on one session's history/memories: never shared across users of a persona.
+PERSONAL_PATTERN = re.compile(
+    r"\b(i|i'm|i've|i'd|me|my|mine|myself|we|we're|us|our|ours|remember|remind|recall|forgot|forget)\b"
+    r"|\byou (said|told|mentioned|know about)\b|\blast time\b",
+    re.IGNORECASE,
+)
+
+class CachedAnswer:
+    __slots__ = ("partition", "query", "vector", "text", "voice", "audio", "audio_format", "created_at", "hits")
+
+    def __init__(self, partition: str, query: str, vector: np.ndarray, text: str, voice: str, audio: Optional[List[bytes]],
+                 audio_format: str = "wav"):
+        self.partition = partition
+        self.query = query
+        self.vector = vector
+        self.text = text
+        self.voice = voice
+        self.audio = audio  # One entry per sentence
+        self.audio_format = audio_format  # "wav" (legacy) or "pcm16" (framed sockets)
+        self.created_at = time.monotonic()
+        self.hits = 0
+
+class SemanticResponseCache:
+    """
+    Opt-in cache of complete answers, keyed by persona (and its system prompt) plus the query
+    embedding. A new query hits when its cosine similarity to a cached query is at least
+    'threshold' and the entry is younger than 'ttl'. Entries are evicted LRU beyond 'max_entries'.
+
+    Personas opt in with traits.response_cache = true (RESPONSE_CACHE_DEFAULT_OPT_IN for the rest).
+    Excluded: personas whose traits.temperature exceeds RESPONSE_CACHE_MAX_TEMPERATURE
+    and queries that look like contextual follow-ups or are about the user (see PERSONAL_PATTERN).
+
+    Args:
+        threshold (float): Minimum cosine similarity for a hit.
+        ttl (float): Entry lifetime in seconds.
+        max_entries (int): Total entries across all personas.
+    """
+
+    def __init__(self, threshold: float = settings.RESPONSE_CACHE_THRESHOLD, ttl: float = settings.RESPONSE_CACHE_TTL,
+                 max_entries: int = settings.RESPONSE_CACHE_MAX_ENTRIES):
+        self.enabled = settings.RESPONSE_CACHE_ENABLED
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._next_id = 0
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.stores = 0
+
+    @staticmethod
+    def partition(persona_id: str, system_prompt: Optional[str]) -> str:
+        """Editing a persona's prompt moves it to a fresh partition (old answers age out)."""
+        digest = hashlib.sha1((system_prompt or "").encode("utf-8")).hexdigest()[:12]
+        return f"{persona_id}:{digest}"
+
+    def eligible(self, persona: Optional[dict], query: str) -> bool:
+        if not self.enabled or not query or not query.strip():
+            return False
+        traits = (persona or {}).get("traits") or {}
+        if not traits.get("response_cache", settings.RESPONSE_CACHE_DEFAULT_OPT_IN):
+            return False
+        if float(traits.get("temperature", 0.0) or 0.0) > settings.RESPONSE_CACHE_MAX_TEMPERATURE:
+            return False
+        if (FOLLOW_UP_PATTERN.search(query) or PERSONAL_PATTERN.search(query)
+                or len(query) > settings.RESPONSE_CACHE_MAX_QUERY_CHARS):
+            self.skipped += 1
+            return False
+        return True
+
+    def lookup(self, partition: str, vector: List[float]) -> Optional[CachedAnswer]:
+        query = self._normalize(vector)
+        now = time.monotonic()
+        best, best_score = None, self.threshold
+        for key, entry in list(self.entries.items()):
+            if now - entry.created_at > self.ttl:
+                del self.entries[key]
+                continue
+            if entry.partition != partition:
+                continue
+            score = float(entry.vector @ query)
+            if score >= best_score:
+                best, best_score = (key, entry), score
+
+        if best is None:
+            self.misses += 1
+            return None
+        key, entry = best
+        self.entries.move_to_end(key)
+        entry.hits += 1
+        self.hits += 1
+        logger.info(f"♻️ Response cache hit ({best_score:.3f}): '{entry.query[:40]}'")
+        return entry
+
+    def store(self, partition: str, query: str, vector: List[float], text: str, voice: str, audio: Optional[List[bytes]],
+              audio_format: str = "wav"):
+        if not text.strip():
+            return
+        self.entries[self._next_id] = CachedAnswer(
+            partition, query, self._normalize(vector), text, voice,
+            audio if settings.RESPONSE_CACHE_AUDIO else None, audio_format
+        )
+        self._next_id += 1
+        self.stores += 1
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self, persona_id: Optional[str] = None):
+        if persona_id is None:
+            self.entries.clear()
+            return
+        for key in [k for k, e in self.entries.items() if e.partition.startswith(f"{persona_id}:")]:
+            del self.entries[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped_follow_ups": self.skipped,
+            "stores": self.stores,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        return v / max(float(np.linalg.norm(v)), 1e-12)
+
+# Singleton Instance
+response_cache = SemanticResponseCache()
@@ -1,138 +1,300 @@
-import json
+import time
 import logging
 import asyncio
-import httpx
+from contextlib import aclosing
+from typing import Optional
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
 from config import settings
+from services_client import service_client
+from speech import SpeechPipeline
+from segmenter import SentenceSegmenter, split_sentences
+from persona_registry import persona_registry
+from response_cache import response_cache, CachedAnswer
+from memory import memory_engine
+from metrics import TurnTimer
+from tools import ToolPrefetch, tool_context_message
+from audio_protocol import AudioFormat, create_audio_sink
+from session_owners import session_owners
 
 # Configure Logger
 logger = logging.getLogger("Cortex_Chat")
 
 router = APIRouter()
 
-# --- VOICE MAP ---
-# Maps persona IDs to Kokoro voice codes
-# You can add more mappings here as needed
-PERSONA_VOICE_MAP = {
-    "default": "af_sarah",   # Default Female
-    "nova": "af_sarah",
-    "sage": "am_michael",    # Example Male
-    "cipher": "bf_emma",
-    "architect": "am_adam"
-}
+# --- TURN HANDLING ---
 
-# --- SERVICES ---
-
-async def query_llm_stream(message: str, session_id: str):
-    """
-    Generator that yields chunks of text from the LLM Service.
-    """
-    async with httpx.AsyncClient(timeout=45.0) as client:
-        # LLM servisine streaming request atıyoruz
-        async with client.stream(
-            "POST", 
-            f"{settings.LLM_SERVICE_URL}/chat", 
-            json={"message": message, "conversation_id": session_id, "stream": True}
-        ) as response:
-            async for chunk in response.aiter_lines():
-                if chunk:
-                    # SSE format: "data: {...}" parsing
-                    if chunk.startswith("data: "):
-                        data_str = chunk.replace("data: ", "").strip()
-                        if data_str == "[DONE]":
-                            break
-                        try:
-                            data = json.loads(data_str)
-                            if "content" in data:
-                                yield data["content"]
-                        except:
-                            pass
-
-# FIX: Added 'voice' parameter here.
-# The TTS Service requires 'voice' to know which speaker embedding to use.
-async def generate_tts(text: str, voice: str):
+async def run_turn(websocket: WebSocket, user_text: str, session_id: str, persona_id: str, send_timings: bool = False,
+                   audio_format: Optional[AudioFormat] = None, turn_id: int = 0):
     """
-    Fetches audio bytes from TTS Service for a given text fragment.
+    Executes one conversational turn: LLM tokens -> client text + pipelined TTS audio.
+    Runs as its own task so the socket reader can cancel it on barge-in.
+
+    Timings (TTFT, tokens/s, first sentence, TTS per sentence, first audio, total) are recorded
+    into the '/metrics' histograms and, with 'send_timings', attached to 'generation_end'.
+
+    Audio goes out as one WAV per sentence, or as framed PCM16/Opus chunks tagged with 'turn_id'
+    when the client negotiated it (see audio_protocol.py).
     """
-    if not text or len(text.strip()) < 2: 
-        return None
-        
+    timer = TurnTimer()
+    audio_format = audio_format or AudioFormat()
+    try:
+        outcome = await _execute_turn(websocket, user_text, session_id, persona_id, timer, audio_format, turn_id)
+    except asyncio.CancelledError:
+        timer.finish("cancelled")
+        raise
+    except Exception:
+        timer.finish("error")
+        raise
+    timer.finish(outcome)
+
+    # Signal end of turn
+    end_event = {"type": "generation_end"}
+    if outcome == "cached":
+        end_event["cached"] = True
+    if audio_format.framed:
+        end_event["turn_id"] = turn_id
+    if send_timings:
+        end_event["timings"] = timer.summary()
+    await websocket.send_json(end_event)
+
+async def _execute_turn(websocket: WebSocket, user_text: str, session_id: str, persona_id: str, timer: TurnTimer,
+                        audio_format: AudioFormat, turn_id: int) -> str:
+    """Runs the turn body. Returns its outcome: 'completed', 'cached' or 'disconnected'."""
+    logger.info(f"User said: {user_text}")
+
+    # Speculative finance/info lookups run while the rest of the turn is prepared
+    prefetch = ToolPrefetch().start(user_text)
+    try:
+        return await _respond(websocket, user_text, session_id, persona_id, timer, prefetch, audio_format, turn_id)
+    finally:
+        prefetch.cancel()
+
+async def _respond(websocket: WebSocket, user_text: str, session_id: str, persona_id: str, timer: TurnTimer,
+                   prefetch: ToolPrefetch, audio_format: AudioFormat, turn_id: int) -> str:
+    # Resolved per turn (in-memory lookup) so persona edits apply to live sessions
+    voice, system_prompt = persona_registry.resolve(persona_id)
+
+    # Semantic response cache (opt-in): replay a stored answer instead of LLM + TTS
+    cache_partition, cache_vector = None, None
+    if response_cache.eligible(persona_registry.get(persona_id), user_text):
+        cache_partition = response_cache.partition(persona_id, system_prompt)
+        try:
+            cache_vector = (await memory_engine.embed([user_text]))[0]
+        except Exception as e:
+            logger.warning(f"Response cache lookup skipped: {e}")
+        if cache_vector is not None:
+            cached = response_cache.lookup(cache_partition, cache_vector)
+            if cached is not None:
+                # The LLM Service never sees this turn: record it so follow-ups have it in context
+                record = asyncio.create_task(service_client.append_history(session_id, user_text, cached.text))
+                try:
+                    await replay_cached(websocket, cached, voice, timer, audio_format, turn_id)
+                except BaseException:
+                    record.cancel() # Interrupted, like an LLM turn cut off mid-stream
+                    raise
+                await record
+                return "cached"
+
+    # Lookups that made the deadline become prompt context; late ones are dropped
+    tool_context = await prefetch.context()
+    timer.prefetch_wait = prefetch.waited
+
+    async def synthesize(text: str):
+        started = time.perf_counter()
+        async with aclosing(_synthesis_stream(text, voice, audio_format)) as audio:
+            async for audio_bytes in audio:
+                yield audio_bytes
+        timer.tts(time.perf_counter() - started)
+
+    # Tokens stream to the client while completed sentences are synthesized concurrently
+    pipeline = SpeechPipeline(
+        websocket,
+        synthesize,
+        record=cache_vector is not None and not tool_context,
+        on_audio=timer.audio,
+        sink=create_audio_sink(websocket, audio_format, turn_id)
+    )
+    segmenter = SentenceSegmenter(**_segmenter_options())
+    reply_parts = []
+    completed = False
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.post(
-                f"{settings.TTS_SERVICE_URL}/generate",
-                # FIX: Payload now includes 'voice' and 'speed'
-                json={"text": text, "voice": voice, "speed": 1.0},
-            )
-            if resp.status_code == 200:
-                return resp.content # Binary audio data (WAV/PCM)
+
+        # 'aclosing' guarantees the LLM HTTP stream is closed as soon as the turn is cancelled
+        timer.llm_started()
+        async with aclosing(service_client.stream_llm(
+            user_text, session_id, system_prompt, context=tool_context_message(tool_context)
+        )) as tokens:
+            async for token in tokens:
+                if websocket.client_state.name == "DISCONNECTED":
+                    break
+
+                # A. Stream Text to Frontend immediately
+                await websocket.send_json({
+                    "type": "text_chunk",
+                    "content": token
+                })
+                reply_parts.append(token)
+                timer.token()
+
+                # B. Accumulate for TTS: the segmenter finds sentence ends inside tokens
+                for sentence in segmenter.push(token):
+                    timer.sentence()
+                    await pipeline.submit(sentence)
             else:
-                logger.error(f"TTS Service returned {resp.status_code}: {resp.text}")
-    except Exception as e:
-        logger.error(f"TTS Connection Error: {e}")
-    return None
+                completed = True
+
+        # Final flush if any text remains
+        for sentence in segmenter.flush():
+            timer.sentence()
+            await pipeline.submit(sentence)
+
+        # Wait until every sentence's audio has been delivered, in order
+        await pipeline.finish()
+    finally:
+        # On cancel: aborts pending TTS requests and drops queued audio. No-op once finished.
+        await pipeline.abort()
+
+    # Answers built on live data go stale, so they are not cached
+    if completed and cache_vector is not None and not tool_context:
+        response_cache.store(
+            cache_partition, user_text, cache_vector, "".join(reply_parts), voice, pipeline.delivered,
+            _recorded_format(audio_format)
+        )
+
+    return "completed" if completed else "disconnected"
+
+async def _synthesis_stream(text: str, voice: str, audio_format: AudioFormat):
+    """Framed sockets get PCM16 as the TTS Service produces it; legacy ones one WAV per sentence."""
+    if audio_format.framed:
+        async with aclosing(service_client.stream_tts(text, voice)) as chunks:
+            async for chunk in chunks:
+                yield chunk
+        return
+    audio_bytes = await service_client.generate_tts(text, voice)
+    if audio_bytes:
+        yield audio_bytes
+
+def _recorded_format(audio_format: AudioFormat) -> str:
+    # Framed turns record PCM16 before encoding, so any framed codec can replay it
+    return "pcm16" if audio_format.framed else "wav"
+
+async def replay_cached(websocket: WebSocket, cached: CachedAnswer, voice: str, timer: TurnTimer,
+                        audio_format: AudioFormat, turn_id: int):
+    """
+    Sends a cached answer: the full text, then the stored audio. If the persona's voice changed
+    since the answer was cached (or audio wasn't kept, or in another format), the text is re-synthesized.
+    """
+    await websocket.send_json({"type": "text_chunk", "content": cached.text})
+    sink = create_audio_sink(websocket, audio_format, turn_id)
+
+    if cached.audio and cached.voice == voice and cached.audio_format == _recorded_format(audio_format):
+        for audio_bytes in cached.audio:
+            await sink.write(audio_bytes)
+            await sink.end_segment()
+            timer.audio()
+    else:
+        pipeline = SpeechPipeline(
+            websocket, lambda text: _synthesis_stream(text, voice, audio_format), on_audio=timer.audio, sink=sink
+        )
+        try:
+            for sentence in split_sentences(cached.text, **_segmenter_options()):
+                await pipeline.submit(sentence)
+            await pipeline.finish()
+        finally:
+            await pipeline.abort()
+
+def _segmenter_options() -> dict:
+    return {
+        "min_chars": settings.SEGMENT_MIN_CHARS,
+        "max_chars": settings.SEGMENT_MAX_CHARS,
+        "eager_first_clause": settings.EAGER_FIRST_CLAUSE,
+        "first_clause_min_chars": settings.FIRST_CLAUSE_MIN_CHARS,
+    }
+
+async def cancel_turn(turn: Optional[asyncio.Task]) -> bool:
+    """Cancels an in-flight turn and waits for its cleanup. Returns True if one was running."""
+    if turn is None or turn.done():
+        return False
+    turn.cancel()
+    await asyncio.gather(turn, return_exceptions=True)
+    return True
+
+def _log_turn_result(turn: asyncio.Task):
+    if not turn.cancelled() and turn.exception() is not None:
+        logger.error(f"Turn Error: {turn.exception()}")
+
+def _cancelled_event(audio_format: AudioFormat, turn_id: int) -> dict:
+    event = {"type": "generation_cancelled"}
+    if audio_format.framed:
+        event["turn_id"] = turn_id # Frames of this turn still in flight can be dropped
+    return event
 
 # --- WEBSOCKET ENDPOINT ---
 
 @router.websocket("/ws/chat/{session_id}")
-async def websocket_chat(websocket: WebSocket, session_id: str, persona_id: str = Query("default")):
+async def websocket_chat(websocket: WebSocket, session_id: str, persona_id: str = Query("default"),
+                         user_id: Optional[str] = Query(None)):
     """
     Full-Duplex Chat Endpoint.
     Handles: Text In -> LLM Processing -> Text Out + Audio Out (Parallel)
+    
+    The socket is read continuously, including while a response is streaming, so an
+    'interrupt' (or a new 'user_message') cancels the in-flight LLM stream and TTS work.
+
+    Sending {"type": "audio_config", "codec": "pcm16" | "opus"} switches audio to the framed
+    binary protocol (see audio_protocol.py); the server replies with the agreed format.
+
+    'user_id' is the identity the API Gateway verified at the edge; a session opened by one
+    user is refused to any other (see session_owners.py).
     """
+    if not session_owners.claim(session_id, user_id):
+        await websocket.close(code=1008) # Policy violation: not this user's session
+        return
     await websocket.accept()
-    logger.info(f"WS Connected: {session_id} | Persona: {persona_id}")
-    
-    # FIX: Select the correct voice based on the connected persona
-    selected_voice = PERSONA_VOICE_MAP.get(persona_id, "af_sarah")
+    logger.info(f"WS Connected: {session_id} | Persona: {persona_id} | User: {user_id or 'anonymous'}")
+    current_turn: Optional[asyncio.Task] = None
+    audio_format = AudioFormat() # Legacy WAV until the client sends 'audio_config'
+    turn_id = 0
+    turn_format = audio_format # Format of 'current_turn' (a mid-turn 'audio_config' only applies to later turns)
 
     try:
         while True:
-            # 1. Wait for User Message
+            # 1. Wait for User Message (also during generation)
             data = await websocket.receive_json()
             
             if data.get("type") == "interrupt":
                 logger.info("Interrupt signal received.")
+                if await cancel_turn(current_turn):
+                    await websocket.send_json(_cancelled_event(turn_format, turn_id))
+                continue
+
+            if data.get("type") == "audio_config":
+                # Applies from the next turn on
+                audio_format = AudioFormat.negotiate(data)
+                await websocket.send_json(audio_format.describe())
                 continue
 
             if data.get("type") == "user_message":
-                user_text = data.get("content")
-                logger.info(f"User said: {user_text}")
+                # A new message while speaking is an implicit barge-in
+                if await cancel_turn(current_turn):
+                    await websocket.send_json(_cancelled_event(turn_format, turn_id))
 
                 # 2. Process Pipeline
-                current_sentence = ""
-                
-                async for token in query_llm_stream(user_text, session_id):
-                    if websocket.client_state.name == "DISCONNECTED":
-                        break
-
-                    # A. Stream Text to Frontend immediately
-                    await websocket.send_json({
-                        "type": "text_chunk",
-                        "content": token
-                    })
-                    
-                    # B. Accumulate for TTS
-                    current_sentence += token
-                    
-                    # Split by punctuation to create natural pauses
-                    if token in [".", "!", "?", "\n"]:
-                        # FIX: Pass the 'selected_voice' to the generator
-                        audio_bytes = await generate_tts(current_sentence, selected_voice)
-                        if audio_bytes:
-                            await websocket.send_bytes(audio_bytes)
-                        current_sentence = "" # Reset buffer
-
-                # Final flush if any text remains
-                if current_sentence.strip():
-                    audio_bytes = await generate_tts(current_sentence, selected_voice)
-                    if audio_bytes:
-                        await websocket.send_bytes(audio_bytes)
-
-                # Signal end of turn
-                await websocket.send_json({"type": "generation_end"})
+                turn_id += 1
+                turn_format = audio_format
+                current_turn = asyncio.create_task(
+                    run_turn(
+                        websocket, data.get("content"), session_id, persona_id,
+                        send_timings=data.get("timings", settings.SEND_TURN_TIMINGS),
+                        audio_format=turn_format,
+                        turn_id=turn_id
+                    )
+                )
+                current_turn.add_done_callback(_log_turn_result)
 
     except WebSocketDisconnect:
         logger.info(f"WS Disconnected: {session_id}")
     except Exception as e:
-        logger.error(f"WS Critical Error: {e}")
\ No newline at end of file
+        logger.error(f"WS Critical Error: {e}")
+    finally:
+        await cancel_turn(current_turn)
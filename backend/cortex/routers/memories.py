@@ -0,0 +1,43 @@
+import json
+import logging
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse, JSONResponse
+from schemas import MemoryCreate, MemoryBulkCreate
+from memory import memory_engine
+
+logger = logging.getLogger("Cortex_Memories")
+
+router = APIRouter()
+
+def _metadata(item: MemoryCreate) -> dict:
+    return {"persona_id": item.persona_id, "emotion": item.emotion, "label": item.label}
+
+@router.post("/api/memory")
+async def create_memory(item: MemoryCreate):
+    point_id = await memory_engine.add_memory(item.text, _metadata(item))
+    if point_id is None:
+        return JSONResponse(status_code=500, content={"status": "error", "detail": "Memory could not be stored"})
+    return {"status": "stored", "id": point_id}
+
+@router.post("/api/memory/bulk")
+async def bulk_ingest(request: MemoryBulkCreate, stream: bool = Query(False, description="Stream NDJSON progress events")):
+    """
+    Ingests many memories or long documents in one call.
+
+    With '?stream=true' the response is NDJSON: one progress event per upsert batch
+    ('chunked' -> 'progress'... -> 'done' | 'error'). Otherwise the final event is returned.
+    """
+    records = [(item.text, _metadata(item)) for item in request.items]
+    events = memory_engine.ingest(records, request.chunk_size, request.chunk_overlap)
+
+    if stream:
+        async def ndjson():
+            async for event in events:
+                yield json.dumps(event) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    last = {}
+    async for event in events:
+        last = event
+    status_code = 500 if last.get("stage") == "error" else 200
+    return JSONResponse(status_code=status_code, content=last)
@@ -0,0 +1,169 @@
+import json
+import struct
+import asyncio
+import logging
+from typing import Dict
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from starlette.websockets import WebSocketState
+from routers.chat import websocket_chat
+
+logger = logging.getLogger("Cortex_Mux")
+
+router = APIRouter()
+
+# --- MUX FRAMING ---
+# Every multiplexed frame is a binary WS message: [channel id: uint32][kind: uint8][payload].
+# Must stay in sync with backend/api_gateway/tunnel.py.
+MUX_HEADER = struct.Struct("!IB")
+KIND_OPEN, KIND_TEXT, KIND_BINARY, KIND_CLOSE = 0, 1, 2, 3
+CHANNEL_QUEUE_SIZE = 64
+# Max wait for a full channel inbox before the channel is dropped (mirrors WS_TUNNEL_SLOW_CONSUMER_TIMEOUT)
+SLOW_CONSUMER_TIMEOUT = 5.0
+
+def encode_frame(channel_id: int, kind: int, payload: bytes = b"") -> bytes:
+    return MUX_HEADER.pack(channel_id, kind) + payload
+
+def decode_frame(data: bytes):
+    channel_id, kind = MUX_HEADER.unpack_from(data)
+    return channel_id, kind, data[MUX_HEADER.size:]
+
+class VirtualWebSocket:
+    """
+    Presents one mux channel with the subset of the WebSocket API used by the chat handlers,
+    so 'websocket_chat' runs unchanged whether it owns a real socket or a channel.
+    """
+
+    def __init__(self, channel_id: int, sender, query_params: dict):
+        self.channel_id = channel_id
+        self.query_params = query_params
+        self.client_state = WebSocketState.CONNECTING
+        self._send = sender
+        self._inbox = asyncio.Queue(maxsize=CHANNEL_QUEUE_SIZE)
+
+    # -- Called by the mux reader --
+    async def feed(self, message: dict):
+        await self._inbox.put(message)
+
+    def disconnect(self):
+        self.client_state = WebSocketState.DISCONNECTED
+        try:
+            self._inbox.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        except asyncio.QueueFull:
+            pass # Handler will notice the state change on its next send
+
+    # -- WebSocket API --
+    async def accept(self, *args, **kwargs):
+        self.client_state = WebSocketState.CONNECTED
+
+    async def close(self, code: int = 1000, reason: str = None):
+        if self.client_state != WebSocketState.DISCONNECTED:
+            self.client_state = WebSocketState.DISCONNECTED
+            await self._send(encode_frame(self.channel_id, KIND_CLOSE))
+
+    async def receive(self) -> dict:
+        if self.client_state == WebSocketState.DISCONNECTED and self._inbox.empty():
+            raise WebSocketDisconnect(code=1000)
+        message = await self._inbox.get()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(code=message.get("code", 1000))
+        return message
+
+    async def receive_text(self) -> str:
+        message = await self.receive()
+        return message.get("text") or message.get("bytes", b"").decode("utf-8")
+
+    async def receive_bytes(self) -> bytes:
+        message = await self.receive()
+        return message.get("bytes") or message.get("text", "").encode("utf-8")
+
+    async def receive_json(self, mode: str = "text"):
+        return json.loads(await self.receive_text())
+
+    async def send_text(self, data: str):
+        self._ensure_open()
+        await self._send(encode_frame(self.channel_id, KIND_TEXT, data.encode("utf-8")))
+
+    async def send_bytes(self, data: bytes):
+        self._ensure_open()
+        await self._send(encode_frame(self.channel_id, KIND_BINARY, data))
+
+    async def send_json(self, data, mode: str = "text"):
+        await self.send_text(json.dumps(data, separators=(",", ":")))
+
+    def _ensure_open(self):
+        if self.client_state == WebSocketState.DISCONNECTED:
+            raise WebSocketDisconnect(code=1000)
+
+# --- WEBSOCKET ENDPOINT ---
+
+@router.websocket("/ws/mux")
+async def websocket_mux(websocket: WebSocket):
+    """
+    Multiplexed endpoint used by the API Gateway.
+    Each session-tagged channel runs its own 'websocket_chat' over a shared socket.
+    """
+    await websocket.accept()
+    logger.info("🔀 Mux connection opened")
+
+    channels: Dict[int, VirtualWebSocket] = {}
+    tasks: Dict[int, asyncio.Task] = {}
+    send_lock = asyncio.Lock()
+
+    async def send(frame: bytes):
+        async with send_lock:
+            await websocket.send_bytes(frame)
+
+    async def run_channel(vws: VirtualWebSocket, session_id: str):
+        try:
+            params = vws.query_params
+            await websocket_chat(vws, session_id, persona_id=params.get("persona_id", "default"), user_id=params.get("user_id"))
+        finally:
+            channels.pop(vws.channel_id, None)
+            tasks.pop(vws.channel_id, None)
+            try:
+                await vws.close()
+            except Exception:
+                pass # Shared socket already gone
+
+    try:
+        while True:
+            message = await websocket.receive_bytes()
+            channel_id, kind, payload = decode_frame(message)
+
+            if kind == KIND_OPEN:
+                handshake = json.loads(payload)
+                vws = VirtualWebSocket(channel_id, send, handshake.get("params", {}))
+                channels[channel_id] = vws
+                tasks[channel_id] = asyncio.create_task(run_channel(vws, handshake["session_id"]))
+                continue
+
+            vws = channels.get(channel_id)
+            if vws is None:
+                continue
+            if kind == KIND_CLOSE:
+                vws.disconnect()
+                continue
+
+            if kind == KIND_TEXT:
+                message = {"type": "websocket.receive", "text": payload.decode("utf-8")}
+            else:
+                message = {"type": "websocket.receive", "bytes": payload}
+            try:
+                # Shared socket: a channel that stopped reading must not stall every other session
+                await asyncio.wait_for(vws.feed(message), SLOW_CONSUMER_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"Dropping slow mux channel {channel_id}")
+                channels.pop(channel_id, None)
+                task = tasks.get(channel_id)
+                if task is not None:
+                    task.cancel() # 'run_channel' cleanup sends KIND_CLOSE to the gateway
+
+    except WebSocketDisconnect:
+        logger.info("Mux connection closed")
+    except Exception as e:
+        logger.error(f"Mux Critical Error: {e}")
+    finally:
+        for vws in list(channels.values()):
+            vws.disconnect()
+        for task in list(tasks.values()):
+            task.cancel()
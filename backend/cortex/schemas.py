@@ -37,6 +37,15 @@ class MemoryCreate(BaseModel):
     emotion: Optional[str] = "neutral"
     label: Optional[str] = "manual_entry"
 
+class MemoryBulkCreate(BaseModel):
+    """
+    Schema for bulk memory ingestion (documents, chat exports).
+    Texts longer than 'chunk_size' are split into overlapping chunks before embedding.
+    """
+    items: List[MemoryCreate] = Field(..., description="Memories or whole documents to ingest.")
+    chunk_size: Optional[int] = Field(None, description="Characters per chunk (defaults to INGEST_CHUNK_SIZE).")
+    chunk_overlap: Optional[int] = Field(None, description="Characters shared by consecutive chunks.")
+
 class MemoryUpdate(BaseModel):
     """
     Schema for updating an existing memory entry.
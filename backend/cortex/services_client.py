@@ -1,5 +1,7 @@
-import httpx
+import json
 import logging
+from typing import AsyncIterator, Dict, Optional
+import httpx
 from config import settings
 
 logger = logging.getLogger("Service_Client")
@@ -7,42 +9,189 @@ logger = logging.getLogger("Service_Client")
 class ServiceClient:
     """
     A wrapper to handle HTTP communication with internal microservices.
-    Includes timeout handling and error logging.
+
+    Holds one pooled, long-lived 'httpx.AsyncClient' per downstream service so a voice turn
+    reuses keep-alive connections instead of opening a new one per sentence.
+    Clients are created in 'startup' and closed in 'shutdown' (app lifecycle).
     """
-    
+
+    def __init__(self):
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+
+    # --- LIFECYCLE ---
+
+    async def startup(self):
+        limits = httpx.Limits(
+            max_connections=settings.SERVICE_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.SERVICE_MAX_KEEPALIVE,
+            keepalive_expiry=settings.SERVICE_KEEPALIVE_EXPIRY,
+        )
+        services = {
+            "llm": (settings.LLM_SERVICE_URL, settings.LLM_TIMEOUT),
+            "tts": (settings.TTS_SERVICE_URL, settings.TTS_TIMEOUT),
+            "finance": (settings.FINANCE_SERVICE_URL, settings.FINANCE_TIMEOUT),
+            "info": (settings.INFO_SERVICE_URL, settings.INFO_TIMEOUT),
+        }
+        for name, (base_url, timeout) in services.items():
+            self.clients[name] = httpx.AsyncClient(
+                base_url=base_url,
+                limits=limits,
+                timeout=httpx.Timeout(timeout, connect=settings.SERVICE_CONNECT_TIMEOUT),
+            )
+        logger.info(f"🔌 Service clients ready: {', '.join(self.clients)}")
+
+    async def shutdown(self):
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients.clear()
+
+    def _client(self, name: str) -> httpx.AsyncClient:
+        client = self.clients.get(name)
+        if client is None:
+            raise RuntimeError(f"Service client '{name}' is not started")
+        return client
+
+    # --- LLM SERVICE ---
+
     @staticmethod
-    async def chat_with_llm(message: str, session_id: str, context: str = ""):
+    def build_llm_payload(message: str, session_id: str, system_prompt: Optional[str] = None, stream: bool = True,
+                          context: Optional[str] = None) -> dict:
+        payload = {"message": message, "conversation_id": session_id, "stream": stream}
+        if system_prompt:
+            payload["persona_system_prompt"] = system_prompt
+        if context:
+            payload["context"] = context
+        return payload
+
+    async def stream_llm(self, message: str, session_id: str, system_prompt: Optional[str] = None,
+                         context: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Yields text tokens from the LLM Service's SSE stream.
+        Closing the generator closes the HTTP stream (used for barge-in).
+        'context' is per-turn data sent apart from the (cacheable) system prompt.
+        """
+        payload = self.build_llm_payload(message, session_id, system_prompt, context=context)
+        async with self._client("llm").stream("POST", "/chat", json=payload) as response:
+            async for line in response.aiter_lines():
+                # SSE format: "data: {...}" parsing
+                if not line.startswith("data: "):
+                    continue
+                data_str = line[6:].strip()
+                if data_str == "[DONE]":
+                    break
+                try:
+                    data = json.loads(data_str)
+                except json.JSONDecodeError:
+                    continue
+                if "content" in data:
+                    yield data["content"]
+                elif "error" in data:
+                    logger.error(f"LLM Service Error: {data['error']}")
+
+    async def stream_llm_raw(self, payload: dict) -> AsyncIterator[bytes]:
+        """Proxies the LLM Service's SSE bytes unchanged (legacy '/interact')."""
+        try:
+            async with self._client("llm").stream("POST", "/chat", json=payload) as response:
+                async for chunk in response.aiter_bytes():
+                    yield chunk
+        except Exception as e:
+            yield f"Error calling LLM Service: {str(e)}".encode()
+
+    async def append_history(self, session_id: str, user_message: str, ai_message: str) -> bool:
+        """Writes an exchange the LLM Service did not generate (response cache hit) into the session history."""
+        try:
+            resp = await self._client("llm").post(
+                f"/history/{session_id}", json={"user_message": user_message, "ai_message": ai_message}
+            )
+            resp.raise_for_status()
+            return True
+        except Exception as e:
+            logger.error(f"History append failed for {session_id}: {e}")
+            return False
+
+    async def warmup_llm(self):
+        """Sends a dummy request so the LLM Service loads its model into GPU memory."""
+        await self._client("llm").post("/chat", json=self.build_llm_payload("ping", "warmup", stream=False))
+
+    async def chat_with_llm(self, message: str, session_id: str, context: str = ""):
         """
-        Sends a prompt to the LLM Service, injecting retrieved memory context.
+        Builds an LLM payload, injecting retrieved memory context (RAG).
         """
-        # Construct System Prompt with Context (RAG)
         system_prompt = "You are a helpful AI assistant."
         if context:
             system_prompt += f"\nRelevant Memory Context:\n{context}"
-        
-        payload = {
-            "message": message,
-            "conversation_id": session_id,
-            "persona_system_prompt": system_prompt,
-            "stream": True # We want streaming response
-        }
-        
-        # We return the request object/url for the frontend to connect via SSE,
-        # OR we proxy the stream. For Cortex as Orchestrator, proxying is safer but more complex.
-        # For this design, let's proxy the request generator.
-        return payload
+        return self.build_llm_payload(message, session_id, system_prompt)
 
-    @staticmethod
-    async def get_market_data(symbol: str):
+    # --- TTS SERVICE ---
+
+    async def generate_tts(self, text: str, voice: str, speed: float = 1.0) -> Optional[bytes]:
+        """
+        Fetches audio bytes from the TTS Service for a given text fragment.
+        The TTS Service requires 'voice' to know which speaker embedding to use.
+        """
+        if not text or len(text.strip()) < 2:
+            return None
+        try:
+            resp = await self._client("tts").post("/generate", json={"text": text, "voice": voice, "speed": speed})
+            if resp.status_code == 200:
+                return resp.content # Binary audio data (WAV/PCM)
+            logger.error(f"TTS Service returned {resp.status_code}: {resp.text}")
+        except httpx.HTTPError as e:
+            logger.error(f"TTS Connection Error: {e}")
+        return None
+
+    async def stream_tts(self, text: str, voice: str, speed: float = 1.0) -> AsyncIterator[bytes]:
+        """
+        Streams raw PCM16 from the TTS Service as it is produced (framed audio on '/ws/chat').
+        Chunk boundaries follow the HTTP stream, not samples.
+        """
+        if not text or len(text.strip()) < 2:
+            return
+        payload = {"text": text, "voice": voice, "speed": speed, "format": "pcm16"}
+        try:
+            async with self._client("tts").stream("POST", "/generate", json=payload) as resp:
+                if resp.status_code != 200:
+                    await resp.aread()
+                    logger.error(f"TTS Service returned {resp.status_code}: {resp.text}")
+                    return
+                async for chunk in resp.aiter_bytes():
+                    yield chunk
+        except httpx.HTTPError as e:
+            logger.error(f"TTS Connection Error: {e}")
+
+    # --- FINANCE SERVICE ---
+
+    async def get_market_data(self, symbol: str, asset_type: str = "stock") -> Optional[dict]:
         """Calls Finance Service."""
-        async with httpx.AsyncClient() as client:
-            try:
-                resp = await client.get(f"{settings.FINANCE_SERVICE_URL}/market/price/{symbol}")
-                resp.raise_for_status()
-                return resp.json()
-            except Exception as e:
-                logger.error(f"Finance Service Error: {e}")
-                return None
+        try:
+            resp = await self._client("finance").get(f"/market/price/{symbol}", params={"type": asset_type})
+            resp.raise_for_status()
+            return resp.json()
+        except Exception as e:
+            logger.error(f"Finance Service Error: {e}")
+            return None
+
+    # --- INFO SERVICE ---
+
+    async def get_weather(self, city: Optional[str] = None) -> Optional[dict]:
+        """Current weather (Info Service picks its default city when none is given)."""
+        try:
+            resp = await self._client("info").get("/weather", params={"city": city} if city else None)
+            resp.raise_for_status()
+            data = resp.json()
+            return None if "error" in data else data
+        except Exception as e:
+            logger.error(f"Info Service Error (weather): {e}")
+            return None
+
+    async def get_news(self, query: str) -> Optional[dict]:
+        try:
+            resp = await self._client("info").get("/news", params={"query": query})
+            resp.raise_for_status()
+            return resp.json()
+        except Exception as e:
+            logger.error(f"Info Service Error (news): {e}")
+            return None
 
 # Singleton
-service_client = ServiceClient()
\ No newline at end of file
+service_client = ServiceClient()
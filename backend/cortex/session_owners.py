@@ -0,0 +1,47 @@
+import logging
+from collections import OrderedDict
+from typing import Optional
+from config import settings
+
+logger = logging.getLogger("Cortex_Sessions")
+
+class SessionOwners:
+    """
+    Binds chat sessions to the user the API Gateway verified when they were first opened.
+
+    The gateway checks the token once at the edge and forwards the identity as 'user_id'
+    (clients cannot set it), so Cortex trusts it instead of re-verifying the token.
+    A session claimed by a user can then only be reopened by that same user; anonymous
+    connections (auth off, no token) can use sessions nobody has claimed.
+    The oldest bindings are forgotten beyond 'max_sessions'.
+
+    Args:
+        max_sessions (int): Bound on remembered session owners.
+    """
+
+    def __init__(self, max_sessions: int = settings.SESSION_OWNERS_MAX):
+        self.max_sessions = max_sessions
+        self.owners: "OrderedDict[str, str]" = OrderedDict()
+        self.rejected = 0
+
+    def claim(self, session_id: str, user_id: Optional[str]) -> bool:
+        """Returns False if the session belongs to another user."""
+        owner = self.owners.get(session_id)
+        if owner is None:
+            if user_id:
+                self.owners[session_id] = user_id
+                while len(self.owners) > self.max_sessions:
+                    self.owners.popitem(last=False)
+            return True
+        if owner != user_id:
+            self.rejected += 1
+            logger.warning(f"⛔ Session {session_id} belongs to another user")
+            return False
+        self.owners.move_to_end(session_id)
+        return True
+
+    def stats(self) -> dict:
+        return {"owned_sessions": len(self.owners), "max_sessions": self.max_sessions, "rejected": self.rejected}
+
+# Singleton Instance
+session_owners = SessionOwners()
@@ -0,0 +1,131 @@
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Optional
+from fastapi import WebSocket
+from config import settings
+from audio_protocol import WavAudioSink
+
+logger = logging.getLogger("Cortex_Speech")
+
+# Sentinel marking the end of a turn
+_END = object()
+
+class SpeechPipeline:
+    """
+    Producer/consumer pipeline between LLM sentences and the client socket.
+
+    Sentences are queued (bounded) while tokens keep streaming. A dispatcher starts TTS requests
+    for up to 'lookahead' sentences ahead of playback, and a sender delivers the audio frames
+    strictly in sentence order. 'synthesize' yields audio chunks; the sentence being played
+    is forwarded chunk by chunk as TTS produces it, later ones are buffered.
+
+    Usage:
+        pipeline = SpeechPipeline(websocket, synthesize)  # synthesize(text) -> async iterator of bytes
+        await pipeline.submit("Hello there.")
+        ...
+        await pipeline.finish()  # waits until every audio frame has been sent
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        synthesize: Callable[[str], AsyncIterator[bytes]],
+        lookahead: int = settings.TTS_LOOKAHEAD,
+        queue_size: int = settings.TTS_SENTENCE_QUEUE_SIZE,
+        record: bool = False,
+        on_audio: Optional[Callable[[bytes], None]] = None,
+        sink=None,
+    ):
+        self.websocket = websocket
+        self.synthesize = synthesize
+        # Writes audio to the client (legacy WAV or negotiated frames, see audio_protocol.py)
+        self.sink = sink or WavAudioSink(websocket)
+        self.sentences = asyncio.Queue(maxsize=queue_size)
+        # Chunk queues of started syntheses, in sentence order
+        self.ordered = asyncio.Queue()
+        # Lookahead window: a slot is taken before a synthesis starts and freed once its audio is delivered
+        self._slots = asyncio.Semaphore(max(1, lookahead))
+        self._synth_tasks = set()
+        # Delivered audio (one entry per sentence), kept when 'record' is set (response cache)
+        self.delivered = [] if record else None
+        self.on_audio = on_audio
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        self._sender = asyncio.create_task(self._send_in_order())
+
+    async def submit(self, sentence: str):
+        """Queues a sentence for synthesis (blocks only if the sentence queue is full)."""
+        await self._put(sentence)
+
+    async def finish(self):
+        """Signals end of turn and waits for all queued audio to be delivered."""
+        await self._put(_END)
+        await asyncio.gather(self._dispatcher, self._sender)
+
+    async def _put(self, item):
+        """
+        Queues for the dispatcher. If the sender dies (socket send error), nothing drains the
+        queue anymore: its exception is raised here instead of blocking the LLM loop forever.
+        """
+        if self._sender.done():
+            self._sender.result()
+        if not self.sentences.full():
+            self.sentences.put_nowait(item)
+            return
+        put = asyncio.create_task(self.sentences.put(item))
+        try:
+            await asyncio.wait((put, self._sender), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if not put.done():
+                put.cancel()
+        if not put.done() or put.cancelled():
+            self._sender.result()
+            raise RuntimeError("Speech sender stopped before the end of the turn")
+
+    async def abort(self):
+        """Cancels pending synthesis and drops undelivered audio. Safe to call after 'finish'."""
+        for task in (self._dispatcher, self._sender, *self._synth_tasks):
+            task.cancel()
+        await asyncio.gather(self._dispatcher, self._sender, *self._synth_tasks, return_exceptions=True)
+
+    async def _dispatch(self):
+        while True:
+            sentence = await self.sentences.get()
+            if sentence is _END:
+                self.ordered.put_nowait(_END)
+                return
+            # Blocks while 'lookahead' sentences are synthesizing or pending delivery
+            await self._slots.acquire()
+            chunks = asyncio.Queue()
+            task = asyncio.create_task(self._produce(sentence, chunks))
+            self._synth_tasks.add(task)
+            task.add_done_callback(self._synth_tasks.discard)
+            self.ordered.put_nowait(chunks)
+
+    async def _produce(self, sentence: str, chunks: asyncio.Queue):
+        try:
+            async with aclosing(self.synthesize(sentence)) as audio:
+                async for audio_bytes in audio:
+                    if audio_bytes:
+                        chunks.put_nowait(audio_bytes)
+        except Exception as e:
+            logger.error(f"TTS Pipeline Error: {e}")
+        finally:
+            chunks.put_nowait(_END)
+
+    async def _send_in_order(self):
+        while True:
+            chunks = await self.ordered.get()
+            if chunks is _END:
+                return
+            sentence_audio = []
+            while (audio_bytes := await chunks.get()) is not _END:
+                await self.sink.write(audio_bytes)
+                if self.on_audio is not None:
+                    self.on_audio(audio_bytes)
+                sentence_audio.append(audio_bytes)
+            self._slots.release()
+            if sentence_audio:
+                await self.sink.end_segment()
+                if self.delivered is not None:
+                    self.delivered.append(b"".join(sentence_audio))
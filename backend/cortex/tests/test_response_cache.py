@@ -0,0 +1,46 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from response_cache import SemanticResponseCache
+
+PERSONA = {"traits": {"response_cache": True}}
+VECTOR = [1.0, 0.0, 0.0]
+
+def answer_turn(cache: SemanticResponseCache, query: str, reply: str):
+    """Same gating as routers/chat.py: lookup, and store on a miss, only for eligible queries."""
+    if not cache.eligible(PERSONA, query):
+        return None
+    partition = cache.partition("assistant", "You are helpful.")
+    cached = cache.lookup(partition, VECTOR)
+    if cached is not None:
+        return cached.text
+    cache.store(partition, query, VECTOR, reply, "af_heart", None)
+    return None
+
+@pytest.fixture
+def cache():
+    cache = SemanticResponseCache(threshold=0.9, ttl=60, max_entries=16)
+    cache.enabled = True
+    return cache
+
+@pytest.mark.parametrize("query", [
+    "What's my name?",
+    "Remind me what I said about the trip",
+    "What is our plan for Friday?",
+    "Do you remember where I live?",
+    "What did you tell me last time?",
+])
+def test_personal_query_is_neither_stored_nor_served(cache, query):
+    # Session A asks and gets its own answer from the LLM
+    assert answer_turn(cache, query, "Your name is Alice.") is None
+    assert cache.entries == {}
+    # Session B asks the same thing: it must not receive session A's answer
+    assert answer_turn(cache, query, "I don't know your name yet.") is None
+    assert cache.hits == 0
+
+def test_general_query_is_shared(cache):
+    assert answer_turn(cache, "What is the capital of France?", "Paris.") is None
+    assert answer_turn(cache, "What is the capital of France?", "unused") == "Paris."
@@ -0,0 +1,199 @@
+import re
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from config import settings
+from services_client import service_client
+from metrics import voice_metrics
+
+logger = logging.getLogger("Cortex_Tools")
+
+# --- INTENT / ENTITY DETECTION ---
+
+# Cheap regexes only: this runs on every turn, before the LLM is called
+FINANCE_PATTERN = re.compile(r"\b(price|stock|stocks|share|shares|ticker|trading|worth|market|quote|crypto|coin)\b", re.IGNORECASE)
+WEATHER_PATTERN = re.compile(r"\b(weather|forecast|temperature|degrees|rain(ing|y)?|snow(ing|y)?|sunny|humid(ity)?|wind(y)?)\b", re.IGNORECASE)
+NEWS_PATTERN = re.compile(r"\b(news|headlines?)\b", re.IGNORECASE)
+
+CASHTAG_PATTERN = re.compile(r"\$([A-Za-z]{1,5})\b")
+TICKER_PATTERN = re.compile(r"\b([A-Z]{2,5})\b")
+CITY_PATTERN = re.compile(r"\b(?:in|at|for)\s+([A-Z][\w'-]+(?:\s+[A-Z][\w'-]+)?)")
+NEWS_TOPIC_PATTERN = re.compile(r"\b(?:news|headlines?)\s+(?:about|on|for|regarding)\s+([^?.!,]+)", re.IGNORECASE)
+
+# Spoken names -> (symbol, asset type as understood by finance_service)
+KNOWN_ASSETS: Dict[str, Tuple[str, str]] = {
+    "bitcoin": ("BTC", "crypto"),
+    "ethereum": ("ETH", "crypto"),
+    "solana": ("SOL", "crypto"),
+    "dogecoin": ("DOGE", "crypto"),
+    "apple": ("AAPL", "stock"),
+    "tesla": ("TSLA", "stock"),
+    "nvidia": ("NVDA", "stock"),
+    "microsoft": ("MSFT", "stock"),
+    "google": ("GOOGL", "stock"),
+    "alphabet": ("GOOGL", "stock"),
+    "amazon": ("AMZN", "stock"),
+    "meta": ("META", "stock"),
+    "netflix": ("NFLX", "stock"),
+}
+CRYPTO_SYMBOLS = {symbol for symbol, asset_type in KNOWN_ASSETS.values() if asset_type == "crypto"}
+
+# Uppercase words that are not tickers
+TICKER_STOPWORDS = {"I", "AI", "OK", "US", "USA", "UK", "EU", "CEO", "ETF", "IPO", "USD", "EUR", "TRY", "GDP", "API", "TV"}
+
+class ToolCall:
+    __slots__ = ("name", "args")
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+
+    def __repr__(self):
+        return f"ToolCall({self.name}, {self.args})"
+
+def detect_tool_calls(text: str, max_symbols: int = settings.TOOL_MAX_SYMBOLS) -> List[ToolCall]:
+    """
+    Maps a user utterance to the lookups worth prefetching. Precision over recall:
+    a missed intent just means the LLM answers without live data, as before.
+    """
+    if not text:
+        return []
+    calls: List[ToolCall] = []
+
+    # Finance: cashtags always count; names and bare tickers need a market word nearby
+    symbols: Dict[str, str] = {}
+    for match in CASHTAG_PATTERN.finditer(text):
+        symbol = match.group(1).upper()
+        symbols.setdefault(symbol, "crypto" if symbol in CRYPTO_SYMBOLS else "stock")
+    lowered = text.lower()
+    for name, (symbol, asset_type) in KNOWN_ASSETS.items():
+        if re.search(rf"\b{name}\b", lowered) and (asset_type == "crypto" or FINANCE_PATTERN.search(text)):
+            symbols.setdefault(symbol, asset_type)
+    if FINANCE_PATTERN.search(text):
+        for match in TICKER_PATTERN.finditer(text):
+            symbol = match.group(1)
+            if symbol not in TICKER_STOPWORDS:
+                symbols.setdefault(symbol, "crypto" if symbol in CRYPTO_SYMBOLS else "stock")
+    for symbol, asset_type in list(symbols.items())[:max_symbols]:
+        calls.append(ToolCall("market_price", {"symbol": symbol, "asset_type": asset_type}))
+
+    # Weather: optional "in <City>"
+    if WEATHER_PATTERN.search(text):
+        city = CITY_PATTERN.search(text)
+        calls.append(ToolCall("weather", {"city": city.group(1) if city else None}))
+
+    # News: "news about <topic>"
+    if NEWS_PATTERN.search(text):
+        topic = NEWS_TOPIC_PATTERN.search(text)
+        calls.append(ToolCall("news", {"query": topic.group(1).strip() if topic else "latest"}))
+
+    return calls
+
+# --- FORMATTING ---
+
+def _format_market(data: dict) -> str:
+    return f"{data.get('symbol')} price: {data.get('price')} {data.get('currency', '')}".strip()
+
+def _format_weather(data: dict) -> str:
+    return (
+        f"Weather in {data.get('city')}: {data.get('temp_C')}°C, {data.get('desc')}, "
+        f"humidity {data.get('humidity')}%, wind {data.get('wind')} km/h"
+    )
+
+def _format_news(data: dict, query: str) -> str:
+    titles = [item.get("title") for item in (data.get("news") or [])[:3] if item.get("title")]
+    return f"Headlines ({query}): " + "; ".join(titles) if titles else ""
+
+# name -> (lookup, formatter(result, **args))
+TOOLS: Dict[str, Tuple[Callable[..., Awaitable[Optional[dict]]], Callable[..., str]]] = {
+    "market_price": (
+        lambda symbol, asset_type: service_client.get_market_data(symbol, asset_type),
+        lambda data, **_: _format_market(data),
+    ),
+    "weather": (lambda city: service_client.get_weather(city), lambda data, **_: _format_weather(data)),
+    "news": (lambda query: service_client.get_news(query), lambda data, query: _format_news(data, query)),
+}
+
+# --- PREFETCH ---
+
+class ToolPrefetch:
+    """
+    Speculative lookups for one turn. 'start' fires every detected lookup as a task right away,
+    so their latency overlaps the rest of the pre-LLM work (persona resolution, response cache
+    embedding). 'context' then waits for them only until the deadline (measured from 'start');
+    whatever arrived is formatted for the prompt and the stragglers are cancelled.
+
+    The prompt has to be complete before generation starts, so the deadline bounds how much
+    a slow backend can add to time-to-first-token.
+
+    Args:
+        deadline_ms (float): Max time from 'start' to the LLM request.
+    """
+
+    def __init__(self, deadline_ms: float = settings.TOOL_PREFETCH_DEADLINE_MS):
+        self.deadline = deadline_ms / 1000
+        self.calls: List[ToolCall] = []
+        self.tasks: Dict[asyncio.Task, ToolCall] = {}
+        self.started_at: Optional[float] = None
+        self.waited: Optional[float] = None
+
+    def start(self, text: str) -> "ToolPrefetch":
+        if not settings.TOOL_PREFETCH_ENABLED:
+            return self
+        self.calls = detect_tool_calls(text)
+        self.started_at = time.perf_counter()
+        for call in self.calls:
+            fetch, _ = TOOLS[call.name]
+            self.tasks[asyncio.create_task(self._timed(fetch(**call.args)))] = call
+        if self.calls:
+            logger.info(f"🛠️ Prefetching tools: {self.calls}")
+        return self
+
+    @staticmethod
+    async def _timed(fetch: Awaitable[Optional[dict]]) -> Optional[dict]:
+        started = time.perf_counter()
+        result = await fetch
+        voice_metrics.tool_latency.observe(time.perf_counter() - started)  # Late (cancelled) lookups are not observed
+        return result
+
+    async def context(self) -> str:
+        """Live data that arrived before the deadline, one line per lookup ('' if none)."""
+        if not self.tasks:
+            return ""
+        remaining = max(self.deadline - (time.perf_counter() - self.started_at), 0)
+        done, pending = await asyncio.wait(self.tasks, timeout=remaining)
+        self.waited = time.perf_counter() - self.started_at
+        for task in pending:
+            task.cancel()
+            voice_metrics.tool_calls.inc("late")
+
+        lines = []
+        for task, call in self.tasks.items():
+            if task not in done:
+                continue
+            result = None if task.exception() else task.result()
+            if not result:
+                voice_metrics.tool_calls.inc("failed")
+                continue
+            line = TOOLS[call.name][1](result, **call.args)
+            if line:
+                lines.append(f"- {line}")
+            voice_metrics.tool_calls.inc("in_time")
+        if pending:
+            logger.info(f"⏱️ {len(pending)} tool lookup(s) missed the {self.deadline * 1000:.0f} ms deadline")
+        return "\n".join(lines)
+
+    def cancel(self):
+        for task in self.tasks:
+            if not task.done():
+                task.cancel()
+
+def tool_context_message(context: str) -> Optional[str]:
+    """
+    Prefetched data as the LLM request's 'context' (sent after the history). The persona prompt
+    is left untouched so llm_service's chain cache and Ollama's prompt prefix stay warm.
+    """
+    if not context:
+        return None
+    return f"Live data fetched for this message (use it if relevant, do not mention how it was obtained):\n{context}"
@@ -0,0 +1,316 @@
+import os
+import json
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from config import settings
+
+logger = logging.getLogger("Cortex_VectorStore")
+
+# (score, payload) pairs, best first
+SearchHit = Tuple[float, Dict[str, Any]]
+
+class VectorStore:
+    """
+    Minimal interface SemanticMemory needs from a vector database.
+    Backends: 'QdrantVectorStore' (server), 'LocalVectorStore' (embedded) and
+    'FallbackVectorStore' (Qdrant first, local mirror when it is unavailable).
+    """
+    name = "base"
+
+    async def ensure_collection(self):
+        raise NotImplementedError
+
+    async def upsert(self, ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]], wait: bool = True):
+        raise NotImplementedError
+
+    async def search(self, vector: List[float], limit: int) -> List[SearchHit]:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+# --- QDRANT (SERVER) ---
+class QdrantVectorStore(VectorStore):
+    name = "qdrant"
+
+    def __init__(self, url: str = settings.QDRANT_URL, collection: str = settings.COLLECTION_NAME, dim: int = settings.EMBEDDING_DIM):
+        from qdrant_client import AsyncQdrantClient
+        from qdrant_client.http import models
+        self.models = models
+        self.client = AsyncQdrantClient(url=url)
+        self.collection = collection
+        self.dim = dim
+        self._ready = False
+        self._lock = asyncio.Lock()
+
+    async def ensure_collection(self):
+        """Creates the Qdrant collection if it doesn't exist. Raises if Qdrant is unreachable."""
+        if self._ready:
+            return
+        async with self._lock:
+            if self._ready:
+                return
+            collections = await self.client.get_collections()
+            exists = any(c.name == self.collection for c in collections.collections)
+            if not exists:
+                logger.info(f"Creating memory collection: {self.collection}")
+                await self.client.create_collection(
+                    collection_name=self.collection,
+                    vectors_config=self.models.VectorParams(size=self.dim, distance=self.models.Distance.COSINE)
+                )
+            self._ready = True
+
+    async def upsert(self, ids, vectors, payloads, wait=True):
+        await self.ensure_collection()
+        points = [self.models.PointStruct(id=i, vector=v, payload=p) for i, v, p in zip(ids, vectors, payloads)]
+        await self.client.upsert(collection_name=self.collection, points=points, wait=wait)
+
+    async def search(self, vector, limit):
+        await self.ensure_collection()
+        response = await self.client.query_points(collection_name=self.collection, query=vector, limit=limit)
+        return [(hit.score, hit.payload or {}) for hit in response.points]
+
+    async def close(self):
+        await self.client.close()
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "collection": self.collection, "ready": self._ready}
+
+# --- EMBEDDED (NUMPY + MMAP) ---
+class LocalVectorStore(VectorStore):
+    """
+    Embedded vector index, no server required.
+
+    Layout in 'path/':
+      - vectors.f32     unit-normalized float32 rows, appended, read back via np.memmap
+      - payloads.jsonl  one '{"id", "payload"}' line per row (same order)
+
+    Up to 'ann_threshold' rows, search is an exact brute-force cosine (one matrix-vector product).
+    Above it, an IVF index (k-means centroids + inverted lists, probing the 'nprobe' closest lists)
+    is built in memory and rebuilt once the store has grown by half; rows added since the last
+    build are always scanned exactly. Re-upserting an existing id appends a new row; search returns
+    the newest version only.
+    """
+    name = "local"
+
+    def __init__(self, path: str = settings.VECTOR_STORE_DIR, dim: int = settings.EMBEDDING_DIM,
+                 ann_threshold: int = settings.LOCAL_ANN_THRESHOLD, nprobe: int = settings.LOCAL_ANN_NPROBE):
+        self.path = path
+        self.dim = dim
+        self.ann_threshold = ann_threshold
+        self.nprobe = nprobe
+        self.vectors_file = os.path.join(path, "vectors.f32")
+        self.payloads_file = os.path.join(path, "payloads.jsonl")
+        self._write_lock = threading.Lock()
+        self._matrix: Optional[np.memmap] = None
+        self.ids: List[str] = []
+        self.payloads: List[Dict[str, Any]] = []
+        self.latest: Dict[str, int] = {}  # id -> newest row
+        # IVF state
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[np.ndarray] = []
+        self.indexed_rows = 0
+        self._loaded = False
+
+    async def ensure_collection(self):
+        if not self._loaded:
+            await asyncio.to_thread(self._load)
+
+    async def upsert(self, ids, vectors, payloads, wait=True):
+        await self.ensure_collection()
+        await asyncio.to_thread(self._append, ids, vectors, payloads)
+
+    async def search(self, vector, limit):
+        await self.ensure_collection()
+        return await asyncio.to_thread(self._search, vector, limit)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "rows": len(self.ids),
+            "live_points": len(self.latest),
+            "mode": "ivf" if self.centroids is not None else "brute_force",
+            "ivf_lists": len(self.lists),
+            "unindexed_rows": len(self.ids) - self.indexed_rows if self.centroids is not None else len(self.ids),
+        }
+
+    # --- STORAGE (worker thread) ---
+
+    def _load(self):
+        with self._write_lock:
+            if self._loaded:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            if os.path.exists(self.payloads_file):
+                with open(self.payloads_file, "r") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            break # Torn write at the tail: stop at the last complete row
+                        self._register(record["id"], record["payload"])
+            # Drop vector rows without a payload line (and vice versa) after a crash
+            rows = os.path.getsize(self.vectors_file) // (4 * self.dim) if os.path.exists(self.vectors_file) else 0
+            if rows != len(self.ids):
+                keep = min(rows, len(self.ids))
+                logger.warning(f"⚠️ Local vector store out of sync ({rows} vectors / {len(self.ids)} payloads). Truncating to {keep}.")
+                self._truncate(keep)
+            self._matrix = None
+            self._loaded = True
+            logger.info(f"📦 Local vector store loaded: {len(self.ids)} rows from {self.path}")
+
+    def _truncate(self, rows: int):
+        self.ids, self.payloads = self.ids[:rows], self.payloads[:rows]
+        self.latest = {i: row for row, i in enumerate(self.ids)}
+        with open(self.vectors_file, "ab") as f:
+            f.truncate(rows * 4 * self.dim)
+        with open(self.payloads_file, "w") as f:
+            for i, p in zip(self.ids, self.payloads):
+                f.write(json.dumps({"id": i, "payload": p}) + "\n")
+
+    def _register(self, point_id: str, payload: Dict[str, Any]):
+        self.latest[point_id] = len(self.ids)
+        self.ids.append(point_id)
+        self.payloads.append(payload)
+
+    def _append(self, ids, vectors, payloads):
+        block = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        block = block / np.maximum(norms, 1e-12)
+        with self._write_lock:
+            with open(self.vectors_file, "ab") as f:
+                f.write(block.tobytes())
+            with open(self.payloads_file, "a") as f:
+                for i, p in zip(ids, payloads):
+                    f.write(json.dumps({"id": str(i), "payload": p}) + "\n")
+            for i, p in zip(ids, payloads):
+                self._register(str(i), p)
+            self._matrix = None # Re-map on next search
+
+    def _matrix_view(self) -> np.ndarray:
+        with self._write_lock:
+            if self._matrix is None and self.ids:
+                self._matrix = np.memmap(self.vectors_file, dtype=np.float32, mode="r", shape=(len(self.ids), self.dim))
+            return self._matrix if self._matrix is not None else np.empty((0, self.dim), dtype=np.float32)
+
+    # --- SEARCH (worker thread) ---
+
+    def _search(self, vector, limit) -> List[SearchHit]:
+        matrix = self._matrix_view()
+        rows = matrix.shape[0]
+        if rows == 0:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        if rows > self.ann_threshold:
+            if self.centroids is None or rows > self.indexed_rows * 1.5:
+                self._build_ivf(matrix)
+            candidates = self._ivf_candidates(query, rows)
+        else:
+            candidates = np.arange(rows)
+
+        scores = matrix[candidates] @ query
+        order = np.argsort(-scores)
+        hits = []
+        for pos in order:
+            row = int(candidates[pos])
+            if self.latest.get(self.ids[row]) != row:
+                continue # Superseded by a newer upsert of the same id
+            hits.append((float(scores[pos]), self.payloads[row]))
+            if len(hits) >= limit:
+                break
+        return hits
+
+    def _build_ivf(self, matrix: np.ndarray, iterations: int = 8):
+        rows = matrix.shape[0]
+        n_lists = max(1, int(np.sqrt(rows)))
+        rng = np.random.default_rng(0)
+        sample = matrix[rng.choice(rows, size=min(rows, n_lists * 64), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = sample[assign == c]
+                if len(members):
+                    mean = members.mean(axis=0)
+                    centroids[c] = mean / max(float(np.linalg.norm(mean)), 1e-12)
+
+        assign = np.empty(rows, dtype=np.int64)
+        for start in range(0, rows, 65536):
+            assign[start:start + 65536] = np.argmax(matrix[start:start + 65536] @ centroids.T, axis=1)
+        self.lists = [np.flatnonzero(assign == c) for c in range(n_lists)]
+        self.centroids = centroids
+        self.indexed_rows = rows
+        logger.info(f"🗂️ Built IVF index: {rows} rows, {n_lists} lists")
+
+    def _ivf_candidates(self, query: np.ndarray, rows: int) -> np.ndarray:
+        probe = np.argsort(-(self.centroids @ query))[:self.nprobe]
+        parts = [self.lists[c] for c in probe]
+        parts.append(np.arange(self.indexed_rows, rows)) # Rows added since the last build
+        return np.concatenate(parts)
+
+# --- FALLBACK ---
+class FallbackVectorStore(VectorStore):
+    """
+    Qdrant as primary with every write mirrored to a local store.
+    When Qdrant fails, searches are served from the local mirror instead of returning nothing.
+    """
+    name = "fallback"
+
+    def __init__(self, primary: VectorStore, secondary: VectorStore):
+        self.primary = primary
+        self.secondary = secondary
+        self.fallback_searches = 0
+
+    async def ensure_collection(self):
+        await self.secondary.ensure_collection()
+        try:
+            await self.primary.ensure_collection()
+        except Exception as e:
+            logger.warning(f"⚠️ Primary vector store unavailable, local mirror active: {e}")
+
+    async def upsert(self, ids, vectors, payloads, wait=True):
+        await self.secondary.upsert(ids, vectors, payloads, wait)
+        try:
+            await self.primary.upsert(ids, vectors, payloads, wait)
+        except Exception as e:
+            logger.warning(f"⚠️ Primary vector store upsert failed (kept in local mirror): {e}")
+
+    async def search(self, vector, limit):
+        try:
+            return await self.primary.search(vector, limit)
+        except Exception as e:
+            self.fallback_searches += 1
+            logger.warning(f"⚠️ Primary vector store search failed, using local mirror: {e}")
+            return await self.secondary.search(vector, limit)
+
+    async def close(self):
+        await self.primary.close()
+        await self.secondary.close()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "primary": self.primary.stats(),
+            "secondary": self.secondary.stats(),
+            "fallback_searches": self.fallback_searches,
+        }
+
+def create_vector_store(backend: str = settings.VECTOR_STORE_BACKEND) -> VectorStore:
+    """Builds the configured backend: 'qdrant', 'local' or 'fallback'."""
+    backend = backend.lower()
+    if backend == "local":
+        return LocalVectorStore()
+    if backend == "fallback":
+        return FallbackVectorStore(QdrantVectorStore(), LocalVectorStore())
+    if backend != "qdrant":
+        logger.warning(f"⚠️ Unknown VECTOR_STORE_BACKEND '{backend}'. Using qdrant.")
+    return QdrantVectorStore()
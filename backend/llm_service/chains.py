@@ -1,54 +1,143 @@
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
 from langchain_ollama import ChatOllama
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.messages import SystemMessage
+from langchain_core.runnables import Runnable
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from config import settings
 from memory import get_message_history
 
+logger = logging.getLogger("LLM_Chains")
+
+ChainKey = Tuple[str, str, Tuple[Optional[float], Optional[float], Optional[int]]]
+
 class LLMChainFactory:
     """
     Factory class to create optimized LCEL (LangChain Expression Language) chains.
+
+    Ready-to-run chains are kept in a bounded LRU keyed by (model, system prompt hash,
+    sampling params), so a request only builds the prompt template and history wrapper the
+    first time a persona/model/sampling combination is seen. ChatOllama clients (and their
+    HTTP sessions) are shared per model; sampling params are bound per chain.
+    Chains hold no per-request state: the session id arrives through the invoke config.
     """
-    
+
+    _llms: Dict[str, ChatOllama] = {}
+    _chains: "OrderedDict[ChainKey, Runnable]" = OrderedDict()
+    max_chains: int = settings.CHAIN_CACHE_SIZE
+
+    # Metrics
+    hits = 0
+    misses = 0
+    evictions = 0
+    build_seconds_total = 0.0
+    build_seconds_max = 0.0
+
     @staticmethod
     def get_llm(model_name: str = settings.DEFAULT_MODEL):
         """
-        Initializes the ChatOllama client.
-        
+        Returns the shared ChatOllama client for a model (created on first use).
+
         Args:
             model_name (str): The name of the model to use (e.g., llama3, mistral).
         """
-        return ChatOllama(
-            base_url=settings.OLLAMA_URL,
-            model=model_name,
-            temperature=0.7,
-            streaming=True # Enable streaming at the model level
-        )
+        llm = LLMChainFactory._llms.get(model_name)
+        if llm is None:
+            llm = ChatOllama(
+                base_url=settings.OLLAMA_URL,
+                model=model_name,
+                temperature=settings.DEFAULT_TEMPERATURE,
+                streaming=True # Enable streaming at the model level
+            )
+            LLMChainFactory._llms[model_name] = llm
+            logger.info(f"🧠 LLM client created: {model_name}")
+        return llm
+
+    @staticmethod
+    def sampling_options(temperature: Optional[float] = None, top_p: Optional[float] = None,
+                         max_tokens: Optional[int] = None) -> dict:
+        """Ollama 'options' for one chain (unset values keep Ollama's defaults)."""
+        options = {
+            "temperature": settings.DEFAULT_TEMPERATURE if temperature is None else temperature,
+            "top_p": top_p,
+            "num_predict": max_tokens,
+        }
+        return {k: v for k, v in options.items() if v is not None}
+
+    @staticmethod
+    def cache_key(model_name: str, system_prompt: str, temperature: Optional[float] = None,
+                  top_p: Optional[float] = None, max_tokens: Optional[int] = None) -> ChainKey:
+        digest = hashlib.sha256((system_prompt or "").encode("utf-8")).hexdigest()[:16]
+        return model_name, digest, (temperature, top_p, max_tokens)
+
+    @staticmethod
+    def create_conversational_chain(model_name: str, system_prompt: str, temperature: Optional[float] = None,
+                                    top_p: Optional[float] = None, max_tokens: Optional[int] = None):
+        """
+        Returns the cached chain for this model/prompt/sampling combination, building it on a miss.
+
+        Args:
+            model_name (str): Ollama model.
+            system_prompt (str): Persona system prompt.
+            temperature, top_p, max_tokens: Sampling params (None = service defaults).
+        """
+        cls = LLMChainFactory
+        key = cls.cache_key(model_name, system_prompt, temperature, top_p, max_tokens)
+        chain = cls._chains.get(key)
+        if chain is not None:
+            cls._chains.move_to_end(key)
+            cls.hits += 1
+            return chain
+
+        cls.misses += 1
+        started = time.perf_counter()
+        chain = cls.build_conversational_chain(model_name, system_prompt, temperature, top_p, max_tokens)
+        elapsed = time.perf_counter() - started
+        cls.build_seconds_total += elapsed
+        cls.build_seconds_max = max(cls.build_seconds_max, elapsed)
+
+        cls._chains[key] = chain
+        while len(cls._chains) > cls.max_chains:
+            cls._chains.popitem(last=False)
+            cls.evictions += 1
+        return chain
 
     @staticmethod
-    def create_conversational_chain(model_name: str, system_prompt: str):
+    def build_conversational_chain(model_name: str, system_prompt: str, temperature: Optional[float] = None,
+                                   top_p: Optional[float] = None, max_tokens: Optional[int] = None):
         """
         Creates a Conversational RAG-ready chain using LCEL.
-        
+
         Structure:
         Prompt Template -> LLM -> Output Parser
-        
+
         Wrapped with 'RunnableWithMessageHistory' to automatically handle Redis history.
         """
-        
+
         # 1. Define the Prompt Template
+        # The system prompt is a literal message, not a template: persona text may contain '{' / '}'.
+        # Per-request context (live data) goes after the history, so everything before it is a
+        # stable prefix across turns
         prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
+            SystemMessage(content=system_prompt),
             MessagesPlaceholder(variable_name="history"), # Inject history here
+            MessagesPlaceholder(variable_name="context", optional=True),
             ("human", "{input}"),
         ])
-        
-        # 2. Initialize LLM
-        llm = LLMChainFactory.get_llm(model_name)
-        
+
+        # 2. Shared LLM client, with this chain's sampling params bound
+        llm = LLMChainFactory.get_llm(model_name).bind(
+            options=LLMChainFactory.sampling_options(temperature, top_p, max_tokens)
+        )
+
         # 3. Create the Chain
         chain = prompt | llm | StrOutputParser()
-        
+
         # 4. Wrap with History Management
         runnable_with_history = RunnableWithMessageHistory(
             chain,
@@ -56,5 +145,21 @@ class LLMChainFactory:
             input_messages_key="input",
             history_messages_key="history",
         )
-        
-        return runnable_with_history
\ No newline at end of file
+
+        return runnable_with_history
+
+    @staticmethod
+    def stats() -> dict:
+        cls = LLMChainFactory
+        lookups = cls.hits + cls.misses
+        return {
+            "chains": len(cls._chains),
+            "max_chains": cls.max_chains,
+            "llm_clients": sorted(cls._llms),
+            "hits": cls.hits,
+            "misses": cls.misses,
+            "evictions": cls.evictions,
+            "hit_rate": round(cls.hits / lookups, 4) if lookups else 0.0,
+            "build_ms_avg": round(cls.build_seconds_total / cls.misses * 1000, 3) if cls.misses else 0.0,
+            "build_ms_max": round(cls.build_seconds_max * 1000, 3),
+        }
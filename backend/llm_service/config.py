@@ -11,6 +11,24 @@ class Settings(BaseSettings):
     DEFAULT_MODEL: str = "llama3.2:1b"
     
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))      # Shared pool (see history_store.py)
+
     GENERATION_TIMEOUT: int = 45
 
+    # Chain Cache (see chains.py)
+    DEFAULT_TEMPERATURE: float = float(os.getenv("DEFAULT_TEMPERATURE", "0.7"))
+    CHAIN_CACHE_SIZE: int = int(os.getenv("CHAIN_CACHE_SIZE", "64"))               # Ready-to-run chains kept (LRU)
+
+    # Conversation History (see history.py)
+    HISTORY_TTL: int = int(os.getenv("HISTORY_TTL", "3600"))
+    HISTORY_READ_LIMIT: int = int(os.getenv("HISTORY_READ_LIMIT", "100"))           # Newest raw messages read per turn
+    HISTORY_HOT_WINDOW: float = float(os.getenv("HISTORY_HOT_WINDOW", "300"))       # Seconds since last write for 'hot'
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))      # Max history tokens in the prompt
+    HISTORY_CHARS_PER_TOKEN: float = float(os.getenv("HISTORY_CHARS_PER_TOKEN", "4.0"))
+    HISTORY_SUMMARY_ENABLED: bool = os.getenv("HISTORY_SUMMARY_ENABLED", "true").lower() == "true"
+    HISTORY_SUMMARY_TRIGGER_TOKENS: int = int(os.getenv("HISTORY_SUMMARY_TRIGGER_TOKENS", "300"))
+    HISTORY_KEEP_RATIO: float = float(os.getenv("HISTORY_KEEP_RATIO", "0.5"))       # Window share kept verbatim after a summary
+    SUMMARY_MODEL: str = os.getenv("SUMMARY_MODEL", DEFAULT_MODEL)
+    SUMMARY_MAX_TOKENS: int = int(os.getenv("SUMMARY_MAX_TOKENS", "256"))
+
 settings = Settings()
\ No newline at end of file
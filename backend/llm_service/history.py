@@ -0,0 +1,211 @@
+import math
+import asyncio
+import logging
+from typing import List, Optional, Sequence, Set, Tuple
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from config import settings
+from history_store import redis_sync, redis_async
+
+logger = logging.getLogger("LLM_History")
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a user and an AI assistant. "
+    "Merge the existing summary with the new messages into one concise summary. Keep names, "
+    "facts, preferences, decisions and open questions. Write plain prose, no preamble."
+)
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (no tokenizer on the hot path): chars / HISTORY_CHARS_PER_TOKEN."""
+    return math.ceil(len(text) / settings.HISTORY_CHARS_PER_TOKEN) + 4 # + per-message overhead
+
+def message_tokens(message: BaseMessage) -> int:
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    return estimate_tokens(content)
+
+def window_start(messages: Sequence[BaseMessage], budget: int) -> int:
+    """Index of the oldest message such that messages[index:] fits 'budget' and starts with a human turn."""
+    used, start = 0, len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        used += message_tokens(messages[i])
+        if used > budget:
+            break
+        start = i
+    # Never open the window with an orphaned AI reply
+    while start < len(messages) and not isinstance(messages[start], HumanMessage):
+        start += 1
+    return start
+
+def summary_message(summary: str) -> SystemMessage:
+    return SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")
+
+def summary_tokens(summary: str) -> int:
+    return message_tokens(summary_message(summary)) if summary else 0
+
+def read_log(raw: BaseChatMessageHistory, start: int = 0, limit: Optional[int] = None) -> Tuple[int, List[BaseMessage]]:
+    """(log length, messages at index >= start capped to the newest 'limit'); bounded read when the store supports it."""
+    if hasattr(raw, "read"):
+        return raw.read(start, limit)
+    messages = raw.messages
+    return len(messages), messages[start:][-limit:] if limit else messages[start:]
+
+async def aread_log(raw: BaseChatMessageHistory, start: int = 0, limit: Optional[int] = None) -> Tuple[int, List[BaseMessage]]:
+    if hasattr(raw, "aread"):
+        return await raw.aread(start, limit)
+    messages = await raw.aget_messages()
+    return len(messages), messages[start:][-limit:] if limit else messages[start:]
+
+class SummaryStore:
+    """Rolling summary per session: 'history_summary:<session>' -> {summary, covered}."""
+
+    @staticmethod
+    def key(session_id: str) -> str:
+        return f"history_summary:{session_id}"
+
+    def load(self, session_id: str) -> Tuple[str, int]:
+        return self._parse(redis_sync.hgetall(self.key(session_id)))
+
+    async def aload(self, session_id: str) -> Tuple[str, int]:
+        return self._parse(await redis_async.hgetall(self.key(session_id)))
+
+    @staticmethod
+    def _parse(data: dict) -> Tuple[str, int]:
+        return data.get("summary", ""), int(data.get("covered", 0))
+
+    async def asave(self, session_id: str, summary: str, covered: int):
+        key = self.key(session_id)
+        async with redis_async.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={"summary": summary, "covered": covered})
+            pipe.expire(key, settings.HISTORY_TTL)
+            await pipe.execute()
+
+    def clear(self, session_id: str):
+        redis_sync.delete(self.key(session_id))
+
+class BudgetedChatHistory(BaseChatMessageHistory):
+    """
+    Prompt-side view of a session's history.
+
+    The raw log (every message) is kept untouched in 'raw'. What the prompt sees is:
+    [rolling summary of older turns] + the newest messages that fit HISTORY_TOKEN_BUDGET.
+    Messages that fall out of the window are folded into the summary by 'HistorySummarizer'
+    in the background, so prompt prefill stays flat as the session grows.
+
+    Reads fetch at most HISTORY_READ_LIMIT raw messages (with a pooled store: one bounded
+    LRANGE, concurrently with the summary). Writes go straight to 'raw', which is expected to
+    refresh the summary's TTL along with its own (see PooledRedisChatHistory.touch_keys).
+    """
+
+    def __init__(self, session_id: str, raw: BaseChatMessageHistory, summaries: "SummaryStore" = None,
+                 budget: int = settings.HISTORY_TOKEN_BUDGET):
+        self.session_id = session_id
+        self.raw = raw
+        self.summaries = summaries or SummaryStore()
+        self.budget = budget
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        summary, covered = self.summaries.load(self.session_id)
+        total, tail = read_log(self.raw, limit=settings.HISTORY_READ_LIMIT)
+        return self._prompt_view(summary, covered, total, tail)
+
+    async def aget_messages(self) -> List[BaseMessage]:
+        (summary, covered), (total, tail) = await asyncio.gather(
+            self.summaries.aload(self.session_id),
+            aread_log(self.raw, limit=settings.HISTORY_READ_LIMIT),
+        )
+        return self._prompt_view(summary, covered, total, tail)
+
+    def _prompt_view(self, summary: str, covered: int, total: int, tail: List[BaseMessage]) -> List[BaseMessage]:
+        """'tail' holds the last messages of a log of length 'total'."""
+        if covered > total:
+            summary, covered = "", 0 # Raw log expired/cleared under the summary
+
+        prefix: List[BaseMessage] = [summary_message(summary)] if summary else []
+        budget = max(self.budget - summary_tokens(summary), 0)
+
+        recent = tail[max(covered - (total - len(tail)), 0):]
+        return prefix + recent[window_start(recent, budget):]
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.raw.add_messages(messages)
+        summarizer.schedule(self)
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        await self.raw.aadd_messages(messages)
+        summarizer.schedule(self)
+
+    def clear(self) -> None:
+        self.raw.clear()
+        self.summaries.clear(self.session_id)
+
+class HistorySummarizer:
+    """
+    Folds messages that no longer fit the prompt window into the session's rolling summary.
+    Runs as a background task after a turn has been stored (never on the request path),
+    at most one per session, and only once HISTORY_SUMMARY_TRIGGER_TOKENS have overflowed.
+    """
+
+    def __init__(self):
+        self.llm = None
+        self.running: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()  # Strong refs: the loop only keeps weak ones
+        self.runs_total = 0
+        self.failures_total = 0
+
+    def schedule(self, history: BudgetedChatHistory):
+        if not settings.HISTORY_SUMMARY_ENABLED or history.session_id in self.running:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return # Sync caller without a loop: the next async turn will catch up
+        self.running.add(history.session_id)
+        task = loop.create_task(self._run(history))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _: self.running.discard(history.session_id))
+
+    async def _run(self, history: BudgetedChatHistory):
+        try:
+            summary, covered = await history.summaries.aload(history.session_id)
+            total, recent = await aread_log(history.raw, start=covered) # Only the unsummarized part
+            if covered > total:
+                summary, covered = "", 0
+                total, recent = await aread_log(history.raw)
+
+            overflow = window_start(recent, max(history.budget - summary_tokens(summary), 0))
+            if sum(message_tokens(m) for m in recent[:overflow]) < settings.HISTORY_SUMMARY_TRIGGER_TOKENS:
+                return
+
+            # Fold past the overflow so the window regains headroom (fewer, larger summary runs)
+            keep_from = window_start(recent, int(history.budget * settings.HISTORY_KEEP_RATIO))
+            new_summary = await self._summarize(summary, recent[:keep_from])
+            cutoff = covered + keep_from
+            await history.summaries.asave(history.session_id, new_summary, cutoff)
+            self.runs_total += 1
+            logger.info(f"🧾 History summarized: {history.session_id} ({cutoff} messages covered)")
+        except Exception as e:
+            self.failures_total += 1
+            logger.warning(f"⚠️ History summarization failed for {history.session_id}: {e}")
+
+    async def _summarize(self, summary: str, messages: Sequence[BaseMessage]) -> str:
+        if self.llm is None:
+            from langchain_ollama import ChatOllama
+            self.llm = ChatOllama(
+                base_url=settings.OLLAMA_URL,
+                model=settings.SUMMARY_MODEL,
+                temperature=0,
+                num_predict=settings.SUMMARY_MAX_TOKENS,
+            )
+        transcript = "\n".join(
+            f"{'User' if isinstance(m, HumanMessage) else 'Assistant'}: {m.content}" for m in messages
+        )
+        result = await self.llm.ainvoke([
+            SystemMessage(content=SUMMARY_INSTRUCTIONS),
+            HumanMessage(content=f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"),
+        ])
+        return result.content.strip()
+
+# Singleton Instance
+summarizer = HistorySummarizer()
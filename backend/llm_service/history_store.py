@@ -0,0 +1,138 @@
+import json
+import time
+from typing import List, Optional, Sequence, Tuple
+import redis
+import redis.asyncio as aioredis
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from config import settings
+
+# Same layout as langchain's RedisChatMessageHistory (existing sessions stay readable):
+# 'message_store:<session>' is a list, newest message first, one JSON message per item.
+KEY_PREFIX = "message_store:"
+# Sorted set of sessions scored by last write time (see 'hot_sessions')
+ACTIVE_KEY = "history_active"
+
+# Shared connection pools: one per process, for every session (sync + async callers)
+redis_sync = redis.Redis.from_url(
+    settings.REDIS_URL, decode_responses=True, max_connections=settings.REDIS_MAX_CONNECTIONS
+)
+redis_async = aioredis.Redis.from_url(
+    settings.REDIS_URL, decode_responses=True, max_connections=settings.REDIS_MAX_CONNECTIONS
+)
+
+def history_key(session_id: str) -> str:
+    return f"{KEY_PREFIX}{session_id}"
+
+def _decode(items: Sequence[str]) -> List[BaseMessage]:
+    return messages_from_dict([json.loads(item) for item in reversed(items)])
+
+def _encode(messages: Sequence[BaseMessage]) -> List[str]:
+    return [json.dumps(message_to_dict(m)) for m in messages]
+
+def _range_end(start: int, limit: Optional[int]) -> int:
+    """LRANGE end index (list is newest first): the newest 'limit' messages, else those at index >= 'start'."""
+    return limit - 1 if limit is not None else -(start + 1)
+
+def _tail(total: int, items: Sequence[str], start: int) -> List[BaseMessage]:
+    # items[j] is message number total - 1 - j
+    return _decode(items[:max(total - start, 0)])
+
+class PooledRedisChatHistory(BaseChatMessageHistory):
+    """
+    Chat log of one session on the shared Redis pools. Cheap to create per request.
+
+    Reads are one round trip (LLEN + bounded LRANGE in MULTI/EXEC, so both see the same log). A turn's messages are written
+    with their TTL refresh (and that of 'touch_keys', e.g. the rolling summary) in one
+    MULTI/EXEC, which also marks the session active for 'hot_sessions'.
+
+    Args:
+        session_id (str): Conversation id.
+        ttl (int): Expiry refreshed on every write.
+        touch_keys (Sequence[str]): Extra keys whose TTL is refreshed with each write.
+    """
+
+    def __init__(self, session_id: str, ttl: int = settings.HISTORY_TTL, touch_keys: Sequence[str] = ()):
+        self.session_id = session_id
+        self.key = history_key(session_id)
+        self.ttl = ttl
+        self.touch_keys = tuple(touch_keys)
+
+    # --- READ ---
+
+    def read(self, start: int = 0, limit: Optional[int] = None) -> Tuple[int, List[BaseMessage]]:
+        """
+        Returns (log length, messages) in chronological order: the messages at index >= 'start',
+        capped to the newest 'limit'. The messages are always the end of the log, so the index
+        of the first one is 'log length - len(messages)'.
+        """
+        with redis_sync.pipeline(transaction=True) as pipe:
+            pipe.llen(self.key)
+            pipe.lrange(self.key, 0, _range_end(start, limit))
+            total, items = pipe.execute()
+        return total, _tail(total, items, start)
+
+    async def aread(self, start: int = 0, limit: Optional[int] = None) -> Tuple[int, List[BaseMessage]]:
+        async with redis_async.pipeline(transaction=True) as pipe:
+            pipe.llen(self.key)
+            pipe.lrange(self.key, 0, _range_end(start, limit))
+            total, items = await pipe.execute()
+        return total, _tail(total, items, start)
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return self.read()[1]
+
+    async def aget_messages(self) -> List[BaseMessage]:
+        return (await self.aread())[1]
+
+    # --- WRITE ---
+
+    def _queue_write(self, pipe, messages: Sequence[BaseMessage]):
+        pipe.lpush(self.key, *_encode(messages))
+        for key in (self.key, *self.touch_keys):
+            pipe.expire(key, self.ttl)
+        now = time.time()
+        pipe.zadd(ACTIVE_KEY, {self.session_id: now})
+        pipe.zremrangebyscore(ACTIVE_KEY, "-inf", now - self.ttl)  # Keeps the index as small as the live sessions
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        if not messages:
+            return
+        with redis_sync.pipeline(transaction=True) as pipe:
+            self._queue_write(pipe, messages)
+            pipe.execute()
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        if not messages:
+            return
+        async with redis_async.pipeline(transaction=True) as pipe:
+            self._queue_write(pipe, messages)
+            await pipe.execute()
+
+    def clear(self) -> None:
+        with redis_sync.pipeline(transaction=True) as pipe:
+            pipe.delete(self.key)
+            pipe.zrem(ACTIVE_KEY, self.session_id)
+            pipe.execute()
+
+    async def aclear(self) -> None:
+        async with redis_async.pipeline(transaction=True) as pipe:
+            pipe.delete(self.key)
+            pipe.zrem(ACTIVE_KEY, self.session_id)
+            await pipe.execute()
+
+async def hot_sessions(limit: int = 20, window: float = settings.HISTORY_HOT_WINDOW) -> List[dict]:
+    """Sessions written to within the last 'window' seconds, most recent first, with their log length."""
+    now = time.time()
+    active = await redis_async.zrevrangebyscore(ACTIVE_KEY, "+inf", now - window, start=0, num=limit, withscores=True)
+    if not active:
+        return []
+    async with redis_async.pipeline(transaction=False) as pipe:
+        for session_id, _ in active:
+            pipe.llen(history_key(session_id))
+        lengths = await pipe.execute()
+    return [
+        {"session_id": session_id, "last_write_seconds_ago": round(now - score, 1), "messages": length}
+        for (session_id, score), length in zip(active, lengths)
+    ]
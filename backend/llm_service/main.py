@@ -1,9 +1,13 @@
 import json
 import logging
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from typing import Optional
+from pydantic import BaseModel, Field
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from chains import LLMChainFactory
+from memory import get_message_history
+from history_store import hot_sessions
 from config import settings
 
 # Configure Logging
@@ -22,6 +26,17 @@ class ChatRequest(BaseModel):
     model: str = settings.DEFAULT_MODEL
     persona_system_prompt: str = "You are a helpful AI assistant."
     stream: bool = True
+    # Sampling (None = service defaults); part of the chain cache key
+    temperature: Optional[float] = Field(default=None, ge=0.0, le=2.0)
+    top_p: Optional[float] = Field(default=None, gt=0.0, le=1.0)
+    max_tokens: Optional[int] = Field(default=None, gt=0)
+    # Per-turn data (e.g. Cortex's live lookups), sent after the history. Kept out of the
+    # system prompt so it stays byte-identical (chain cache key, Ollama prompt prefix reuse)
+    context: Optional[str] = None
+
+class HistoryAppendRequest(BaseModel):
+    user_message: str
+    ai_message: str
 
 # --- Endpoints ---
 
@@ -32,6 +47,28 @@ def health_check():
     """
     return {"status": "active", "backend": "Ollama", "url": settings.OLLAMA_URL}
 
+@app.get("/diagnostics/chains")
+def chain_diagnostics():
+    """Chain cache size, hit rate and construction time."""
+    return LLMChainFactory.stats()
+
+@app.get("/diagnostics/history/hot")
+async def hot_history_sessions(limit: int = Query(20, ge=1, le=500), window: float = Query(settings.HISTORY_HOT_WINDOW, gt=0)):
+    """Sessions with history writes in the last 'window' seconds, most recent first."""
+    return {"window_seconds": window, "sessions": await hot_sessions(limit, window)}
+
+@app.post("/history/{conversation_id}")
+async def append_history(conversation_id: str, req: HistoryAppendRequest):
+    """
+    Records an exchange answered without the LLM (e.g. Cortex's response cache),
+    so follow-up turns see it in their history.
+    """
+    await get_message_history(conversation_id).aadd_messages([
+        HumanMessage(content=req.user_message),
+        AIMessage(content=req.ai_message),
+    ])
+    return {"status": "appended", "session_id": conversation_id}
+
 @app.post("/chat")
 async def chat_endpoint(req: ChatRequest):
     """
@@ -41,22 +78,25 @@ async def chat_endpoint(req: ChatRequest):
     logger.info(f"📨 Chat Request: {req.conversation_id} | Model: {req.model}")
     
     try:
-        # 1. Initialize the Chain with Redis History
+        # 1. Get the (cached) Chain with Redis History
         chain = LLMChainFactory.create_conversational_chain(
             model_name=req.model,
-            system_prompt=req.persona_system_prompt
+            system_prompt=req.persona_system_prompt,
+            temperature=req.temperature,
+            top_p=req.top_p,
+            max_tokens=req.max_tokens
         )
         
         # 2. Handle Streaming Response (Server-Sent Events)
         if req.stream:
             return StreamingResponse(
-                generate_stream(chain, req.message, req.conversation_id),
+                generate_stream(chain, chain_input(req), req.conversation_id),
                 media_type="text/event-stream"
             )
         
         # 3. Handle Blocking Response (Fallback)
         response = await chain.ainvoke(
-            {"input": req.message},
+            chain_input(req),
             config={"configurable": {"session_id": req.conversation_id}}
         )
         return {"response": response, "session_id": req.conversation_id}
@@ -65,14 +105,18 @@ async def chat_endpoint(req: ChatRequest):
         logger.error(f"❌ LLM Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def generate_stream(chain, message: str, session_id: str):
+def chain_input(req: ChatRequest) -> dict:
+    """Chain variables for one request. Only 'input' is written to the history."""
+    return {"input": req.message, "context": [SystemMessage(content=req.context)] if req.context else []}
+
+async def generate_stream(chain, inputs: dict, session_id: str):
     """
     Async Generator that yields tokens as they are produced by the LLM.
     Formats output as Server-Sent Events (SSE).
     """
     try:
         async for chunk in chain.astream(
-            {"input": message},
+            inputs,
             config={"configurable": {"session_id": session_id}}
         ):
             if chunk:
@@ -1,6 +1,7 @@
-from langchain_community.chat_message_histories import RedisChatMessageHistory
 from langchain_core.chat_history import BaseChatMessageHistory
 from config import settings
+from history import BudgetedChatHistory, SummaryStore
+from history_store import PooledRedisChatHistory
 import logging
 
 # Configure logging
@@ -9,6 +10,8 @@ logger = logging.getLogger("LLM_Memory")
 def get_message_history(session_id: str) -> BaseChatMessageHistory:
     """
     Retrieves the chat history for a specific session from Redis.
+    The full log stays in Redis; the prompt gets a token-budgeted window plus a rolling summary.
+    No connection is opened here: every session shares the pools in history_store.py.
     
     Args:
         session_id (str): Unique identifier for the conversation session.
@@ -16,15 +19,9 @@ def get_message_history(session_id: str) -> BaseChatMessageHistory:
     Returns:
         BaseChatMessageHistory: A history object connected to Redis.
     """
-    try:
-        history = RedisChatMessageHistory(
-            url=settings.REDIS_URL,
-            session_id=session_id,
-            ttl=3600  # Optional: Set Time-To-Live (e.g., 1 hour) to auto-clean old chats
-        )
-        return history
-    except Exception as e:
-        logger.error(f"❌ Failed to connect to Redis Memory: {e}")
-        # Fallback logic could be implemented here (e.g., in-memory dict), 
-        # but for prod-ready systems, we prefer to fail fast or handle explicitly.
-        raise e
\ No newline at end of file
+    raw_history = PooledRedisChatHistory(
+        session_id,
+        ttl=settings.HISTORY_TTL,  # Time-To-Live (e.g., 1 hour) to auto-clean old chats
+        touch_keys=(SummaryStore.key(session_id),)  # Summary expires with the log
+    )
+    return BudgetedChatHistory(session_id, raw_history)
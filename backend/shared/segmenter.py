@@ -0,0 +1,139 @@
+"""
+Incremental sentence segmentation for speech synthesis.
+
+Shared by Cortex (splitting the live LLM token stream) and the TTS service (splitting request
+text). This is the only copy: both images get it through the 'shared' build context
+(see docker-compose.yml); outside Docker, put 'backend/shared' on PYTHONPATH.
+"""
+from typing import List, Optional
+
+# Words that end with a period without ending the sentence (compared lowercased, without the dot)
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e", "inc", "ltd",
+    "co", "corp", "fig", "approx", "dept", "est", "mt", "u.s", "a.m", "p.m", "jan", "feb",
+    "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+}
+# Also sentence-final words ("she said no.", "so do I."): abbreviations only before a lowercase word or a digit ("No. 5")
+AMBIGUOUS_ABBREVIATIONS = {"no", "i"}
+TERMINATORS = ".!?…"
+CLAUSE_BREAKS = ",;:"
+CLOSERS = "\"')]}”’»"
+
+class SentenceSegmenter:
+    """
+    Streaming segmenter: feed arbitrary text fragments (LLM tokens), get back complete segments.
+
+    - Punctuation is detected anywhere inside a fragment (" world." works as well as ".").
+    - A terminator only ends a segment once the following whitespace is seen, so decimals
+      ("3.14"), abbreviations ("Dr. Smith") and initials ("J. R.") are not split.
+    - Segments shorter than 'min_chars' are merged with the next one.
+    - Text without a boundary is force-split near 'max_chars' at the last soft break.
+    - With 'eager_first_clause', the first segment of a stream may end at a comma / semicolon /
+      colon once it has 'first_clause_min_chars', so audio can start before the sentence is done.
+
+    Args:
+        min_chars (int): Minimum segment length (except for the final flush).
+        max_chars (int): Maximum segment length before a forced split.
+        eager_first_clause (bool): Emit the first comma-bounded clause early.
+        first_clause_min_chars (int): Minimum length of that early first clause.
+    """
+
+    def __init__(self, min_chars: int = 8, max_chars: int = 220, eager_first_clause: bool = False, first_clause_min_chars: int = 15):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.eager_first_clause = eager_first_clause
+        self.first_clause_min_chars = first_clause_min_chars
+        self.buffer = ""
+        self.emitted = 0
+
+    def push(self, text: str) -> List[str]:
+        """Adds a fragment and returns every segment completed by it."""
+        self.buffer += text
+        segments = []
+        while True:
+            cut = self._find_boundary()
+            if cut is None:
+                break
+            segment = self.buffer[:cut].strip()
+            self.buffer = self.buffer[cut:].lstrip()
+            if segment:
+                segments.append(segment)
+                self.emitted += 1
+        return segments
+
+    def flush(self) -> List[str]:
+        """Returns whatever is left at the end of the stream and resets the segmenter."""
+        segment = self.buffer.strip()
+        self.buffer = ""
+        self.emitted = 0
+        return [segment] if segment else []
+
+    def _find_boundary(self) -> Optional[int]:
+        buf = self.buffer
+        eager = self.eager_first_clause and self.emitted == 0
+
+        for i, ch in enumerate(buf):
+            if ch == "\n":
+                # Line breaks (lists, paragraphs) are hard boundaries
+                if buf[:i].strip():
+                    return i + 1
+                continue
+
+            if ch in TERMINATORS:
+                end = i + 1
+                while end < len(buf) and buf[end] in CLOSERS:
+                    end += 1
+                if end >= len(buf):
+                    return self._forced_split() # Need the next character to decide
+                if not buf[end].isspace():
+                    continue # "3.14", "e.g.", "..."
+                if ch == ".":
+                    abbreviation = self._is_abbreviation(buf, i, end)
+                    if abbreviation is None:
+                        return self._forced_split() # Need the next word to decide
+                    if abbreviation:
+                        continue
+                if end >= self.min_chars:
+                    return end
+                continue
+
+            if eager and ch in CLAUSE_BREAKS and i + 1 < len(buf) and buf[i + 1].isspace():
+                if i + 1 >= self.first_clause_min_chars:
+                    return i + 1
+
+        return self._forced_split()
+
+    def _forced_split(self) -> Optional[int]:
+        """Splits an over-long buffer at the last soft break before 'max_chars'."""
+        if len(self.buffer) <= self.max_chars:
+            return None
+        window = self.buffer[:self.max_chars]
+        for breaks in (CLAUSE_BREAKS, " "):
+            cut = max(window.rfind(b) for b in breaks)
+            if cut > self.min_chars:
+                return cut + 1
+        return self.max_chars
+
+    @staticmethod
+    def _is_abbreviation(buf: str, dot_index: int, end: int) -> Optional[bool]:
+        """None when it depends on a next word that has not arrived yet."""
+        start = dot_index
+        while start > 0 and not buf[start - 1].isspace():
+            start -= 1
+        word = buf[start:dot_index].lstrip("\"'([{“‘«").lower()
+        if not word:
+            return False
+        if word in AMBIGUOUS_ABBREVIATIONS:
+            rest = buf[end:].lstrip()
+            if not rest:
+                return None
+            return rest[0].islower() or rest[0].isdigit()
+        # Single-letter initials ("J.") and known abbreviations
+        if len(word) == 1 and word.isalpha():
+            return True
+        return word in ABBREVIATIONS
+
+def split_sentences(text: str, **kwargs) -> List[str]:
+    """One-shot helper: segments a complete text with the same rules as the streaming path."""
+    segmenter = SentenceSegmenter(**kwargs)
+    return segmenter.push(text) + segmenter.flush()
@@ -11,6 +11,14 @@ class Settings(BaseSettings):
     SAMPLE_RATE: int = 24000
     DEFAULT_VOICE: str = "af_sarah"
     
+    # Sentence segmentation (same rules as Cortex, see segmenter.py)
+    SEGMENT_MIN_CHARS: int = 8
+    SEGMENT_MAX_CHARS: int = 220
+    # Synthesize the first clause on its own to cut time-to-first-audio on long texts.
+    # Off by default: Cortex already sends one sentence per request, and a second split would
+    # return two WAVs in one body (clients decoding it as one file drop the second).
+    EAGER_FIRST_CLAUSE: bool = os.getenv("EAGER_FIRST_CLAUSE", "false").lower() == "true"
+    
     # CRITICAL: Force CPU. Kokoro is very fast on CPU.
     # Saving GPU for LLM and STT is priority.
     DEVICE: str = "cpu" 
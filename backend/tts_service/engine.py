@@ -4,6 +4,7 @@ import soundfile as sf
 import numpy as np
 import logging
 from config import settings
+from segmenter import split_sentences
 
 # --- COMPATIBILITY FIX ---
 # Patch EspeakWrapper to avoid "has no attribute 'set_data_path'" error
@@ -59,24 +60,31 @@ class TTSEngine:
             self.initialize()
         return self.kokoro.get_voices()
 
-    def stream_audio(self, text: str, voice: str, speed: float = 1.0):
+    def stream_audio(self, text: str, voice: str, speed: float = 1.0, audio_format: str = "wav"):
         """
-        Generator function that yields WAV bytes chunk by chunk.
+        Generator function that yields audio bytes chunk by chunk.
         
         Strategy:
-        1. Split text into sentences (heuristic).
+        1. Split text into sentences (shared streaming segmenter).
         2. Generate audio for each sentence.
         3. Yield bytes immediately to reduce Time-To-First-Byte (TTFB).
+
+        Args:
+            audio_format (str): "wav" (one WAV file per chunk) or "pcm16"
+                (headerless mono little-endian int16 at SAMPLE_RATE, chunks concatenate).
         """
         if not self.kokoro:
             self.initialize()
 
         logger.info(f"🔊 Streaming TTS for: {text[:30]}...")
         
-        # Simple sentence splitting (can be improved with NLTK)
-        # We split by punctuation to create natural pauses and processing chunks
-        import re
-        sentences = re.split(r'(?<=[.!?])\s+', text)
+        # Same segmentation rules as Cortex: abbreviations, decimals and min/max lengths are handled
+        sentences = split_sentences(
+            text,
+            min_chars=settings.SEGMENT_MIN_CHARS,
+            max_chars=settings.SEGMENT_MAX_CHARS,
+            eager_first_clause=settings.EAGER_FIRST_CLAUSE,
+        )
         
         for sentence in sentences:
             if not sentence.strip():
@@ -91,6 +99,10 @@ class TTSEngine:
                     lang="en-us"
                 )
                 
+                if audio_format == "pcm16":
+                    yield self.to_pcm16(audio_chunk)
+                    continue
+
                 # Convert numpy array to WAV bytes in-memory
                 byte_io = io.BytesIO()
                 sf.write(byte_io, audio_chunk, self.sample_rate, format='WAV')
@@ -103,5 +115,10 @@ class TTSEngine:
                 logger.error(f"Error generating chunk for '{sentence}': {e}")
                 continue
 
+    @staticmethod
+    def to_pcm16(audio_chunk: np.ndarray) -> bytes:
+        """Float samples in [-1, 1] -> raw PCM16 (little-endian)."""
+        return (np.clip(audio_chunk, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
 # Singleton Instance
 tts_engine = TTSEngine()
\ No newline at end of file
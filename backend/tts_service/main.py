@@ -1,6 +1,7 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from typing import Literal
 from engine import tts_engine
 from config import settings
 import logging
@@ -17,6 +18,7 @@ class TTSRequest(BaseModel):
     voice: str = settings.DEFAULT_VOICE
     speed: float = 1.0
     stream: bool = True
+    format: Literal["wav", "pcm16"] = "wav"  # pcm16: raw mono int16 at SAMPLE_RATE
 
 class HealthResponse(BaseModel):
     status: str
@@ -52,22 +54,28 @@ async def generate_speech(req: TTSRequest):
     Modes:
     - Stream=True: Returns 'audio/wav' chunks immediately (Low Latency).
     - Stream=False: Returns full audio file (for downloading).
+
+    With format="pcm16" the chunks are headerless PCM16 ('X-Sample-Rate' gives the rate),
+    which lets callers forward audio as each sentence is produced.
     """
+    media_type = "audio/wav" if req.format == "wav" else f"audio/L16; rate={settings.SAMPLE_RATE}; channels=1"
+    headers = {"X-Sample-Rate": str(settings.SAMPLE_RATE)}
     try:
         if req.stream:
             return StreamingResponse(
-                tts_engine.stream_audio(req.text, req.voice, req.speed),
-                media_type="audio/wav"
+                tts_engine.stream_audio(req.text, req.voice, req.speed, req.format),
+                media_type=media_type,
+                headers=headers
             )
         else:
             # For non-streaming, we consume the generator and merge
             # (Simplified for this example, usually streaming is preferred)
             full_audio = b""
-            for chunk in tts_engine.stream_audio(req.text, req.voice, req.speed):
+            for chunk in tts_engine.stream_audio(req.text, req.voice, req.speed, req.format):
                 full_audio += chunk
             
             from fastapi.responses import Response
-            return Response(content=full_audio, media_type="audio/wav")
+            return Response(content=full_audio, media_type=media_type, headers=headers)
     
     except Exception as e:
         logger.error(f"Generation Error: {e}")